@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Synthetic Table Benchmark for extract_drug_data.py
+Renders San Gerardo-style compatibility tables with known ground truth and
+measures extraction accuracy and throughput per pipeline stage
+
+Usage:
+    python benchmark_table_extraction.py --sizes 20 50 100 150
+    python benchmark_table_extraction.py --sizes 50 --noise 12 --blur 3 --rotation 0.5 --scale 1.5
+    python benchmark_table_extraction.py --generate-only --output-dir synthetic/
+    python benchmark_table_extraction.py --sizes 40 150 --scale 4 --compare-grid   # grid lines vs ground truth
+
+Each table is written as <name>.png plus <name>.truth.json (drug names,
+cell codes, ruled line positions and rendering parameters).
+
+Requirements:
+    pip install pytesseract pillow opencv-python numpy
+"""
+
+import argparse
+import importlib.util
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+import extract_drug_data as extractor
+from drug_vocabulary import load_drug_vocabulary, normalize_name
+
+# Legend colors (BGR), same hues as the printed San Gerardo table
+LEGEND_COLORS = {
+    'C': (80, 176, 0),       # Green - Compatible
+    'Y': (0, 255, 255),      # Yellow - Y-site only
+    'I': (0, 0, 255),        # Red - Incompatible
+    '!': (0, 165, 255),      # Orange - Conflicting data
+    '': (255, 255, 255),     # White - No data
+}
+
+# Relative frequency of each code in the real database
+CODE_WEIGHTS = {'C': 0.17, 'Y': 0.13, 'I': 0.20, '!': 0.02, '': 0.48}
+
+CELL_SIZE = 18               # Cell side in pixels at scale 1.0
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.4
+FONT_THICKNESS = 1
+
+PIPELINE_STAGES = ['decode', 'preprocess', 'grid', 'ocr', 'refine', 'colors']
+
+# Python modules the extraction stages need (module -> pip package)
+OCR_MODULES = {'cv2': 'opencv-python', 'numpy': 'numpy', 'PIL': 'pillow', 'pytesseract': 'pytesseract'}
+
+
+# =============================================================================
+# GENERATOR
+# =============================================================================
+
+def pick_drug_names(count: int, vocabulary: Dict[str, str]) -> List[str]:
+    """Take drug names from the real database (suffixed if more are needed)"""
+    names = list(dict.fromkeys(vocabulary.values())) or ['Farmaco']
+    suffixes = ['', ' Bis', ' Ter', ' Quater']
+    picked = []
+    for suffix in suffixes:
+        for name in names:
+            if len(picked) == count:
+                return picked
+            picked.append(f"{name}{suffix}")
+    return picked
+
+
+def render_table(names: List[str], seed: int = 0) -> Dict:
+    """
+    Render a staircase compatibility table (row i: cells 0..i-1, name i on the diagonal)
+
+    Returns:
+        {'image': BGR array, 'cells': [[i, j, code], ...],
+         'lines': {'rows': [y, ...], 'cols': [x, ...]} (ruled lines, pixels at scale 1.0)}
+    """
+    rng = random.Random(seed)
+    codes = list(CODE_WEIGHTS)
+    weights = list(CODE_WEIGHTS.values())
+
+    n = len(names)
+    text_width = max(cv2.getTextSize(name.upper(), FONT, FONT_SCALE, FONT_THICKNESS)[0][0] for name in names)
+
+    # Same layout fractions the extractor assumes
+    name_column = text_width + 10
+    width = int(max(name_column / extractor.NAME_COLUMN_RATIO,
+                    (n * CELL_SIZE + text_width + 20) / (1 - extractor.MATRIX_START_RATIO)))
+    matrix_start = int(width * extractor.MATRIX_START_RATIO)
+    top = 2 * CELL_SIZE
+    height = top + n * CELL_SIZE + CELL_SIZE
+
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    cells = []
+
+    for i, name in enumerate(names):
+        y0 = top + i * CELL_SIZE
+        y1 = y0 + CELL_SIZE
+        baseline = y1 - 5
+
+        # Row header
+        cv2.rectangle(image, (0, y0), (name_column, y1), (0, 0, 0), 1)
+        cv2.putText(image, name.upper(), (4, baseline), FONT, FONT_SCALE, (0, 0, 0), FONT_THICKNESS)
+
+        # Colored cells left of the diagonal
+        for j in range(i):
+            code = rng.choices(codes, weights)[0]
+            x0 = matrix_start + j * CELL_SIZE
+            cv2.rectangle(image, (x0, y0), (x0 + CELL_SIZE, y1), LEGEND_COLORS[code], -1)
+            cv2.rectangle(image, (x0, y0), (x0 + CELL_SIZE, y1), (0, 0, 0), 1)
+            cells.append([i, j, code])
+
+        # Column header on the diagonal
+        x0 = matrix_start + i * CELL_SIZE
+        cv2.rectangle(image, (x0, y0), (x0 + CELL_SIZE, y1), (0, 0, 0), 1)
+        cv2.putText(image, name, (x0 + 2, baseline), FONT, FONT_SCALE, (0, 0, 0), FONT_THICKNESS)
+
+    lines = {
+        'rows': [top + i * CELL_SIZE for i in range(n + 1)],
+        'cols': [0, name_column] + [matrix_start + j * CELL_SIZE for j in range(n + 1)],
+    }
+    return {'image': image, 'cells': cells, 'lines': lines}
+
+
+def degrade(image: 'np.ndarray', noise: float = 0.0, blur: int = 0,
+            rotation: float = 0.0, scale: float = 1.0, seed: int = 0) -> 'np.ndarray':
+    """
+    Apply resolution change, rotation, blur and gaussian noise (in this order)
+
+    Upscaling is nearest-neighbour, like rendering at a higher DPI: cubic
+    interpolation would tint the black rules between colored cells, and
+    detect_grid_lines drops saturated pixels.
+    """
+    if scale != 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_NEAREST)
+
+    if rotation:
+        height, width = image.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotation, 1.0)
+        image = cv2.warpAffine(image, matrix, (width, height), borderValue=(255, 255, 255))
+
+    if blur > 1:
+        kernel = blur if blur % 2 else blur + 1
+        image = cv2.GaussianBlur(image, (kernel, kernel), 0)
+
+    if noise > 0:
+        rng = np.random.default_rng(seed)
+        noisy = image.astype(np.float32) + rng.normal(0, noise, image.shape)
+        image = np.clip(noisy, 0, 255).astype(np.uint8)
+
+    return image
+
+
+def generate_table(output_dir: Path, size: int, vocabulary: Dict[str, str], params: Dict, seed: int = 0) -> Path:
+    """
+    Render one synthetic table and its ground truth
+
+    Returns:
+        Path of the PNG (ground truth in <stem>.truth.json)
+    """
+    names = pick_drug_names(size, vocabulary)
+    table = render_table(names, seed=seed)
+    image = degrade(table['image'], seed=seed, **params)
+
+    stem = f"synthetic-{size:03d}x{size:03d}-s{seed}"
+    image_path = output_dir / f"{stem}.png"
+    cv2.imwrite(str(image_path), image)
+
+    # Line positions in output pixels (meaningless once rotated)
+    scale = params.get('scale', 1.0)
+    lines = {axis: [int(round((pos + 0.5) * scale - 0.5)) for pos in positions]
+             for axis, positions in table['lines'].items()}
+    truth = {'names': names, 'cells': table['cells'], 'lines': None if params.get('rotation') else lines,
+             'params': params, 'seed': seed}
+    with open(output_dir / f"{stem}.truth.json", 'w', encoding='utf-8') as f:
+        json.dump(truth, f, ensure_ascii=False)
+
+    return image_path
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def missing_ocr_dependencies() -> List[str]:
+    """OCR dependencies of the extraction stages that are not available (empty = all good)"""
+    missing = [f"{module} (pip install {package})" for module, package in OCR_MODULES.items()
+               if importlib.util.find_spec(module) is None]
+    if not missing:
+        import pytesseract
+        try:
+            pytesseract.get_tesseract_version()
+        except Exception:
+            missing.append("tesseract binary (https://github.com/tesseract-ocr/tesseract)")
+    return missing
+
+
+def run_stages(image_path: Path, adaptive: Optional[Dict] = None,
+               grid_max_width: int = extractor.GRID_MAX_WIDTH) -> Dict:
+    """
+    Run every extractor stage on one image, timing each separately
+
+    Returns:
+        {'timings': {stage: seconds}, 'grid', 'row_names', 'matrix', 'error'}
+    """
+    timings = {}
+    outcome = {'timings': timings, 'grid': ([], []), 'row_names': [], 'matrix': {}, 'error': None}
+
+    def timed(stage, func):
+        start = time.perf_counter()
+        value = func()
+        timings[stage] = time.perf_counter() - start
+        return value
+
+    try:
+        with extractor.ImagePipeline(str(image_path), grid_max_width=grid_max_width) as pipeline:
+            timed('decode', lambda: pipeline.image)
+            timed('preprocess', lambda: (pipeline.binary, pipeline.hsv))
+            outcome['grid'] = timed('grid', lambda: extractor.detect_grid_lines(pipeline))
+            table = timed('ocr', lambda: extractor.build_structured_table(pipeline))
+            if adaptive is not None:
+                timed('refine', lambda: extractor.refine_low_confidence_names(pipeline, **adaptive))
+            outcome['row_names'] = [h['name'] for h in table['row_headers']]
+            outcome['matrix'] = timed('colors', lambda: extractor._extract_compatibility_matrix(pipeline))
+    except Exception as e:
+        outcome['error'] = str(e)
+
+    return outcome
+
+
+def score(truth: Dict, outcome: Dict) -> Dict[str, float]:
+    """
+    Name accuracy: ground-truth names found among the row headers.
+    Cell accuracy: ground-truth cells whose code was recovered ('' = no data).
+    """
+    names = truth['names']
+    found = {normalize_name(name) for name in outcome['row_names']}
+    name_hits = sum(1 for name in names if normalize_name(name) in found)
+
+    matrix = {normalize_name(row): {normalize_name(col): code for col, code in cols.items()}
+              for row, cols in outcome['matrix'].items()}
+    cell_hits = 0
+    for i, j, code in truth['cells']:
+        predicted = matrix.get(normalize_name(names[i]), {}).get(normalize_name(names[j]), '')
+        cell_hits += predicted == code
+
+    return {
+        'name_accuracy': name_hits / len(names) if names else 0.0,
+        'cell_accuracy': cell_hits / len(truth['cells']) if truth['cells'] else 0.0,
+    }
+
+
+def line_agreement(reference: List[int], candidate: List[int], tolerance: int) -> float:
+    """Share of reference lines with a candidate line within tolerance pixels"""
+    if not reference:
+        return 1.0 if not candidate else 0.0
+    matched = sum(1 for pos in reference if any(abs(pos - other) <= tolerance for other in candidate))
+    return matched / len(reference)
+
+
+def time_grid(image_path: Path, grid_max_width: int, repeats: int = 5) -> Dict:
+    """
+    Grid detection alone, best of `repeats` runs (decode and preprocessing excluded)
+
+    Returns:
+        {'seconds', 'rows', 'cols', 'downscaled'}
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        with extractor.ImagePipeline(str(image_path), grid_max_width=grid_max_width) as pipeline:
+            pipeline.binary, pipeline.hsv
+            start = time.perf_counter()
+            rows, cols = extractor.detect_grid_lines(pipeline)
+            best = min(best, time.perf_counter() - start)
+            height, width = pipeline.shape
+    downscaled = bool(grid_max_width) and width > grid_max_width and \
+        width * height >= extractor.GRID_DOWNSCALE_MIN_PIXELS
+    return {'seconds': best, 'rows': rows, 'cols': cols, 'downscaled': downscaled}
+
+
+def grid_accuracy(truth: Dict, grid: Dict) -> Optional[Dict[str, float]]:
+    """
+    Detected lines vs the ruled lines in the ground truth (None if rotated)
+
+    Returns:
+        {'recall': share of true lines found, 'extra': detected lines matching no true line}
+    """
+    if not truth.get('lines'):
+        return None
+    tolerance = max(2, int(np.ceil(truth['params'].get('scale', 1.0))))
+    expected = len(truth['lines']['rows']) + len(truth['lines']['cols'])
+    found = extra = 0
+    for axis in ('rows', 'cols'):
+        reference, detected = truth['lines'][axis], grid[axis]
+        found += round(line_agreement(reference, detected, tolerance) * len(reference))
+        extra += len(detected) - round(line_agreement(detected, reference, tolerance) * len(detected))
+    return {'recall': found / expected, 'extra': extra}
+
+
+def compare_grid_scales(image_paths: List[Path], grid_max_width: int, adaptive: Optional[Dict] = None) -> Dict:
+    """
+    Downscaled vs full-resolution grid detection on the same images
+
+    Both paths are scored against the ruled lines in .truth.json, not
+    against each other.
+
+    Returns:
+        Grid seconds for both (best of 5), line recall and extra lines per
+        path, images that actually took the downscaled path, and accuracy
+        deltas (downscaled - full)
+    """
+    comparison = {'full_seconds': 0.0, 'scaled_seconds': 0.0, 'downscaled': 0,
+                  'full_recall': None, 'scaled_recall': None, 'full_extra': 0, 'scaled_extra': 0,
+                  'name_delta': 0.0, 'cell_delta': 0.0}
+
+    for image_path in image_paths:
+        with open(image_path.with_suffix('.truth.json'), 'r', encoding='utf-8') as f:
+            truth = json.load(f)
+
+        full_grid = time_grid(image_path, 0)
+        scaled_grid = time_grid(image_path, grid_max_width)
+        comparison['full_seconds'] += full_grid['seconds']
+        comparison['scaled_seconds'] += scaled_grid['seconds']
+        comparison['downscaled'] += scaled_grid['downscaled']
+
+        for name, grid in (('full', full_grid), ('scaled', scaled_grid)):
+            accuracy = grid_accuracy(truth, grid)
+            if accuracy is None:
+                continue
+            recall = comparison[f"{name}_recall"] or 0.0
+            comparison[f"{name}_recall"] = recall + accuracy['recall'] / len(image_paths)
+            comparison[f"{name}_extra"] += accuracy['extra']
+
+        full = run_stages(image_path, adaptive, grid_max_width=0)
+        scaled = run_stages(image_path, adaptive, grid_max_width=grid_max_width)
+        full_scores, scaled_scores = score(truth, full), score(truth, scaled)
+        comparison['name_delta'] += (scaled_scores['name_accuracy'] - full_scores['name_accuracy']) / len(image_paths)
+        comparison['cell_delta'] += (scaled_scores['cell_accuracy'] - full_scores['cell_accuracy']) / len(image_paths)
+
+    comparison['images'] = len(image_paths)
+    return comparison
+
+
+def print_grid_comparison(comparisons: Dict[str, Dict], grid_max_width: int):
+    """Print speed-up, line accuracy against ground truth and accuracy delta of the downscaled grid path"""
+    print("\n" + "=" * 100)
+    print(f"🔍 GRID DETECTION: downscaled (max width {grid_max_width}px, images >= "
+          f"{extractor.GRID_DOWNSCALE_MIN_PIXELS // 1_000_000} Mpx) vs full resolution")
+    print("=" * 100)
+    print(f"{'Size':<10} {'Full s':>9} {'Scaled s':>9} {'Speed-up':>9} {'Lines %':>9} {'Lines %':>9} "
+          f"{'Extra':>7} {'Extra':>7} {'Δ names':>9} {'Δ cells':>9}")
+    print(f"{'':<10} {'':>9} {'':>9} {'':>9} {'full':>9} {'scaled':>9} {'full':>7} {'scaled':>7}")
+
+    def percent(value):
+        return f"{value * 100:>9.1f}" if value is not None else f"{'n/a':>9}"
+
+    for size, c in comparisons.items():
+        speedup = c['full_seconds'] / c['scaled_seconds'] if c['scaled_seconds'] else float('nan')
+        note = '' if c['downscaled'] else '  (below size threshold: full resolution)'
+        print(f"{size:<10} {c['full_seconds']:>9.4f} {c['scaled_seconds']:>9.4f} {speedup:>8.2f}x "
+              f"{percent(c['full_recall'])} {percent(c['scaled_recall'])} {c['full_extra']:>7} {c['scaled_extra']:>7} "
+              f"{c['name_delta'] * 100:>+9.1f} {c['cell_delta'] * 100:>+9.1f}{note}")
+
+
+def print_benchmark_report(rows: List[Dict]):
+    """Print accuracy and per-stage throughput per table size"""
+    print("\n" + "=" * 100)
+    print("📊 BENCHMARK RESULTS")
+    print("=" * 100)
+    header = f"{'Size':<10} {'Names':>7} {'Cells':>7} " + ''.join(f"{stage:>11}" for stage in PIPELINE_STAGES)
+    print(header)
+    print(f"{'':<10} {'acc %':>7} {'acc %':>7} " + ''.join(f"{'img/s':>11}" for _ in PIPELINE_STAGES))
+    print("-" * 100)
+
+    for row in rows:
+        rates = ''
+        for stage in PIPELINE_STAGES:
+            seconds = row['timings'].get(stage)
+            rates += f"{(row['images'] / seconds if seconds else float('nan')):>11.2f}"
+        print(f"{row['size']:<10} {row['name_accuracy'] * 100:>7.1f} {row['cell_accuracy'] * 100:>7.1f} {rates}")
+        for error in row['errors']:
+            print(f"   ❌ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark extract_drug_data.py on synthetic San Gerardo-style tables'
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 100, 150],
+                        help='Table sizes (drugs per side, default: 20 50 100 150)')
+    parser.add_argument('--repeats', type=int, default=1,
+                        help='Tables per size (different random codes, default: 1)')
+    parser.add_argument('--noise', type=float, default=0.0, help='Gaussian noise sigma (0-255)')
+    parser.add_argument('--blur', type=int, default=0, help='Gaussian blur kernel size (pixels)')
+    parser.add_argument('--rotation', type=float, default=0.0, help='Rotation in degrees')
+    parser.add_argument('--scale', type=float, default=1.0, help='Resolution scale factor')
+    parser.add_argument('--output-dir', '-o', type=str, default='synthetic_tables',
+                        help='Directory for PNG + ground truth (default: synthetic_tables)')
+    parser.add_argument('--generate-only', action='store_true', help='Only render the tables')
+    parser.add_argument('--adaptive', action='store_true', help='Include the adaptive re-OCR stage')
+    parser.add_argument('--vocabulary', type=str, help='Drug database JSON (default: auto-detect)')
+    parser.add_argument('--grid-max-width', type=int, default=extractor.GRID_MAX_WIDTH,
+                        help=f'Grid detection pyramid width, 0 = full resolution (default: {extractor.GRID_MAX_WIDTH})')
+    parser.add_argument('--compare-grid', action='store_true',
+                        help='Also compare downscaled vs full-resolution grid detection')
+
+    args = parser.parse_args()
+
+    missing = [] if args.generate_only else missing_ocr_dependencies()
+    if missing:
+        print("❌ Cannot run the benchmark, missing OCR dependencies:")
+        for dependency in missing:
+            print(f"   - {dependency}")
+        print("   (--generate-only only needs opencv-python and numpy)")
+        sys.exit(1)
+
+    vocabulary = load_drug_vocabulary(args.vocabulary)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    params = {'noise': args.noise, 'blur': args.blur, 'rotation': args.rotation, 'scale': args.scale}
+
+    print("🧪 SYNTHETIC TABLE BENCHMARK")
+    print(f"   Sizes: {args.sizes} | Repeats: {args.repeats} | Degradation: {params}")
+
+    generated = {}
+    for size in args.sizes:
+        generated[size] = [generate_table(output_dir, size, vocabulary, params, seed=seed)
+                           for seed in range(args.repeats)]
+        print(f"🖼️  Generated {len(generated[size])} table(s) {size}x{size} in {output_dir}")
+
+    if args.generate_only:
+        return
+
+    adaptive = {'vocabulary': vocabulary} if args.adaptive else None
+    rows = []
+    for size, image_paths in generated.items():
+        row = {'size': f"{size}x{size}", 'images': len(image_paths), 'timings': {},
+               'name_accuracy': 0.0, 'cell_accuracy': 0.0, 'errors': []}
+
+        for image_path in image_paths:
+            with open(image_path.with_suffix('.truth.json'), 'r', encoding='utf-8') as f:
+                truth = json.load(f)
+
+            outcome = run_stages(image_path, adaptive, args.grid_max_width)
+            for stage, seconds in outcome['timings'].items():
+                row['timings'][stage] = row['timings'].get(stage, 0.0) + seconds
+            if outcome['error']:
+                row['errors'].append(f"{image_path.name}: {outcome['error']}")
+
+            scores = score(truth, outcome)
+            row['name_accuracy'] += scores['name_accuracy'] / len(image_paths)
+            row['cell_accuracy'] += scores['cell_accuracy'] / len(image_paths)
+
+        rows.append(row)
+
+    print_benchmark_report(rows)
+
+    if args.compare_grid and args.grid_max_width:
+        comparisons = {f"{size}x{size}": compare_grid_scales(image_paths, args.grid_max_width, adaptive)
+                       for size, image_paths in generated.items()}
+        print_grid_comparison(comparisons, args.grid_max_width)
+
+
+if __name__ == '__main__':
+    main()
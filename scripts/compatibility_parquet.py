@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Export colonnare (Parquet) della matrice compatibilità farmaci
+Usato da csv-to-json-converter.py, convert_sheet_to_json.py ed
+export_compatibility_to_google_sheets.py
+
+Due tabelle per export:
+    compatibility.parquet   formato lungo, una riga per coppia:
+                            drug1, drug2, status (categoriche, dictionary encoding)
+    drugs.parquet           metadati farmaco (id, nomi, fotosensibilità, CVC, ...)
+
+drug1/drug2 contengono sempre l'id farmaco del database JSON (es.
+'vancomicina-cloridrato'), mai il nome visualizzato: tutti i produttori
+scrivono la stessa chiave (salvata anche nei metadati come drugKey).
+
+Le righe sono ordinate per (drug1, drug2) e scritte in row group da
+ROW_GROUP_SIZE righe: le statistiche min/max di ogni row group permettono
+a pyarrow/DuckDB di saltare i blocchi che non contengono il farmaco
+cercato (predicate pushdown).
+
+Usage:
+    from compatibility_parquet import load_compatibility
+    df = load_compatibility('output/compatibility.parquet', drugs=['vancomicina'], columns=['drug2', 'status'])
+
+    python compatibility_parquet.py output/compatibility.parquet --drug vancomicina --columns drug2 status
+    python compatibility_parquet.py compatibility.parquet --drug vancomycin --both-sides   # una direzione per coppia
+
+DuckDB:
+    SELECT drug2, status FROM 'output/compatibility.parquet' WHERE drug1 = 'vancomicina'
+
+Requisiti:
+    pip install pyarrow
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+PAIRS_FILE = 'compatibility.parquet'
+DRUGS_FILE = 'drugs.parquet'
+PAIR_COLUMNS = ['drug1', 'drug2', 'status']
+
+# Chiave farmaco in drug1/drug2 (e colonna corrispondente di drugs.parquet)
+DRUG_KEY = 'id'
+
+# Righe per row group: abbastanza piccoli da saltare blocchi filtrando per farmaco
+ROW_GROUP_SIZE = 16384
+
+# =============================================================================
+# SCRITTURA
+# =============================================================================
+
+def drug_id(name: str) -> str:
+    """
+    ID farmaco dal nome, come nel database JSON generato dal CSV
+    Es: "ACICLOVIR" -> "aciclovir", "Acido Folico" -> "acido-folico"
+    """
+    return name.strip().lower().replace(' ', '-')
+
+
+def pairs_table(pairs: Iterable[Tuple[str, str, str]]) -> 'pa.Table':
+    """
+    Tabella Arrow (drug1, drug2, status) da coppie Python
+
+    Args:
+        pairs: Coppie (farmaco, altro farmaco, status)
+    """
+    drug1, drug2, status = [], [], []
+    for d1, d2, s in pairs:
+        drug1.append(d1)
+        drug2.append(d2)
+        status.append(s)
+    return pa.table({'drug1': pa.array(drug1, pa.string()),
+                     'drug2': pa.array(drug2, pa.string()),
+                     'status': pa.array(status, pa.string())})
+
+
+def _sorted_dictionary(table: 'pa.Table') -> 'pa.Table':
+    """Ordina per (drug1, drug2) e codifica le colonne come dizionario (categoriche in pandas)"""
+    if any(pa.types.is_dictionary(table[name].type) for name in PAIR_COLUMNS):
+        table = pa.table({name: table[name].cast(pa.string()) for name in PAIR_COLUMNS})
+    table = table.sort_by([('drug1', 'ascending'), ('drug2', 'ascending')])
+    return pa.table({name: pc.dictionary_encode(table[name]) for name in PAIR_COLUMNS})
+
+
+def flatten_drug(drug: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    """
+    Appiattisce un farmaco del database JSON in una riga della tabella metadati
+
+    {'name': {'it': 'X', 'en': 'Y'}} -> {'name_it': 'X', 'name_en': 'Y'};
+    le liste (es. compatibility) sono escluse: stanno nella tabella delle coppie.
+    """
+    row: Dict[str, Any] = {}
+    for key, value in drug.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            row.update(flatten_drug(value, f"{name}_"))
+        elif not isinstance(value, list):
+            row[name] = value
+    return row
+
+
+def write_compatibility_parquet(pairs: 'pa.Table', drugs: List[Dict[str, Any]], output_dir: str,
+                                metadata: Optional[Dict[str, Any]] = None) -> Tuple[Path, Path]:
+    """
+    Scrive compatibility.parquet e drugs.parquet in output_dir
+
+    Args:
+        pairs: Tabella (drug1, drug2, status) con gli id farmaco, vedi pairs_table()
+        drugs: Righe metadati farmaco (dict piatti con 'id', vedi flatten_drug)
+        output_dir: Cartella di output
+        metadata: Metadati export (sorgente, data, ...) salvati nello schema
+
+    Returns:
+        (path coppie, path farmaci)
+    """
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    metadata = {**(metadata or {}), 'drugKey': DRUG_KEY}
+    schema_metadata = {'compatibility_export': json.dumps(metadata, ensure_ascii=False)}
+
+    table = _sorted_dictionary(pairs).replace_schema_metadata(schema_metadata)
+    pairs_path = output / PAIRS_FILE
+    pq.write_table(table, pairs_path, row_group_size=ROW_GROUP_SIZE, compression='zstd')
+
+    drugs_table = pa.Table.from_pylist(drugs).replace_schema_metadata(schema_metadata)
+    drugs_path = output / DRUGS_FILE
+    pq.write_table(drugs_table, drugs_path, compression='zstd')
+
+    return pairs_path, drugs_path
+
+# =============================================================================
+# LETTURA
+# =============================================================================
+
+def compatibility_filters(drugs: Optional[List[str]] = None,
+                          statuses: Optional[List[str]] = None,
+                          both_sides: bool = False) -> Optional[List[List[Tuple]]]:
+    """
+    Filtri pyarrow (forma normale disgiuntiva) per farmaco e status
+
+    Di default il farmaco è cercato solo in drug1: il file è ordinato per
+    drug1, quindi i row group senza quel farmaco vengono saltati. Con
+    both_sides=True il filtro diventa (drug1 IN drugs OR drug2 IN drugs),
+    utile per i file con una sola direzione per coppia
+    (convert_sheet_to_json.py), ma senza salto dei row group per drug2.
+    """
+    status_filter = [('status', 'in', list(statuses))] if statuses else []
+    if drugs:
+        filters = [[('drug1', 'in', list(drugs))] + status_filter]
+        if both_sides:
+            filters.append([('drug2', 'in', list(drugs))] + status_filter)
+        return filters
+    return [status_filter] if status_filter else None
+
+
+def _orient_and_deduplicate(df, drugs: List[str]):
+    """
+    Una riga per coppia non ordinata, con il farmaco cercato in drug1
+
+    Le coppie salvate in entrambe le direzioni (csv-to-json-converter.py)
+    compaiono una sola volta; a parità di coppia resta la prima riga.
+    """
+    drug1 = df['drug1'].astype(str)
+    drug2 = df['drug2'].astype(str)
+    swap = ~drug1.isin(set(drugs))
+    oriented = df.assign(drug1=drug1.where(~swap, drug2), drug2=drug2.where(~swap, drug1))
+
+    low = oriented['drug1'].where(oriented['drug1'] <= oriented['drug2'], oriented['drug2'])
+    high = oriented['drug2'].where(oriented['drug1'] <= oriented['drug2'], oriented['drug1'])
+    keep = ~(low + '\x1f' + high).duplicated()
+    result = oriented[keep].reset_index(drop=True)
+    return result.astype({'drug1': 'category', 'drug2': 'category'})
+
+
+def load_compatibility(path: str, columns: Optional[List[str]] = None,
+                       drugs: Optional[List[str]] = None,
+                       statuses: Optional[List[str]] = None,
+                       both_sides: bool = False):
+    """
+    Carica le coppie in un DataFrame pandas (colonne categoriche)
+
+    Args:
+        path: compatibility.parquet
+        columns: Colonne da leggere (default: tutte); le altre non vengono lette dal disco
+        drugs: Solo coppie con questi id farmaco in drug1 (row group saltati dove possibile)
+        statuses: Solo questi status (es. ['I', '!'] o ['incompatible'])
+        both_sides: Cerca i farmaci anche in drug2; ogni coppia compare una
+                    sola volta, orientata con il farmaco cercato in drug1
+
+    Returns:
+        DataFrame
+    """
+    if not (drugs and both_sides):
+        table = pq.read_table(path, columns=columns, filters=compatibility_filters(drugs, statuses))
+        return table.to_pandas()
+
+    # Servono entrambe le colonne farmaco per orientare e deduplicare
+    read_columns = None if columns is None else list(dict.fromkeys(['drug1', 'drug2'] + columns))
+    table = pq.read_table(path, columns=read_columns,
+                          filters=compatibility_filters(drugs, statuses, both_sides=True))
+    df = _orient_and_deduplicate(table.to_pandas(), drugs)
+    return df if columns is None else df[columns]
+
+
+def load_drugs(path: str, columns: Optional[List[str]] = None):
+    """Carica drugs.parquet (solo le colonne richieste) in un DataFrame pandas"""
+    return pq.read_table(path, columns=columns).to_pandas()
+
+
+def read_export_metadata(path: str) -> Dict[str, Any]:
+    """Metadati export salvati nello schema (senza leggere i dati)"""
+    schema_metadata = pq.read_schema(path).metadata or {}
+    raw = schema_metadata.get(b'compatibility_export')
+    return json.loads(raw) if raw else {}
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Interroga compatibility.parquet (lettura selettiva per farmaco e colonne)'
+    )
+    parser.add_argument('path', help='File compatibility.parquet')
+    parser.add_argument('--drug', nargs='+', help='Farmaci da cercare (drug1 o drug2)')
+    parser.add_argument('--status', nargs='+', help='Status da includere')
+    parser.add_argument('--columns', nargs='+', choices=PAIR_COLUMNS, help='Colonne da leggere')
+    parser.add_argument('--both-sides', action='store_true',
+                        help='Cerca i farmaci anche in drug2 (file con una sola direzione per coppia)')
+    args = parser.parse_args()
+
+    if not HAS_PARQUET:
+        print("❌ pyarrow non installato (pip install pyarrow)")
+        sys.exit(1)
+
+    df = load_compatibility(args.path, columns=args.columns, drugs=args.drug, statuses=args.status,
+                            both_sides=args.both_sides)
+    metadata = read_export_metadata(args.path)
+    if metadata:
+        print(f"📄 Sorgente: {metadata.get('source', '?')} ({metadata.get('generatedAt', '?')})")
+    print(f"📊 {len(df)} coppie")
+    print(df.to_string(index=False, max_rows=50))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ INPUT FORMAT (CSV - v2.0 with new columns):
 OUTPUT:
     - public/data/drugs/index.json (DrugDatabaseEntry[])
     - public/data/drugs/compatibility.json (CompatibilityEntry[])
+    - con --parquet: compatibility.parquet + drugs.parquet (vedi compatibility_parquet.py)
 
 FEATURES:
     - ✅ BilingualText wrapping automatico
@@ -45,6 +46,8 @@ except ImportError:
     print("📦 Installa con: pip install pandas")
     sys.exit(1)
 
+from compatibility_parquet import HAS_PARQUET, flatten_drug, pairs_table, write_compatibility_parquet
+
 # ============================================================
 # CONFIGURAZIONE LOGGING
 # ============================================================
@@ -481,6 +484,11 @@ def main():
         default='public/data/drugs/',
         help='Directory output JSON (default: public/data/drugs/)'
     )
+    parser.add_argument(
+        '--parquet',
+        action='store_true',
+        help='Scrive anche compatibility.parquet e drugs.parquet (richiede pyarrow)'
+    )
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -542,7 +550,19 @@ def main():
             'Compatibility Matrix'
         )
         
-        # 7. Summary
+        # 7. Parquet (formato lungo per pandas / DuckDB)
+        if args.parquet:
+            if not HAS_PARQUET:
+                raise ValueError("--parquet richiede pyarrow (pip install pyarrow)")
+            pairs = ((entry['drug1Id'], entry['drug2Id'], entry['compatibility'])
+                     for entry in compatibility_entries)
+            pairs_path, drugs_path = write_compatibility_parquet(
+                pairs_table(pairs), [flatten_drug(drug) for drug in drugs], output_dir,
+                {'source': metadata['source'], 'generatedAt': metadata['lastUpdate']}
+            )
+            logger.info(f"✅ Parquet salvato: {pairs_path}, {drugs_path}")
+        
+        # 8. Summary
         logger.info("=" * 60)
         logger.info("✅ CONVERSIONE COMPLETATA CON SUCCESSO")
         logger.info("=" * 60)
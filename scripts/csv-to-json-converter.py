@@ -2,6 +2,7 @@
 """
 CSV to JSON Drug Database Converter
 Converte il file CSV della compatibilità farmaci in JSON per l'app Medical Utility
+Con pyarrow installato scrive anche la matrice in Parquet (vedi compatibility_parquet.py)
 """
 
 import csv
@@ -11,6 +12,8 @@ import sys
 from typing import Dict, List, Any
 from datetime import datetime
 
+from compatibility_parquet import HAS_PARQUET, drug_id, flatten_drug, pairs_table, write_compatibility_parquet
+
 
 def clean_value(value: str) -> str:
     """Pulisce e normalizza un valore dal CSV"""
@@ -111,7 +114,7 @@ def create_drug_id(drug_name: str) -> str:
     Crea un ID univoco dal nome del farmaco
     Es: "ACICLOVIR" -> "aciclovir"
     """
-    return drug_name.strip().lower().replace(' ', '-')
+    return drug_id(drug_name)
 
 
 def convert_csv_to_json(csv_path: str, output_dir: str) -> Dict[str, Any]:
@@ -304,6 +307,18 @@ def convert_csv_to_json(csv_path: str, output_dir: str) -> Dict[str, Any]:
     print(f"   • Dimensione leggibile: {size_readable:.1f} KB")
     print(f"   • Dimensione minificata: {size_min:.1f} KB")
     
+    # Formato colonnare per analisi (pandas / DuckDB)
+    if HAS_PARQUET:
+        pairs = ((drug['id'], entry['drugId'], entry['status'])
+                 for drug in drugs_data for entry in drug['compatibility'])
+        pairs_path, drugs_path = write_compatibility_parquet(
+            pairs_table(pairs), [flatten_drug(drug) for drug in drugs_data], output_dir,
+            {'source': metadata['sourceFile'], 'generatedAt': metadata['generatedAt']}
+        )
+        print(f"   • Parquet: {pairs_path} ({os.path.getsize(pairs_path) / 1024:.1f} KB), {drugs_path}")
+    else:
+        print("   • Parquet saltato (pip install pyarrow)")
+    
     return database
 
 
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Known drug-name vocabulary
+Loaded from the generated database (drugs-database.min.json, see csv-to-json-converter.py)
+
+Every drug contributes several aliases (Italian name, English name, id),
+all mapped to one canonical display name. Used by the OCR extractors to
+snap garbled names to known drugs, and to find drug mentions in
+extracted text with a single pass per page (DrugMatcher).
+
+Usage:
+    vocabulary = load_drug_vocabulary()
+    snap_to_vocabulary('AMIKACINA SOLFAT0', vocabulary)  # -> 'Amikacina Solfato'
+    DrugMatcher(vocabulary).find('Amikacin + heparin')   # -> [(0, 8, 'Amikacina Solfato'), ...]
+"""
+
+import difflib
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DATABASE_RELATIVE_PATH = Path('public') / 'data' / 'drugs-database.min.json'
+
+# Shortest first word of a multi-word name usable as an alias on its own
+MIN_BASE_NAME_LENGTH = 5
+# First words that name a family, not a drug ("vitamin k" != "vitamin b12")
+BASE_NAME_STOPWORDS = {'vitamin', 'vitamina'}
+
+
+def find_database_path() -> Optional[Path]:
+    """Locate public/data/drugs-database.min.json walking up from this script"""
+    for parent in Path(__file__).resolve().parents:
+        candidate = parent / DATABASE_RELATIVE_PATH
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a drug name for matching
+
+    Lowercase, accents stripped, punctuation/separators collapsed to spaces.
+        "Amoxicillina/Acido-Clavulanico" -> "amoxicillina acido clavulanico"
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r'[^a-z0-9]+', ' ', name.lower())
+    return ' '.join(name.split())
+
+
+def normalize_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """
+    normalize_name() that also maps every output character back to the input
+
+    Returns:
+        (normalized text, offsets) where offsets[i] is the index in `text`
+        of the character that produced normalized[i]
+    """
+    chars: List[str] = []
+    offsets: List[int] = []
+    for i, ch in enumerate(text):
+        for c in unicodedata.normalize('NFKD', ch).lower():
+            if unicodedata.combining(c):
+                continue
+            if 'a' <= c <= 'z' or '0' <= c <= '9':
+                chars.append(c)
+                offsets.append(i)
+            elif chars and chars[-1] != ' ':
+                chars.append(' ')
+                offsets.append(i)
+
+    if chars and chars[-1] == ' ':
+        chars.pop()
+        offsets.pop()
+    return ''.join(chars), offsets
+
+
+def load_drug_vocabulary(database_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Load known drug names and aliases
+
+    Args:
+        database_path: Path to drugs-database.min.json (default: auto-detect)
+
+    Returns:
+        Dict normalized alias -> canonical name (Italian name, title case).
+        Empty if the database is not available.
+    """
+    path = Path(database_path) if database_path else find_database_path()
+    if path is None or not path.exists():
+        print(f"⚠️  Drug database not found ({path or DATABASE_RELATIVE_PATH}), vocabulary empty")
+        return {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        database = json.load(f)
+
+    vocabulary = {}
+    base_names: Dict[str, set] = {}
+    for drug in database.get('drugs', []):
+        names = drug.get('name', {})
+        canonical = (names.get('it') or names.get('en') or drug.get('id', '')).strip().title()
+        if not canonical:
+            continue
+
+        for alias in (names.get('it'), names.get('en'), drug.get('id')):
+            if alias:
+                key = normalize_name(alias)
+                vocabulary.setdefault(key, canonical)
+                # "amikacin sulfate" is usually written just "amikacin"
+                if ' ' in key:
+                    base_names.setdefault(key.split(' ')[0], set()).add(canonical)
+
+    # Base names only when they identify a single drug ("acido" does not)
+    for base, canonicals in base_names.items():
+        if len(canonicals) == 1 and len(base) >= MIN_BASE_NAME_LENGTH and base not in BASE_NAME_STOPWORDS:
+            vocabulary.setdefault(base, next(iter(canonicals)))
+
+    return vocabulary
+
+
+def snap_to_vocabulary(name: str, vocabulary: Dict[str, str], cutoff: float = 0.8) -> Optional[str]:
+    """
+    Snap an OCR'd name to the closest known drug
+
+    Args:
+        name: Raw or cleaned OCR text
+        vocabulary: Output of load_drug_vocabulary()
+        cutoff: Minimum similarity ratio (0-1)
+
+    Returns:
+        Canonical drug name, or None if nothing is close enough
+    """
+    key = normalize_name(name)
+    if not key or not vocabulary:
+        return None
+    if key in vocabulary:
+        return vocabulary[key]
+
+    matches = difflib.get_close_matches(key, list(vocabulary), n=1, cutoff=cutoff)
+    return vocabulary[matches[0]] if matches else None
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Regex for a character trie; '' marks the end of an alias (longest match first)"""
+    branches = [re.escape(c) + _trie_pattern(child) for c, child in sorted(node.items()) if c]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+class DrugMatcher:
+    """
+    Multi-pattern matcher for all vocabulary aliases
+
+    The aliases are compiled once into a single trie-shaped regex, so each
+    text is scanned in one pass regardless of the vocabulary size.
+    Matching works on normalized text (case, accents, punctuation) and
+    only on whole words; the longest alias wins.
+    """
+
+    def __init__(self, vocabulary: Dict[str, str]):
+        self.vocabulary = vocabulary
+        trie: Dict = {}
+        for alias in vocabulary:
+            node = trie
+            for c in alias:
+                node = node.setdefault(c, {})
+            node[''] = {}
+
+        body = _trie_pattern(trie)
+        self.pattern = re.compile(r'(?<![a-z0-9])' + body + r'(?![a-z0-9])') if body else None
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Find drug mentions in text
+
+        Returns:
+            List of (start, end, canonical name), offsets into the original text
+        """
+        if self.pattern is None:
+            return []
+
+        normalized, offsets = normalize_with_offsets(text)
+        return [(offsets[m.start()], offsets[m.end() - 1] + 1, self.vocabulary[m.group()])
+                for m in self.pattern.finditer(normalized)]
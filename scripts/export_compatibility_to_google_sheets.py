@@ -5,14 +5,53 @@ Basato sul vecchio progetto drugsCompatibility (Java)
 
 Autore: Vasile Chifeac
 Data: 2024-11-09
+
+Usage:
+    python export_compatibility_to_google_sheets.py                      # chiede il metodo di export
+    python export_compatibility_to_google_sheets.py --export csv         # non interattivo
+    python export_compatibility_to_google_sheets.py --export parquet --parquet-dir output/
+    python export_compatibility_to_google_sheets.py --sqlite fixture.db --export sheets --sheets-client fake
+    python export_compatibility_to_google_sheets.py --make-fixture fixture.db --size 200
+    python export_compatibility_to_google_sheets.py --benchmark --sizes 50 100 200 400
+
+Sorgenti: PostgreSQL (default) oppure un file SQLite con la stessa tabella
+(fixture per test/CI). Destinazioni Google Sheets: client gspread reale
+oppure fake_gspread.FakeClient (nessuna rete, conta richieste e byte).
 """
 
-import psycopg2
+import numpy as np
 import pandas as pd
-from google.oauth2.service_account import Credentials
-import gspread
-from typing import List, Dict
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sqlite3
 import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+try:
+    from google.oauth2.service_account import Credentials
+    import gspread
+except ImportError:
+    gspread = None
+
+from compatibility_parquet import HAS_PARQUET, drug_id, write_compatibility_parquet
+
+try:
+    import resource  # solo Unix: RSS massimo del processo
+except ImportError:
+    resource = None
 
 # =============================================================================
 # CONFIGURAZIONE
@@ -35,12 +74,40 @@ SPREADSHEET_ID = "1J08Hz65aaztX9DuuRYMTMW6yt0tDEztuDLqIv5r1K8k"
 TABLE_NAME = "drugsCompatibility"
 COLUMN_NAME = "name_of_drugs"
 
+# Colonne per query nella lettura della tabella larga
+# (PostgreSQL accetta al massimo 1664 colonne in una SELECT)
+MAX_COLUMNS_PER_QUERY = 1000
+
+# Frequenza dei codici nelle tabelle sintetiche (fixture / benchmark)
+SYNTHETIC_CODE_WEIGHTS = {'C': 0.17, 'Y': 0.13, 'I': 0.20, '!': 0.02, '': 0.24, None: 0.24}
+
+# Cursore lato server (named cursor): righe trasferite a blocchi di ITERSIZE
+ITERSIZE = 2000
+
+# Snapshot dell'ultimo export (hash per riga): si inviano solo le righe cambiate
+SNAPSHOT_FILE = '.export_snapshot.json'
+
+# Dimensione massima di ogni corpo spreadsheets.batchUpdate (la API consiglia ~2 MB)
+SHEETS_MAX_REQUEST_BYTES = 2 * 1024 * 1024
+
+# Formattazione condizionale: C = Verde, Y = Giallo, I = Rosso, ! = Arancione, '' = Grigio
+COMPATIBILITY_COLORS = {
+    'C': {'red': 0.72, 'green': 0.88, 'blue': 0.80},
+    'Y': {'red': 1.0, 'green': 0.95, 'blue': 0.70},
+    'I': {'red': 0.96, 'green': 0.78, 'blue': 0.76},
+    '!': {'red': 0.99, 'green': 0.82, 'blue': 0.62},
+}
+BLANK_COLOR = {'red': 0.9, 'green': 0.9, 'blue': 0.9}
+
 # =============================================================================
 # FUNZIONI DATABASE
 # =============================================================================
 
 def connect_to_postgres():
     """Connessione al database PostgreSQL"""
+    if psycopg2 is None:
+        print("❌ psycopg2 non installato (pip install psycopg2-binary)")
+        sys.exit(1)
     try:
         conn = psycopg2.connect(
             host=DB_CONFIG['host'],
@@ -56,6 +123,55 @@ def connect_to_postgres():
         sys.exit(1)
 
 
+def connect_to_sqlite(path: str):
+    """
+    Connessione a un file SQLite con la stessa tabella (fixture per test/CI)
+    
+    Le query dell'export sono SQL standard, quindi funzionano su entrambi;
+    solo il cursore lato server (--server-side-cursor) è specifico di PostgreSQL.
+    """
+    if not os.path.exists(path):
+        print(f"❌ Fixture SQLite non trovata: {path}")
+        sys.exit(1)
+    conn = sqlite3.connect(path)
+    print(f"✅ Connesso a SQLite ({path})")
+    return conn
+
+
+def quote_identifier(name: str) -> str:
+    """Identificatore SQL tra virgolette (nomi farmaco con spazi, maiuscole, apici)"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def create_synthetic_table(conn, n_drugs: int, seed: int = 0) -> List[str]:
+    """
+    Crea in SQLite la tabella larga con n farmaci e codici casuali (SYNTHETIC_CODE_WEIGHTS)
+    
+    Stessa forma della tabella reale: colonna name_of_drugs + una colonna
+    per farmaco, NULL o stringa vuota = nessun dato.
+    
+    Returns:
+        Nomi dei farmaci
+    """
+    rng = random.Random(seed)
+    drugs = [f"Farmaco {i:04d}" for i in range(n_drugs)]
+    codes = list(SYNTHETIC_CODE_WEIGHTS)
+    weights = list(SYNTHETIC_CODE_WEIGHTS.values())
+    
+    columns = ', '.join(f"{quote_identifier(d)} TEXT" for d in drugs)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+        cursor.execute(f"CREATE TABLE {TABLE_NAME} ({COLUMN_NAME} TEXT, {columns})")
+        placeholders = ', '.join(['?'] * (n_drugs + 1))
+        cursor.executemany(f"INSERT INTO {TABLE_NAME} VALUES ({placeholders})",
+                           ([drug] + rng.choices(codes, weights, k=n_drugs) for drug in drugs))
+        conn.commit()
+    finally:
+        cursor.close()
+    return drugs
+
+
 def read_all_drugs(conn) -> List[str]:
     """
     Legge tutti i nomi dei farmaci dalla colonna name_of_drugs
@@ -76,73 +192,250 @@ def read_all_drugs(conn) -> List[str]:
         cursor.close()
 
 
-def read_compatibility(conn, drug1: str, drug2: str) -> str:
+def read_table_columns(conn) -> List[str]:
+    """Nomi delle colonne della tabella (senza leggere righe)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT * FROM {TABLE_NAME} LIMIT 0")
+        return [column[0] for column in cursor.description]
+    finally:
+        cursor.close()
+
+
+class CompatibilityMatrixBuilder:
     """
-    Legge la compatibilità tra due farmaci
-    Equivalente Java: readSpecificDate(String tableName, String column, String nameRow)
+    Matrice di compatibilità costruita incrementalmente, blocco di righe per blocco
     
-    Ritorna:
-    - 'C' = Compatible
-    - 'Y' = Y-site compatible
-    - 'I' = Incompatible
-    - '!' = Conflicting data
-    - '' = No data
+    I codici sono salvati come interi (uint8, 1 byte per cella) e non come
+    stringhe Python: la memoria cresce con n² byte, non con n² oggetti.
+    matrix[drug1, drug2] è la colonna drug1 della riga drug2 della tabella,
+    quindi ogni blocco di righe riempie colonne della matrice.
     """
-    cursor = conn.cursor()
     
-    try:
-        # Query: trova la riga con drug2 e leggi la colonna drug1
-        query = f'''
-        SELECT "{drug1}"
-        FROM {TABLE_NAME}
-        WHERE {COLUMN_NAME} = %s
-        '''
+    def __init__(self, drugs: List[str]):
+        self.drugs = drugs
+        self.index = {drug: i for i, drug in enumerate(drugs)}
+        # Codice 0 = nessun dato, 1 = 'C' (diagonale: stesso farmaco = sempre compatibile)
+        self.code_index = {'': 0, 'C': 1}
+        self.codes = np.zeros((len(drugs), len(drugs)), dtype=np.uint8)
+        self.rows = 0
+    
+    def add_rows(self, names: List[str], columns: List[str], rows: List[tuple]):
+        """
+        Aggiunge un blocco di righe della tabella
         
-        cursor.execute(query, (drug2,))
-        result = cursor.fetchone()
+        Args:
+            names: Nomi delle colonne del risultato (come cursor.description)
+            columns: Colonne farmaco da leggere (sottoinsieme di names)
+            rows: Righe del blocco
+        """
+        self.rows += len(rows)
+        positions = [names.index(COLUMN_NAME)] + [names.index(c) for c in columns]
+        values = np.array(rows, dtype=object)[:, positions]
         
-        if result:
-            compatibility = result[0] if result[0] else ''
-            return compatibility
-        return ''
+        known = np.array([name in self.index for name in values[:, 0]], dtype=bool)
+        drug2 = [self.index[name] for name in values[known, 0]]
+        drug1 = [self.index[c] for c in columns]
         
-    except Exception as e:
-        print(f"❌ Errore lettura compatibilità {drug1} - {drug2}: {e}")
-        return ''
-    finally:
-        cursor.close()
+        # NULL / stringa vuota = nessun dato
+        cells = values[known, 1:]
+        cells[pd.isna(cells)] = ''
+        labels, inverse = np.unique(cells.astype(str), return_inverse=True)
+        label_codes = np.array([self.code_index.setdefault(label, len(self.code_index)) for label in labels],
+                               dtype=np.uint8)
+        
+        self.codes[np.ix_(drug1, drug2)] = label_codes[inverse].reshape(cells.shape).T
+    
+    def labels(self) -> np.ndarray:
+        return np.array(list(self.code_index), dtype=object)
+    
+    def _row_codes(self, i: int) -> np.ndarray:
+        row = self.codes[i].copy()
+        row[i] = self.code_index['C']
+        return row
+    
+    def row_values(self, i: int, labels: Optional[np.ndarray] = None) -> List[str]:
+        """Riga i come nel foglio/CSV: [farmaco, codice, codice, ...]"""
+        labels = self.labels() if labels is None else labels
+        return [self.drugs[i]] + labels[self._row_codes(i)].tolist()
+    
+    def row_hashes(self) -> List[str]:
+        """SHA-256 di ogni riga (sui codici decodificati: indipendente dalla numerazione interna)"""
+        labels = self.labels()
+        return [hashlib.sha256('\x1f'.join(self.row_values(i, labels)).encode('utf-8')).hexdigest()
+                for i in range(len(self.drugs))]
+    
+    def to_dataframe(self) -> pd.DataFrame:
+        """Matrice completa come DataFrame di stringhe (diagonale 'C')"""
+        codes = self.codes.copy()
+        np.fill_diagonal(codes, self.code_index['C'])
+        return pd.DataFrame(self.labels()[codes], index=self.drugs, columns=self.drugs)
+    
+    def write_csv(self, filename: str):
+        """Scrive la matrice riga per riga (stesso formato di DataFrame.to_csv)"""
+        labels = self.labels()
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([''] + self.drugs)
+            for i in range(len(self.drugs)):
+                writer.writerow(self.row_values(i, labels))
 
 
-def build_compatibility_matrix(conn, drugs: List[str]) -> pd.DataFrame:
+def read_compatibility_table(conn, builder: CompatibilityMatrixBuilder,
+                             server_side: bool = False, itersize: int = ITERSIZE) -> Dict[str, int]:
     """
-    Costruisce la matrice completa di compatibilità
+    Legge tutta la tabella larga in poche query, riempiendo il builder
+    
+    Una sola SELECT * se le colonne sono al massimo MAX_COLUMNS_PER_QUERY,
+    altrimenti una SELECT per blocco di colonne (sempre con la colonna dei
+    nomi), invece di una query per ogni coppia di farmaci.
+    
+    Con server_side=True ogni query usa un cursore con nome (lato server):
+    le righe arrivano a blocchi di `itersize` e il client non tiene mai
+    in memoria l'intero risultato.
+    
+    Returns:
+        {'queries', 'rows'}
+    """
+    index = builder.index
+    
+    # Solo colonne che corrispondono a farmaci (le altre vengono ignorate)
+    columns = [c for c in read_table_columns(conn) if c != COLUMN_NAME and c in index]
+    if not columns:
+        return {'queries': 0, 'rows': 0}
+    
+    # Nome tabella senza virgolette come in read_all_drugs (PostgreSQL lo porta in minuscolo)
+    if len(columns) <= MAX_COLUMNS_PER_QUERY:
+        queries = [f"SELECT * FROM {TABLE_NAME}"]
+    else:
+        queries = []
+        for start in range(0, len(columns), MAX_COLUMNS_PER_QUERY):
+            batch = [COLUMN_NAME] + columns[start:start + MAX_COLUMNS_PER_QUERY]
+            queries.append(f"SELECT {', '.join(quote_identifier(c) for c in batch)} FROM {TABLE_NAME}")
+    
+    rows_read = 0
+    for number, query in enumerate(queries):
+        if server_side:
+            cursor = conn.cursor(name=f"compatibility_export_{number}")
+            cursor.itersize = itersize
+        else:
+            cursor = conn.cursor()
+        
+        try:
+            cursor.execute(query)
+            # Con un named cursor description è disponibile dopo il primo fetch
+            rows = cursor.fetchmany(itersize)
+            names = [column[0] for column in cursor.description]
+            batch = [c for c in names if c != COLUMN_NAME and c in index]
+            while rows:
+                builder.add_rows(names, batch, rows)
+                rows_read += len(rows)
+                rows = cursor.fetchmany(itersize)
+        finally:
+            cursor.close()
+    
+    print(f"   {len(queries)} query per {len(columns)} colonne")
+    return {'queries': len(queries), 'rows': rows_read}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """RSS massimo del processo in MB (None se non disponibile)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KB, macOS: byte
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def stream_compatibility_matrix(conn, drugs: List[str], server_side: bool = False,
+                                itersize: int = ITERSIZE) -> CompatibilityMatrixBuilder:
+    """
+    Legge la tabella in un CompatibilityMatrixBuilder (vedi read_compatibility_table)
+    
+    Stampa righe/s e RSS massimo: con server_side=True la memoria resta
+    costante al crescere della tabella (oltre agli n² byte della matrice).
     """
     print("\n📊 Costruendo matrice compatibilità...")
+    start = time.perf_counter()
     
-    # Crea DataFrame vuoto
-    matrix = pd.DataFrame(index=drugs, columns=drugs)
+    n = len(drugs)
+    builder = CompatibilityMatrixBuilder(drugs)
+    stats = read_compatibility_table(conn, builder, server_side=server_side, itersize=itersize)
     
-    total = len(drugs) * len(drugs)
-    current = 0
+    elapsed = time.perf_counter() - start
+    print(f"✅ Matrice completata: {n}x{n} celle in {elapsed:.2f}s "
+          f"(prima: {n * (n - 1)} query, una per coppia)")
     
-    for drug1 in drugs:
-        for drug2 in drugs:
-            current += 1
-            
-            if drug1 == drug2:
-                # Stesso farmaco = sempre compatibile
-                matrix.loc[drug1, drug2] = 'C'
-            else:
-                # Leggi compatibilità dal database
-                compatibility = read_compatibility(conn, drug1, drug2)
-                matrix.loc[drug1, drug2] = compatibility
-            
-            # Progress
-            if current % 10 == 0:
-                print(f"   Progresso: {current}/{total} ({current*100//total}%)")
+    rate = stats['rows'] / elapsed if elapsed else 0.0
+    peak = peak_rss_mb()
+    cursor_kind = f"cursore lato server, itersize {itersize}" if server_side else "cursore client"
+    print(f"📈 {stats['rows']} righe, {rate:.0f} righe/s ({cursor_kind})"
+          + (f", RSS massimo {peak:.1f} MB" if peak is not None else ''))
+    return builder
+
+
+def build_compatibility_matrix(conn, drugs: List[str], server_side: bool = False,
+                               itersize: int = ITERSIZE) -> pd.DataFrame:
+    """
+    Costruisce la matrice completa di compatibilità
     
-    print(f"✅ Matrice completata: {len(drugs)}x{len(drugs)} celle")
-    return matrix
+    La tabella viene letta per intero (read_compatibility_table) invece di
+    una query per coppia; matrix[drug1, drug2] è la colonna drug1 della
+    riga drug2.
+    """
+    return stream_compatibility_matrix(conn, drugs, server_side, itersize).to_dataframe()
+
+
+# =============================================================================
+# SNAPSHOT (EXPORT INCREMENTALE)
+# =============================================================================
+
+def load_snapshot(path: str = SNAPSHOT_FILE) -> Dict[str, Dict]:
+    """
+    Snapshot dell'ultimo export, una sezione per destinazione
+    
+    {'sheets': {'drugs': [...], 'rows': [hash, ...]},
+     'csv': {'drugs': [...], 'rows': [...], 'file': ..., 'file_hash': ...}}
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_snapshot(snapshot: Dict[str, Dict], path: str = SNAPSHOT_FILE):
+    """Salva lo snapshot (scrittura atomica)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def changed_rows(previous: Optional[Dict], drugs: List[str], hashes: List[str]) -> Optional[List[int]]:
+    """
+    Righe cambiate rispetto allo snapshot
+    
+    Returns:
+        Indici delle righe cambiate (lista vuota = nessuna modifica), oppure
+        None se serve un export completo (nessuno snapshot o farmaci
+        aggiunti/rimossi/riordinati: cambiano anche le colonne)
+    """
+    if not previous or previous.get('drugs') != drugs or len(previous.get('rows', [])) != len(hashes):
+        return None
+    return [i for i, (old, new) in enumerate(zip(previous['rows'], hashes)) if old != new]
+
+
+def row_ranges(rows: List[int]) -> List[Tuple[int, int]]:
+    """Raggruppa indici di riga ordinati in intervalli contigui [start, end]"""
+    ranges: List[Tuple[int, int]] = []
+    for i in rows:
+        if ranges and i == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], i)
+        else:
+            ranges.append((i, i))
+    return ranges
 
 
 # =============================================================================
@@ -160,6 +453,9 @@ def connect_to_google_sheets(credentials_file: str = None):
     4. Crea credenziali (Service Account)
     5. Scarica JSON e salvalo come 'credentials.json'
     """
+    if gspread is None:
+        print("❌ gspread non installato (pip install gspread google-auth)")
+        sys.exit(1)
     try:
         if not credentials_file:
             credentials_file = 'credentials.json'
@@ -185,60 +481,297 @@ def connect_to_google_sheets(credentials_file: str = None):
         sys.exit(1)
 
 
-def upload_to_google_sheets(client, spreadsheet_id: str, matrix: pd.DataFrame):
+def _cell(value: str) -> Dict:
+    """Cella per updateCells (vuota = {} : nessun valore, la cella viene svuotata)"""
+    return {'userEnteredValue': {'stringValue': value}} if value else {}
+
+
+def _grid_range(sheet_id: int, start_row: int, end_row: int, start_col: int, end_col: int) -> Dict:
+    """GridRange della Sheets API (indici 0-based, estremo finale escluso)"""
+    return {'sheetId': sheet_id, 'startRowIndex': start_row, 'endRowIndex': end_row,
+            'startColumnIndex': start_col, 'endColumnIndex': end_col}
+
+
+def _matrix_rows(matrix) -> Tuple[List[str], Callable[[int], List[str]]]:
+    """Farmaci e funzione riga i -> [farmaco, codice, ...] per builder o DataFrame"""
+    if isinstance(matrix, CompatibilityMatrixBuilder):
+        labels = matrix.labels()
+        return matrix.drugs, lambda i: matrix.row_values(i, labels)
+    drugs = matrix.index.tolist()
+    return drugs, lambda i: [drugs[i]] + matrix.iloc[i].tolist()
+
+
+def value_requests(sheet_id: int, ranges: List[Tuple[int, int]], row_values: Callable[[int], List[str]],
+                   max_bytes: int = SHEETS_MAX_REQUEST_BYTES) -> Iterator[Tuple[Dict, int]]:
+    """
+    Richieste updateCells per intervalli di righe del foglio, a blocchi limitati in byte
+    
+    Le righe contigue finiscono nella stessa richiesta finché il suo JSON
+    resta sotto max_bytes; una riga più grande del limite va da sola.
+    
+    Args:
+        sheet_id: ID del foglio (worksheet.id)
+        ranges: Intervalli [start, end] di righe del foglio (0-based, inclusi)
+        row_values: Funzione riga del foglio -> valori (colonna A in poi)
+        max_bytes: Dimensione massima (circa) di ogni richiesta
+    
+    Yields:
+        (richiesta, byte JSON della richiesta)
+    """
+    for start, end in ranges:
+        chunk: List[Dict] = []
+        chunk_start = start
+        chunk_bytes = 0
+        width = 0
+        for row in range(start, end + 1):
+            values = row_values(row)
+            encoded = {'values': [_cell(value) for value in values]}
+            size = len(json.dumps(encoded)) + 1
+            if chunk and chunk_bytes + size > max_bytes:
+                yield _update_cells(sheet_id, chunk_start, chunk, width), chunk_bytes
+                chunk, chunk_start, chunk_bytes, width = [], row, 0, 0
+            chunk.append(encoded)
+            chunk_bytes += size
+            width = max(width, len(values))
+        if chunk:
+            yield _update_cells(sheet_id, chunk_start, chunk, width), chunk_bytes
+
+
+def _update_cells(sheet_id: int, start_row: int, rows: List[Dict], width: int) -> Dict:
+    return {'updateCells': {
+        'range': _grid_range(sheet_id, start_row, start_row + len(rows), 0, width),
+        'rows': rows,
+        'fields': 'userEnteredValue',
+    }}
+
+
+def pack_requests(requests: Iterator[Tuple[Dict, int]],
+                  max_bytes: int = SHEETS_MAX_REQUEST_BYTES) -> Iterator[List[Dict]]:
+    """
+    Raggruppa le richieste in corpi batch_update sotto max_bytes
+    
+    L'ordine è mantenuto (la struttura del foglio precede i valori), quindi
+    ogni corpo si applica dopo il precedente come in un'unica richiesta.
+    """
+    batch: List[Dict] = []
+    batch_bytes = 0
+    for request, size in requests:
+        if batch and batch_bytes + size > max_bytes:
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(request)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def _rule_conditions() -> List[Tuple[Dict, Dict]]:
+    """(condizione, colore) delle regole dell'exporter: C/Y/I/! e cella vuota"""
+    conditions = [{'type': 'TEXT_EQ', 'values': [{'userEnteredValue': code}]} for code in COMPATIBILITY_COLORS]
+    conditions.append({'type': 'BLANK'})
+    return list(zip(conditions, list(COMPATIBILITY_COLORS.values()) + [BLANK_COLOR]))
+
+
+def structure_requests(sheet_id: int, n_drugs: int, existing_rules: Iterable[int] = ()) -> List[Dict]:
+    """
+    Richieste di struttura per il foglio completo
+    
+    - dimensioni esatte (n + 1) x (n + 1) e prima riga/colonna bloccate
+    - contenuto precedente cancellato
+    - intestazioni in grassetto
+    - regole di formattazione condizionale C/Y/I/! (e vuoto) sulla matrice,
+      al posto di un formato per ogni cella; le regole di un export precedente
+      (indici existing_rules, vedi _exporter_rules) vengono rimosse, le altre restano
+    """
+    size = n_drugs + 1
+    matrix_range = _grid_range(sheet_id, 1, size, 1, size)
+    bold = {'userEnteredFormat': {'textFormat': {'bold': True}}}
+    
+    requests = [
+        {'updateSheetProperties': {
+            'properties': {'sheetId': sheet_id, 'gridProperties': {
+                'rowCount': size, 'columnCount': size, 'frozenRowCount': 1, 'frozenColumnCount': 1}},
+            'fields': 'gridProperties(rowCount,columnCount,frozenRowCount,frozenColumnCount)',
+        }},
+        {'updateCells': {'range': {'sheetId': sheet_id}, 'fields': 'userEnteredValue'}},
+        {'repeatCell': {'range': _grid_range(sheet_id, 0, 1, 0, size), 'cell': bold,
+                        'fields': 'userEnteredFormat.textFormat.bold'}},
+        {'repeatCell': {'range': _grid_range(sheet_id, 0, size, 0, 1), 'cell': bold,
+                        'fields': 'userEnteredFormat.textFormat.bold'}},
+    ]
+    
+    # Dall'ultima alla prima: gli indici delle regole rimaste non cambiano
+    requests += [{'deleteConditionalFormatRule': {'sheetId': sheet_id, 'index': index}}
+                 for index in sorted(existing_rules, reverse=True)]
+    
+    requests += [{'addConditionalFormatRule': {'index': index, 'rule': {
+        'ranges': [matrix_range],
+        'booleanRule': {'condition': condition, 'format': {'backgroundColor': color}},
+    }}} for index, (condition, color) in enumerate(_rule_conditions())]
+    return requests
+
+
+def _is_exporter_rule(rule: Dict) -> bool:
+    """
+    Regola creata da structure_requests: una sola range che parte da B2
+    (la matrice) e condizione C/Y/I/! o vuoto. Le regole aggiunte a mano
+    su altre celle o con altre condizioni non corrispondono.
+    """
+    ranges = rule.get('ranges', [])
+    if len(ranges) != 1 or ranges[0].get('startRowIndex') != 1 or ranges[0].get('startColumnIndex') != 1:
+        return False
+    condition = rule.get('booleanRule', {}).get('condition')
+    return any(condition == own for own, _ in _rule_conditions())
+
+
+def _exporter_rules(spreadsheet, sheet_id: int) -> List[int]:
+    """Indici delle regole di formattazione condizionale create da un export precedente"""
+    metadata = spreadsheet.fetch_sheet_metadata({'fields': 'sheets(properties.sheetId,conditionalFormats)'})
+    for sheet in metadata.get('sheets', []):
+        if sheet.get('properties', {}).get('sheetId') == sheet_id:
+            return [index for index, rule in enumerate(sheet.get('conditionalFormats', []))
+                    if _is_exporter_rule(rule)]
+    return []
+
+
+def send_requests(spreadsheet, requests: Iterator[Tuple[Dict, int]],
+                  max_bytes: int = SHEETS_MAX_REQUEST_BYTES) -> Dict[str, int]:
+    """
+    Invia le richieste con spreadsheet.batch_update, un corpo per blocco
+    
+    Returns:
+        {'calls': chiamate batch_update, 'requests': richieste, 'bytes': byte JSON inviati}
+    """
+    stats = {'calls': 0, 'requests': 0, 'bytes': 0}
+    for batch in pack_requests(requests, max_bytes):
+        body = {'requests': batch}
+        spreadsheet.batch_update(body)
+        stats['calls'] += 1
+        stats['requests'] += len(batch)
+        stats['bytes'] += len(json.dumps(body))
+    return stats
+
+
+def _with_sizes(requests: List[Dict]) -> Iterator[Tuple[Dict, int]]:
+    return ((request, len(json.dumps(request))) for request in requests)
+
+
+def upload_to_google_sheets(client, spreadsheet_id: str, matrix,
+                            max_bytes: int = SHEETS_MAX_REQUEST_BYTES) -> bool:
     """
     Carica la matrice su Google Sheets
+    
+    Struttura, formattazione e valori viaggiano come richieste di un unico
+    spreadsheet.batch_update; se il payload supera max_bytes viene diviso
+    in più corpi consecutivi (di solito uno solo per qualche centinaio di farmaci).
+    
+    Args:
+        matrix: CompatibilityMatrixBuilder oppure DataFrame
+        max_bytes: Dimensione massima di ogni corpo batch_update
     """
     try:
         # Apri foglio
         spreadsheet = client.open_by_key(spreadsheet_id)
         worksheet = spreadsheet.sheet1
+        sheet_id = worksheet.id
         
         print("\n📤 Caricando dati su Google Sheets...")
         
-        # Prepara dati: header + righe
-        drugs = matrix.index.tolist()
-        
-        # Header row (prima riga con nomi farmaci)
+        drugs, row_values = _matrix_rows(matrix)
         header = [''] + drugs
+        # Riga 0 del foglio = intestazione, riga i + 1 = farmaco i
+        sheet_row = lambda row: header if row == 0 else row_values(row - 1)
         
-        # Data rows
-        data = [header]
-        for drug in drugs:
-            row = [drug] + matrix.loc[drug].tolist()
-            data.append(row)
+        structure = structure_requests(sheet_id, len(drugs), _exporter_rules(spreadsheet, sheet_id))
+        values = value_requests(sheet_id, [(0, len(drugs))], sheet_row, max_bytes)
+        stats = send_requests(spreadsheet, chain(_with_sizes(structure), values), max_bytes)
         
-        # Carica tutto in una volta
-        worksheet.clear()
-        worksheet.update(data, 'A1')
+        print(f"✅ Dati caricati con successo! ({stats['calls']} batch_update, "
+              f"{stats['requests']} richieste, {stats['bytes'] / 1024:.0f} KB)")
+        print(f"🔗 Apri: {SPREADSHEET_URL}")
+        return True
         
-        # Formattazione
-        print("🎨 Applicando formattazione...")
+    except Exception as e:
+        print(f"❌ Errore upload Google Sheets: {e}")
+        return False
+
+
+def upload_changed_rows(client, spreadsheet_id: str, matrix: CompatibilityMatrixBuilder,
+                        rows: List[int], max_bytes: int = SHEETS_MAX_REQUEST_BYTES) -> bool:
+    """
+    Aggiorna su Google Sheets solo le righe cambiate
+    
+    Le righe contigue formano un intervallo (una richiesta updateCells);
+    tutti gli intervalli vengono inviati con spreadsheet.batch_update, a
+    blocchi di max_bytes. Riga 0 = intestazione, quindi la riga i della
+    matrice è la riga i + 1 del foglio.
+    """
+    try:
+        spreadsheet = client.open_by_key(spreadsheet_id)
+        worksheet = spreadsheet.sheet1
         
-        # Header bold
-        worksheet.format('A1:ZZ1', {'textFormat': {'bold': True}})
-        worksheet.format('A1:A1000', {'textFormat': {'bold': True}})
+        _, row_values = _matrix_rows(matrix)
+        ranges = [(start + 1, end + 1) for start, end in row_ranges(rows)]
         
-        # Colori per compatibilità
-        # C = Verde, Y = Giallo, I = Rosso, ! = Arancione, '' = Grigio
+        print(f"\n📤 Aggiornando {len(rows)} righe ({len(ranges)} intervalli) su Google Sheets...")
+        values = value_requests(worksheet.id, ranges, lambda row: row_values(row - 1), max_bytes)
+        stats = send_requests(spreadsheet, values, max_bytes)
         
-        print("✅ Dati caricati con successo!")
+        print(f"✅ Righe aggiornate con successo! ({stats['calls']} batch_update, "
+              f"{stats['bytes'] / 1024:.0f} KB)")
         print(f"🔗 Apri: {SPREADSHEET_URL}")
-        
+        return True
+    
     except Exception as e:
         print(f"❌ Errore upload Google Sheets: {e}")
+        return False
+
+
+def export_to_google_sheets(matrix: CompatibilityMatrixBuilder, hashes: List[str],
+                            snapshot: Dict[str, Dict], full: bool = False, client=None) -> bool:
+    """
+    Export su Google Sheets: completo o solo righe cambiate (vedi snapshot)
+    
+    Args:
+        client: Client gspread (default: connect_to_google_sheets()),
+                oppure fake_gspread.FakeClient per test e benchmark
+    
+    Returns:
+        True se il foglio è aggiornato (snapshot 'sheets' aggiornato)
+    """
+    rows = None if full else changed_rows(snapshot.get('sheets'), matrix.drugs, hashes)
+    if rows == []:
+        print("\n✅ Google Sheets: nessuna modifica dall'ultimo export, upload saltato")
+        return True
+    
+    client = client or connect_to_google_sheets()
+    if rows is None:
+        ok = upload_to_google_sheets(client, SPREADSHEET_ID, matrix)
+    else:
+        ok = upload_changed_rows(client, SPREADSHEET_ID, matrix, rows)
+    
+    if ok:
+        snapshot['sheets'] = {'drugs': matrix.drugs, 'rows': hashes}
+    return ok
 
 
 # =============================================================================
 # EXPORT CSV (ALTERNATIVA SEMPLICE)
 # =============================================================================
 
-def export_to_csv(matrix: pd.DataFrame, filename: str = 'compatibility_matrix.csv'):
+def export_to_csv(matrix, filename: str = 'compatibility_matrix.csv'):
     """
     Esporta la matrice in CSV (alternativa semplice)
+    
+    Args:
+        matrix: DataFrame oppure CompatibilityMatrixBuilder (scritto riga
+                per riga, senza creare il DataFrame)
     """
     try:
-        matrix.to_csv(filename)
+        if isinstance(matrix, CompatibilityMatrixBuilder):
+            matrix.write_csv(filename)
+        else:
+            matrix.to_csv(filename)
         print(f"✅ Matrice esportata in: {filename}")
         print(f"📝 Puoi importarla manualmente in Google Sheets:")
         print(f"   File → Import → Upload → {filename}")
@@ -246,17 +779,287 @@ def export_to_csv(matrix: pd.DataFrame, filename: str = 'compatibility_matrix.cs
         print(f"❌ Errore export CSV: {e}")
 
 
+def _file_hash(path: str) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def export_csv_incremental(matrix: CompatibilityMatrixBuilder, hashes: List[str],
+                           snapshot: Dict[str, Dict], filename: str = 'compatibility_matrix.csv',
+                           full: bool = False):
+    """
+    Esporta il CSV solo se il contenuto cambia
+    
+    Il file non viene toccato se nessuna riga è cambiata e il file su disco
+    è ancora quello dell'ultimo export; altrimenti viene riscritto in un
+    file temporaneo e sostituito atomicamente.
+    """
+    previous = snapshot.get('csv')
+    rows = None if full else changed_rows(previous, matrix.drugs, hashes)
+    if rows == [] and previous.get('file') == filename and _file_hash(filename) == previous.get('file_hash'):
+        print(f"✅ CSV invariato, {filename} non riscritto")
+        return
+    
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.csv.tmp')
+    os.close(fd)
+    try:
+        matrix.write_csv(tmp_path)
+        os.replace(tmp_path, filename)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"❌ Errore export CSV: {e}")
+        return
+    
+    changed = 'tutte' if rows is None else len(rows)
+    print(f"✅ Matrice esportata in: {filename} (righe cambiate: {changed})")
+    snapshot['csv'] = {'drugs': matrix.drugs, 'rows': hashes, 'file': filename,
+                       'file_hash': _file_hash(filename)}
+
+
+# =============================================================================
+# EXPORT PARQUET (ANALISI CON PANDAS / DUCKDB)
+# =============================================================================
+
+def export_to_parquet(matrix: CompatibilityMatrixBuilder, output_dir: str = 'output'):
+    """
+    Esporta la matrice in formato lungo (compatibility.parquet + drugs.parquet)
+    
+    Una riga per cella con dati (drug1 = riga, drug2 = colonna, come nel
+    CSV); celle vuote e diagonale omesse. drug1/drug2 sono id farmaco
+    (drug_id), gli stessi che csv-to-json-converter.py genera dal CSV
+    esportato; il nome resta in drugs.parquet. Le colonne sono costruite come
+    array dizionario direttamente dagli indici interi del builder, senza
+    creare n² stringhe Python.
+    """
+    if not HAS_PARQUET:
+        print("❌ Export Parquet: pyarrow non installato (pip install pyarrow)")
+        return
+    import pyarrow as pa
+    
+    mask = matrix.codes != 0
+    np.fill_diagonal(mask, False)
+    rows, columns = np.nonzero(mask)
+    
+    ids = pa.array([drug_id(drug) for drug in matrix.drugs], pa.string())
+    pairs = pa.table({
+        'drug1': pa.DictionaryArray.from_arrays(pa.array(rows, pa.int32()), ids),
+        'drug2': pa.DictionaryArray.from_arrays(pa.array(columns, pa.int32()), ids),
+        'status': pa.DictionaryArray.from_arrays(pa.array(matrix.codes[rows, columns], pa.int32()),
+                                                 pa.array(matrix.labels().tolist(), pa.string())),
+    })
+    drugs = [{'id': drug_id(drug), 'name': drug, 'known_pairs': int(count)}
+             for drug, count in zip(matrix.drugs, mask.sum(axis=1))]
+    
+    try:
+        pairs_path, drugs_path = write_compatibility_parquet(
+            pairs, drugs, output_dir,
+            {'source': f"PostgreSQL {TABLE_NAME}", 'generatedAt': datetime.now().isoformat()}
+        )
+    except Exception as e:
+        print(f"❌ Errore export Parquet: {e}")
+        return
+    print(f"✅ Parquet: {pairs_path} ({len(pairs)} coppie, {os.path.getsize(pairs_path) / 1024:.0f} KB), {drugs_path}")
+
+
+# =============================================================================
+# BENCHMARK (SQLITE SINTETICO + FAKE GOOGLE SHEETS)
+# =============================================================================
+
+# SQLite accetta al massimo 2000 colonne per tabella (nome + farmaci)
+SQLITE_MAX_DRUGS = 1999
+
+
+def benchmark_export(n_drugs: int, seed: int = 0) -> Dict[str, float]:
+    """
+    Export completo su una tabella sintetica in memoria
+    
+    Lettura (SQLite), upload su FakeClient e CSV in una cartella temporanea,
+    come nel main; le query SQL sono contate con il trace di sqlite3.
+    
+    Returns:
+        {'drugs', 'queries', 'read_s', 'upload_s', 'csv_s', 'requests', 'payload_bytes'}
+    """
+    conn = sqlite3.connect(':memory:')
+    create_synthetic_table(conn, n_drugs, seed)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    # Import locale: il fake serve solo a test e benchmark, non all'export reale
+    from fake_gspread import FakeClient
+    client = FakeClient()
+    
+    try:
+        start = time.perf_counter()
+        drugs = read_all_drugs(conn)
+        matrix = stream_compatibility_matrix(conn, drugs)
+        hashes = matrix.row_hashes()
+        read_seconds = time.perf_counter() - start
+    finally:
+        conn.close()
+    
+    snapshot: Dict[str, Dict] = {}
+    start = time.perf_counter()
+    export_to_google_sheets(matrix, hashes, snapshot, full=True, client=client)
+    upload_seconds = time.perf_counter() - start
+    
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        export_csv_incremental(matrix, hashes, snapshot, os.path.join(directory, 'matrix.csv'), full=True)
+        csv_seconds = time.perf_counter() - start
+    
+    stats = client.stats()
+    return {'drugs': n_drugs, 'queries': len(statements), 'read_s': read_seconds,
+            'upload_s': upload_seconds, 'csv_s': csv_seconds,
+            'requests': stats['requests'], 'payload_bytes': stats['payload_bytes']}
+
+
+def run_benchmark(sizes: List[int], seed: int = 0) -> List[Dict[str, float]]:
+    """Esegue benchmark_export per ogni dimensione e stampa il riepilogo"""
+    results = []
+    for n in sizes:
+        if not 1 <= n <= SQLITE_MAX_DRUGS:
+            print(f"⚠️  Dimensione {n} saltata (1-{SQLITE_MAX_DRUGS} farmaci con SQLite)")
+            continue
+        print(f"\n{'=' * 70}\n⏱️  Tabella sintetica {n}x{n}\n{'=' * 70}")
+        results.append(benchmark_export(n, seed))
+    
+    print(f"\n{'=' * 70}\n📊 RIEPILOGO BENCHMARK\n{'=' * 70}")
+    print(f"{'Farmaci':>8} {'Query':>6} {'Lettura':>9} {'Upload':>9} {'CSV':>8} {'Richieste':>10} {'Payload':>11}")
+    for r in results:
+        print(f"{r['drugs']:>8} {r['queries']:>6} {r['read_s']:>8.2f}s {r['upload_s']:>8.2f}s "
+              f"{r['csv_s']:>7.2f}s {r['requests']:>10} {r['payload_bytes'] / 1024:>8.0f} KB")
+    return results
+
+
 # =============================================================================
 # MAIN
 # =============================================================================
 
 def main():
+    parser = argparse.ArgumentParser(
+        description='Esporta la matrice compatibilità da PostgreSQL a Google Sheets / CSV'
+    )
+    parser.add_argument(
+        '--export',
+        choices=['sheets', 'csv', 'both', 'parquet'],
+        help='Metodo di export (default: chiesto da terminale)'
+    )
+    parser.add_argument(
+        '--sqlite',
+        type=str,
+        help='Legge da un file SQLite con la stessa tabella invece che da PostgreSQL (fixture per test/CI)'
+    )
+    parser.add_argument(
+        '--sheets-client',
+        choices=['google', 'fake'],
+        default='google',
+        help='Client Google Sheets: API reale oppure fake locale che conta richieste e byte (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--credentials',
+        type=str,
+        default='credentials.json',
+        help='File credenziali service account Google (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--csv-file',
+        type=str,
+        default='compatibility_matrix.csv',
+        help='File CSV di output (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--parquet-dir',
+        type=str,
+        default='output',
+        help='Cartella per compatibility.parquet e drugs.parquet (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--server-side-cursor',
+        action='store_true',
+        help='Legge la tabella con un cursore lato server (memoria costante su tabelle grandi)'
+    )
+    parser.add_argument(
+        '--itersize',
+        type=int,
+        default=ITERSIZE,
+        help='Righe per blocco trasferite dal server (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--snapshot',
+        type=str,
+        default=SNAPSHOT_FILE,
+        help="Snapshot dell'ultimo export per l'invio incrementale (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help="Ignora lo snapshot e riesporta tutta la matrice"
+    )
+    parser.add_argument(
+        '--make-fixture',
+        type=str,
+        metavar='FILE',
+        help='Crea un file SQLite con una tabella sintetica di --size farmaci ed esce'
+    )
+    parser.add_argument(
+        '--size',
+        type=int,
+        default=100,
+        help='Farmaci della tabella sintetica (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--benchmark',
+        action='store_true',
+        help='Export completo su tabelle sintetiche (SQLite in memoria + fake Google Sheets)'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[50, 100, 200, 400],
+        help='Dimensioni per --benchmark (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seme per le tabelle sintetiche (default: %(default)s)'
+    )
+    args = parser.parse_args()
+    
+    if args.make_fixture:
+        if not 1 <= args.size <= SQLITE_MAX_DRUGS:
+            print(f"❌ --size deve essere tra 1 e {SQLITE_MAX_DRUGS}")
+            sys.exit(1)
+        conn = sqlite3.connect(args.make_fixture)
+        create_synthetic_table(conn, args.size, args.seed)
+        conn.close()
+        print(f"✅ Fixture SQLite {args.size}x{args.size} salvata in: {args.make_fixture}")
+        return
+    
+    if args.benchmark:
+        run_benchmark(args.sizes, args.seed)
+        return
+    
     print("=" * 70)
     print("🏥 EXPORT COMPATIBILITÀ FARMACI - PostgreSQL → Google Sheets")
     print("=" * 70)
     
-    # 1. Connetti a PostgreSQL
-    conn = connect_to_postgres()
+    # 1. Connetti al database (PostgreSQL oppure fixture SQLite)
+    if args.sqlite:
+        conn = connect_to_sqlite(args.sqlite)
+        if args.server_side_cursor:
+            print("⚠️  --server-side-cursor ignorato con SQLite")
+            args.server_side_cursor = False
+    else:
+        conn = connect_to_postgres()
     
     # 2. Leggi farmaci
     drugs = read_all_drugs(conn)
@@ -270,35 +1073,63 @@ def main():
         print(f"   {i}. {drug}")
     
     # 3. Costruisci matrice compatibilità
-    matrix = build_compatibility_matrix(conn, drugs)
+    matrix = stream_compatibility_matrix(conn, drugs, server_side=args.server_side_cursor,
+                                         itersize=args.itersize)
     
-    # 4. Chiudi connessione PostgreSQL
+    # 4. Chiudi connessione al database
     conn.close()
-    print("\n✅ Connessione PostgreSQL chiusa")
+    print("\n✅ Connessione database chiusa")
     
     # 5. Export
-    print("\n" + "=" * 70)
-    print("SCEGLI METODO EXPORT:")
-    print("=" * 70)
-    print("1. Google Sheets (automatico, richiede setup API)")
-    print("2. CSV (semplice, import manuale)")
-    print("3. Entrambi")
+    choice = args.export
+    if choice is None:
+        if not sys.stdin.isatty():
+            print("❌ Nessun terminale: specifica il metodo con --export sheets|csv|both|parquet")
+            sys.exit(1)
+        print("\n" + "=" * 70)
+        print("SCEGLI METODO EXPORT:")
+        print("=" * 70)
+        print("1. Google Sheets (automatico, richiede setup API)")
+        print("2. CSV (semplice, import manuale)")
+        print("3. Entrambi")
+        print("4. Parquet (analisi con pandas / DuckDB)")
+        
+        choice = {'1': 'sheets', '2': 'csv', '3': 'both', '4': 'parquet'}.get(input("\nScelta (1/2/3/4): ").strip())
     
-    choice = input("\nScelta (1/2/3): ").strip()
+    # Hash per riga: confrontati con lo snapshot, solo le righe cambiate vengono esportate
+    hashes = matrix.row_hashes()
+    snapshot = load_snapshot(args.snapshot)
     
-    if choice in ['1', '3']:
+    client = None
+    if choice in ['sheets', 'both']:
         # Export Google Sheets
         try:
-            client = connect_to_google_sheets()
-            upload_to_google_sheets(client, SPREADSHEET_ID, matrix)
+            if args.sheets_client == 'fake':
+                # Il fake parte vuoto: export completo, snapshot reale non toccato
+                from fake_gspread import FakeClient
+                client = FakeClient()
+                export_to_google_sheets(matrix, hashes, {}, full=True, client=client)
+            else:
+                client = connect_to_google_sheets(args.credentials)
+                export_to_google_sheets(matrix, hashes, snapshot, full=args.full, client=client)
         except Exception as e:
             print(f"⚠️ Export Google Sheets fallito: {e}")
             print("📝 Esporto in CSV come fallback...")
-            export_to_csv(matrix)
+            export_csv_incremental(matrix, hashes, snapshot, args.csv_file, full=args.full)
     
-    if choice in ['2', '3']:
+    if choice in ['csv', 'both']:
         # Export CSV
-        export_to_csv(matrix)
+        export_csv_incremental(matrix, hashes, snapshot, args.csv_file, full=args.full)
+    
+    if choice == 'parquet':
+        export_to_parquet(matrix, args.parquet_dir)
+    
+    save_snapshot(snapshot, args.snapshot)
+    
+    if args.sheets_client == 'fake' and client is not None:
+        stats = client.stats()
+        print(f"\n🧪 Fake Google Sheets: {stats['requests']} richieste, "
+              f"{stats['payload_bytes'] / 1024:.0f} KB di payload")
     
     print("\n" + "=" * 70)
     print("✅ COMPLETATO!")
@@ -2,61 +2,636 @@
 """
 Extract drug compatibility from PDF using OCR
 
+Usage:
+    python extract_compatibility_from_pdf.py                 # primo PDF nella directory corrente
+    python extract_compatibility_from_pdf.py manuale.pdf --dpi 300
+    python extract_compatibility_from_pdf.py manuale.pdf --no-ocr-cache
+    python extract_compatibility_from_pdf.py manuale.pdf --page-window 2   # max 2 pagine in memoria
+    python extract_compatibility_from_pdf.py manuale.pdf --workers 4       # OCR parallelo (process pool)
+    python extract_compatibility_from_pdf.py manuale.pdf --force-ocr       # ignora il testo nativo del PDF
+    python extract_compatibility_from_pdf.py manuale.pdf --resume          # riprende dopo un'interruzione
+    python extract_compatibility_from_pdf.py manuali/ -j 8 --output-dir out   # tutti i PDF di una directory
+    python extract_compatibility_from_pdf.py --manifest pdf_list.txt -j 8     # un PDF per riga
+
 Requirements:
-pip install pytesseract pdf2image pillow pandas openpyxl
+pip install pytesseract pdf2image pillow numpy pandas openpyxl
 
 System packages (Ubuntu):
 sudo apt-get install tesseract-ocr poppler-utils
 """
 
+import argparse
+import hashlib
+import html
+import json
+import os
 import re
+import subprocess
 import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 try:
     import pytesseract
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     from PIL import Image
+    import numpy as np
     import pandas as pd
 except ImportError as e:
     print(f"❌ Errore import: {e}")
     print("\n📦 Installa dipendenze:")
-    print("pip install pytesseract pdf2image pillow pandas openpyxl")
+    print("pip install pytesseract pdf2image pillow numpy pandas openpyxl")
     print("\nSu Ubuntu:")
     print("sudo apt-get install tesseract-ocr poppler-utils")
     sys.exit(1)
 
+from drug_vocabulary import DrugMatcher, load_drug_vocabulary, normalize_name, snap_to_vocabulary
+from ocr_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, OcrCache, merge_stats, ocr_image_to_data
+
+# Una pagina con testo nativo è "utilizzabile" se ha almeno questo numero
+# di parole con lettere (le scansioni hanno al massimo un'intestazione)
+MIN_TEXT_WORDS = 10
+
+# Codici compatibilità nelle celle delle tabelle
+COMPAT_CODES = {'C', 'Y', 'I', '!'}
+
+# Separatori verticali letti come parole (tabelle con righe disegnate)
+RULE_CHARS = {'|', '│', '¦', '┃'}
+
+# Due parole della stessa riga sono in celle diverse se distanti più di
+# CELL_GAP_RATIO volte l'altezza della riga
+CELL_GAP_RATIO = 0.8
+
+# Una riga di tabella ha almeno un'intestazione e due valori
+TABLE_MIN_CELLS = 3
+
+DEFAULT_CHECKPOINT_DIR = '.pdf_checkpoints'
+
+# Output di `pdftotext -bbox`: una pagina XHTML con una <word> per parola
+PAGE_PATTERN = re.compile(r'<page\b[^>]*>(.*?)</page>', re.DOTALL)
+WORD_PATTERN = re.compile(
+    r'<word xMin="([\d.]+)" yMin="([\d.]+)" xMax="([\d.]+)" yMax="([\d.]+)">(.*?)</word>',
+    re.DOTALL
+)
+
+
+def get_page_count(pdf_path: str) -> int:
+    """Numero di pagine del PDF (via pdfinfo, senza rasterizzare)"""
+    return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+
+def _page_windows(pages: List[int], window: int) -> Iterator[Tuple[int, int]]:
+    """Raggruppa pagine ordinate in intervalli contigui di al massimo `window` pagine"""
+    first = last = None
+    for page_number in pages:
+        if first is not None and page_number == last + 1 and page_number - first < window:
+            last = page_number
+            continue
+        if first is not None:
+            yield first, last
+        first = last = page_number
+    if first is not None:
+        yield first, last
+
+
+def iter_pdf_pages(pdf_path: str, dpi: int = 300, window: int = 1,
+                   pages: Optional[List[int]] = None) -> Iterator[Tuple[int, 'Image.Image']]:
+    """
+    Rasterizza il PDF una finestra di pagine alla volta
+    
+    Le pagine vengono convertite a blocchi di `window` (first_page/last_page)
+    in una directory temporanea, quindi in memoria esistono al massimo
+    `window` immagini di pagina alla volta.
+    
+    Args:
+        pdf_path: Percorso al PDF
+        dpi: Risoluzione immagini
+        window: Pagine rasterizzate per volta
+        pages: Pagine da rasterizzare (1-based, default: tutte)
+    
+    Yields:
+        (numero pagina 1-based, immagine PIL)
+    """
+    if pages is None:
+        pages = list(range(1, get_page_count(pdf_path) + 1))
+    
+    for first, last in _page_windows(sorted(pages), window):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            images = convert_from_path(pdf_path, dpi=dpi, first_page=first, last_page=last,
+                                       output_folder=tmp_dir)
+            for offset, image in enumerate(images):
+                try:
+                    yield first + offset, image
+                finally:
+                    image.close()
+
+
+def parse_bbox_pages(xhtml: str) -> List[List[Dict]]:
+    """
+    Parse dell'output di `pdftotext -bbox`
+    
+    Returns:
+        Per ogni pagina, lista di parole {'text', 'conf', 'left', 'top',
+        'width', 'height'} in punti PDF (stesso formato delle parole OCR)
+    """
+    pages = []
+    for page in PAGE_PATTERN.findall(xhtml):
+        words = []
+        for x_min, y_min, x_max, y_max, text in WORD_PATTERN.findall(page):
+            text = html.unescape(text).strip()
+            if not text:
+                continue
+            words.append({
+                'text': text,
+                'conf': 100.0,
+                'left': float(x_min),
+                'top': float(y_min),
+                'width': float(x_max) - float(x_min),
+                'height': float(y_max) - float(y_min),
+            })
+        pages.append(words)
+    return pages
+
+
+def extract_text_layer(pdf_path: str) -> Dict[int, List[Dict]]:
+    """
+    Parole del testo nativo del PDF, pagina per pagina (poppler pdftotext)
+    
+    Una sola chiamata per tutto il documento: molto più veloce di
+    rasterizzazione + OCR, e senza errori di riconoscimento.
+    
+    Returns:
+        Dict numero pagina (1-based) -> parole. Vuoto se pdftotext non
+        è disponibile o il PDF non ha testo.
+    """
+    try:
+        completed = subprocess.run(
+            ['pdftotext', '-bbox', '-enc', 'UTF-8', pdf_path, '-'],
+            capture_output=True, check=True
+        )
+    except FileNotFoundError:
+        print("⚠️  pdftotext non trovato, uso solo OCR (sudo apt-get install poppler-utils)")
+        return {}
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️  pdftotext fallito ({e.stderr.decode(errors='replace').strip()}), uso solo OCR")
+        return {}
+    
+    pages = parse_bbox_pages(completed.stdout.decode('utf-8', errors='replace'))
+    return {page_number: words for page_number, words in enumerate(pages, start=1)}
+
+
+def has_usable_text(words: List[Dict]) -> bool:
+    """True se il testo nativo della pagina basta (niente OCR)"""
+    return sum(1 for w in words if re.search(r'[A-Za-zÀ-ÿ]', w['text'])) >= MIN_TEXT_WORDS
+
+
+def group_lines(words: List[Dict]) -> List[List[Dict]]:
+    """
+    Raggruppa le parole in righe di testo (top-down, ogni riga da sinistra)
+    
+    Parole con il centro verticale entro metà altezza della riga corrente
+    appartengono alla stessa riga.
+    """
+    lines: List[List[Dict]] = []
+    for word in sorted(words, key=lambda w: (w['top'] + w['height'] / 2, w['left'])):
+        center = word['top'] + word['height'] / 2
+        if lines:
+            last = lines[-1][0]
+            if abs(center - (last['top'] + last['height'] / 2)) <= last['height'] / 2:
+                lines[-1].append(word)
+                continue
+        lines.append([word])
+    
+    return [sorted(line, key=lambda w: w['left']) for line in lines]
+
+
+def words_to_text(words: List[Dict]) -> str:
+    """Ricostruisce il testo di una pagina dalle parole (una riga per riga di testo)"""
+    return '\n'.join(' '.join(w['text'] for w in line) for line in group_lines(words)) + '\n'
+
+
+def _words_from_data(data: Dict[str, list]) -> List[Dict]:
+    """Parole riconosciute da image_to_data (stesso formato del testo nativo)"""
+    words = []
+    for i, text in enumerate(data.get('text', [])):
+        conf = float(data['conf'][i])
+        if conf < 0 or not text.strip():
+            continue
+        words.append({
+            'text': text.strip(),
+            'conf': conf,
+            'left': float(data['left'][i]),
+            'top': float(data['top'][i]),
+            'width': float(data['width'][i]),
+            'height': float(data['height'][i]),
+        })
+    return words
+
+
+def _ocr_page_image(image: 'Image.Image', page_number: int, ocr_cache: Optional[OcrCache]) -> Dict:
+    """OCR di una pagina già rasterizzata -> risultato pagina (mai eccezioni)"""
+    start = time.perf_counter()
+    result = {'page': page_number, 'text': '', 'words': [], 'seconds': 0.0, 'error': None, 'source': 'ocr'}
+    
+    try:
+        # OCR con Tesseract (italiano): una sola passata, testo e riquadri parole
+        data = ocr_image_to_data(image, lang='ita+eng', cache=ocr_cache)
+        result['words'] = _words_from_data(data)
+        result['text'] = words_to_text(result['words'])
+    except Exception as e:
+        result['error'] = str(e)
+    
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def process_page(pdf_path: str, page_number: int, dpi: int = 300,
+                 ocr_cache: Optional[OcrCache] = None) -> Dict:
+    """
+    Rasterizza e fa OCR di una singola pagina (eseguita nei worker)
+    
+    Non solleva eccezioni: un errore su una pagina viene riportato nel
+    risultato e non interrompe l'elaborazione delle altre.
+    
+    Returns:
+        {'page', 'text', 'words', 'seconds', 'error', 'source'}
+    """
+    start = time.perf_counter()
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number,
+                                       output_folder=tmp_dir)
+            if not images:
+                raise ValueError("pagina vuota")
+            with images[0] as image:
+                result = _ocr_page_image(image, page_number, ocr_cache)
+    except Exception as e:
+        result = {'page': page_number, 'text': '', 'words': [], 'error': str(e), 'source': 'ocr'}
+    
+    # Tempo totale: rasterizzazione + OCR
+    result['seconds'] = time.perf_counter() - start
+    result['ocr_cache'] = ocr_cache.stats() if ocr_cache else None
+    return result
+
+
+def _iter_ocr_results(tasks: List[Tuple[str, int]], totals: Dict[str, int], dpi: int,
+                      ocr_cache: Optional[OcrCache], window: int, workers: int) -> Iterator[Dict]:
+    """
+    OCR delle pagine (pdf, pagina) indicate, nell'ordine dei task
+    
+    In modalità seriale le pagine consecutive dello stesso PDF vengono
+    rasterizzate a finestre; con workers > 1 tutti i task (anche di PDF
+    diversi) condividono lo stesso process pool.
+    """
+    many = len(totals) > 1
+    
+    def label(pdf_path: str, page_number: int) -> str:
+        prefix = f"{Path(pdf_path).name} " if many else ''
+        return f"{prefix}{page_number}/{totals[pdf_path]}"
+    
+    if workers <= 1:
+        by_pdf: Dict[str, List[int]] = {}
+        for pdf_path, page_number in tasks:
+            by_pdf.setdefault(pdf_path, []).append(page_number)
+        
+        for pdf_path, pages in by_pdf.items():
+            done = set()
+            page_start = time.perf_counter()
+            try:
+                for page_number, image in iter_pdf_pages(pdf_path, dpi=dpi, window=window, pages=pages):
+                    print(f"📖 OCR pagina {label(pdf_path, page_number)}...")
+                    result = _ocr_page_image(image, page_number, ocr_cache)
+                    # Include la quota di rasterizzazione
+                    result['seconds'] = time.perf_counter() - page_start
+                    result['pdf'] = pdf_path
+                    done.add(page_number)
+                    yield result
+                    page_start = time.perf_counter()
+            except Exception as e:
+                # Rasterizzazione fallita: le pagine rimaste una alla volta,
+                # con l'errore riportato per pagina come nei worker
+                print(f"⚠️  Rasterizzazione a finestre fallita ({e}), proseguo pagina per pagina")
+                for page_number in sorted(set(pages) - done):
+                    result = process_page(pdf_path, page_number, dpi, ocr_cache)
+                    # Stessa cache del processo principale: contatori già in ocr_cache.stats()
+                    result['ocr_cache'] = None
+                    result['pdf'] = pdf_path
+                    status = '❌' if result['error'] else '📖'
+                    print(f"{status} OCR pagina {label(pdf_path, page_number)} ({result['seconds']:.1f}s)")
+                    yield result
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        remaining = iter(tasks)
+        pending = deque()
+        
+        def submit_next():
+            task = next(remaining, None)
+            if task is not None:
+                pending.append((task, executor.submit(process_page, task[0], task[1], dpi, ocr_cache)))
+        
+        for _ in range(2 * workers):
+            submit_next()
+        
+        while pending:
+            (pdf_path, page_number), future = pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                # Worker terminato (es. memoria esaurita): segnala e prosegui
+                result = {'page': page_number, 'text': '', 'words': [], 'seconds': 0.0,
+                          'error': f"worker: {e}", 'source': 'ocr'}
+            result['pdf'] = pdf_path
+            
+            status = '❌' if result['error'] else '📖'
+            print(f"{status} OCR pagina {label(pdf_path, page_number)} ({result['seconds']:.1f}s)")
+            submit_next()
+            yield result
+
+
+def _text_layer_results(pdf_path: str, pages: List[int],
+                        use_text_layer: bool) -> Tuple[Dict[int, Dict], List[int]]:
+    """
+    Pagine risolte con il testo nativo e pagine che richiedono OCR
+    
+    Returns:
+        (risultati pagina per le pagine con testo nativo, pagine da OCR)
+    """
+    if not use_text_layer:
+        return {}, list(pages)
+    
+    start = time.perf_counter()
+    selected = set(pages)
+    text_pages = {page_number: words for page_number, words in extract_text_layer(pdf_path).items()
+                  if page_number in selected and has_usable_text(words)}
+    # Costo della chiamata pdftotext ripartito sulle pagine native
+    seconds = (time.perf_counter() - start) / max(len(text_pages), 1)
+    print(f"📑 {Path(pdf_path).name}: testo nativo utilizzabile in {len(text_pages)}/{len(pages)} pagine")
+    
+    results = {page_number: {'pdf': pdf_path, 'page': page_number, 'text': words_to_text(words),
+                             'words': words, 'seconds': seconds, 'error': None, 'source': 'text'}
+               for page_number, words in text_pages.items()}
+    return results, [n for n in pages if n not in text_pages]
+
+
+def _resolve_workers(workers: int, tasks: int) -> int:
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, tasks))
+
+
+def iter_page_results(pdf_path: str, dpi: int = 300, ocr_cache: Optional[OcrCache] = None,
+                      window: int = 1, workers: int = 1, use_text_layer: bool = True,
+                      pages: Optional[List[int]] = None) -> Iterator[Dict]:
+    """
+    Risultati pagina per pagina, sempre in ordine di pagina (generatore)
+    
+    Le pagine con testo nativo utilizzabile (pdftotext) non vengono
+    rasterizzate; solo le altre passano da rasterizzazione + OCR.
+    Con workers > 1 l'OCR gira in un process pool; al massimo
+    2 * workers pagine sono in lavorazione contemporaneamente, quindi la
+    memoria resta limitata.
+    
+    Args:
+        pdf_path: Percorso al PDF
+        dpi: Risoluzione immagini (più alto = migliore qualità)
+        ocr_cache: Cache OCR persistente (opzionale)
+        window: Pagine rasterizzate per volta in modalità seriale
+        workers: Processi worker (1 = seriale, 0 = tutte le CPU)
+        use_text_layer: Prova prima il testo nativo del PDF
+        pages: Pagine da elaborare (1-based, default: tutte)
+    
+    Yields:
+        {'pdf', 'page', 'text', 'words', 'seconds', 'error', 'source'} con
+        source 'text' (testo nativo) oppure 'ocr'
+    """
+    total = get_page_count(pdf_path)
+    if pages is None:
+        pages = list(range(1, total + 1))
+    
+    text_results, ocr_pages = _text_layer_results(pdf_path, pages, use_text_layer)
+    workers = _resolve_workers(workers, len(ocr_pages))
+    
+    if ocr_pages:
+        print(f"📄 Convertendo PDF in immagini (DPI: {dpi}, {len(ocr_pages)} pagine, "
+              f"{'worker: ' + str(workers) if workers > 1 else 'finestra: ' + str(window)})...")
+    
+    ocr_results = _iter_ocr_results([(pdf_path, n) for n in ocr_pages], {pdf_path: total},
+                                    dpi, ocr_cache, window, workers)
+    for page_number in pages:
+        if page_number in text_results:
+            yield text_results.pop(page_number)
+        else:
+            result = next(ocr_results, None)
+            if result is None:
+                # Nessun risultato OCR per questa pagina: errore sulla pagina, non StopIteration
+                result = {'pdf': pdf_path, 'page': page_number, 'text': '', 'words': [], 'seconds': 0.0,
+                          'error': 'OCR: nessun risultato per la pagina', 'source': 'ocr'}
+            yield result
+
 
-def extract_text_from_pdf(pdf_path: str, dpi: int = 300) -> List[str]:
+def iter_batch_results(documents: Dict[str, List[int]], dpi: int = 300,
+                       ocr_cache: Optional[OcrCache] = None, window: int = 1, workers: int = 1,
+                       use_text_layer: bool = True) -> Iterator[Dict]:
+    """
+    Risultati di più PDF con un unico process pool condiviso
+    
+    Prima le pagine con testo nativo di tutti i documenti, poi l'OCR delle
+    pagine restanti: le pagine di tutti i PDF vengono distribuite sugli
+    stessi worker, così un documento corto non lascia processi inattivi.
+    
+    Args:
+        documents: PDF -> pagine da elaborare
+        (altri argomenti come iter_page_results)
+    
+    Yields:
+        Risultati pagina con 'pdf'; ordine per documento e pagina solo
+        tra i risultati dello stesso percorso (testo nativo / OCR)
+    """
+    totals = {pdf_path: get_page_count(pdf_path) for pdf_path in documents}
+    
+    tasks: List[Tuple[str, int]] = []
+    for pdf_path, pages in documents.items():
+        text_results, ocr_pages = _text_layer_results(pdf_path, pages, use_text_layer)
+        yield from text_results.values()
+        tasks.extend((pdf_path, n) for n in ocr_pages)
+    
+    workers = _resolve_workers(workers, len(tasks))
+    if tasks:
+        print(f"📄 Convertendo {len(tasks)} pagine da {len({pdf for pdf, _ in tasks})} PDF "
+              f"(DPI: {dpi}, {'worker: ' + str(workers) if workers > 1 else 'finestra: ' + str(window)})...")
+    
+    yield from _iter_ocr_results(tasks, totals, dpi, ocr_cache, window, workers)
+
+
+def iter_page_texts(pdf_path: str, dpi: int = 300, ocr_cache: Optional[OcrCache] = None,
+                    window: int = 1) -> Iterator[Tuple[int, str]]:
+    """
+    OCR pagina per pagina (generatore)
+    
+    Args:
+        pdf_path: Percorso al PDF
+        dpi: Risoluzione immagini (più alto = migliore qualità)
+        ocr_cache: Cache OCR persistente (opzionale)
+        window: Pagine rasterizzate per volta (memoria limitata)
+    
+    Yields:
+        (numero pagina 1-based, testo estratto)
+    """
+    for result in iter_page_results(pdf_path, dpi=dpi, ocr_cache=ocr_cache, window=window):
+        yield result['page'], result['text']
+
+
+def extract_text_from_pdf(pdf_path: str, dpi: int = 300,
+                          ocr_cache: Optional[OcrCache] = None, window: int = 1) -> List[str]:
     """
     Estrae testo da PDF usando OCR
     
     Args:
         pdf_path: Percorso al PDF
         dpi: Risoluzione immagini (più alto = migliore qualità)
+        ocr_cache: Cache OCR persistente (opzionale, evita di rifare OCR
+                   su pagine già elaborate con gli stessi parametri)
+        window: Pagine rasterizzate per volta (vedi iter_pdf_pages)
     
     Returns:
         Lista di testi estratti (uno per pagina)
     """
-    print(f"📄 Convertendo PDF in immagini (DPI: {dpi})...")
-    
     try:
-        images = convert_from_path(pdf_path, dpi=dpi)
+        return [text for _, text in iter_page_texts(pdf_path, dpi, ocr_cache, window)]
     except Exception as e:
         print(f"❌ Errore conversione PDF: {e}")
         return []
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 del contenuto del file (a blocchi, senza caricarlo tutto)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageJournal:
+    """
+    Journal append-only dei risultati per pagina (checkpoint)
     
-    texts = []
+    Un file JSONL per PDF, <checkpoint_dir>/<sha256 del PDF>.jsonl, con un
+    record per pagina elaborata. Ogni record è scritto e sincronizzato su
+    disco appena la pagina è pronta, quindi un'interruzione perde al più
+    la pagina in corso. Contano solo i record senza errori e con gli stessi
+    parametri di estrazione (dpi, OCR forzato): cambiando parametri le
+    pagine vengono rifatte; a parità di pagina vale l'ultimo record.
+    
+    Usage:
+        journal = PageJournal('.pdf_checkpoints', 'manuale.pdf', {'dpi': 300})
+        journal.append(result)
+        record = journal.read(12)
+    """
+    
+    def __init__(self, checkpoint_dir: str, pdf_path: str, params: Dict):
+        self.pdf_hash = hash_file(pdf_path)
+        self.path = Path(checkpoint_dir) / f"{self.pdf_hash}.jsonl"
+        self.params = params
+        # Pagina -> offset nel file dell'ultimo record valido
+        self.offsets: Dict[int, int] = {}
+        self._load()
     
-    for i, image in enumerate(images, 1):
-        print(f"📖 OCR pagina {i}/{len(images)}...")
+    def _load(self):
+        if not self.path.exists():
+            return
+        
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Ultima riga troncata da un'interruzione
+                    record = None
+                if record and record.get('params') == self.params and not record.get('error'):
+                    self.offsets[record['page']] = offset
+                offset += len(line)
+    
+    def completed(self) -> set:
+        """Pagine già elaborate con successo con questi parametri"""
+        return set(self.offsets)
+    
+    def append(self, result: Dict):
+        """Aggiunge il risultato di una pagina (anche se fallita, per diagnostica)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        record = {'page': result['page'], 'params': self.params}
+        record.update({k: result.get(k) for k in ('source', 'seconds', 'error', 'text', 'words')})
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            if offset and not self._ends_with_newline():
+                # Chiude una riga troncata prima di aggiungere il record
+                f.write(b'\n')
+                offset += 1
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
         
-        # OCR con Tesseract (italiano)
-        text = pytesseract.image_to_string(image, lang='ita+eng')
-        texts.append(text)
+        if not record['error']:
+            self.offsets[record['page']] = offset
     
-    return texts
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+    
+    def read(self, page_number: int) -> Optional[Dict]:
+        """Record valido di una pagina, letto dal disco (None se manca)"""
+        offset = self.offsets.get(page_number)
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+
+def print_page_report(results: List[Dict], wall_seconds: float):
+    """Tempi per pagina, pagine fallite e throughput complessivo"""
+    print(f"\n⏱️  Tempi per pagina:")
+    for result in results:
+        if result['error']:
+            print(f"   ❌ Pagina {result['page']:>4}  {result['seconds']:>7.2f}s  {result['error']}")
+        else:
+            print(f"   ✅ Pagina {result['page']:>4}  {result['seconds']:>7.2f}s  {len(result['text'])} caratteri"
+                  f"  [{result.get('source', 'ocr')}]")
+    
+    by_source = {source: [r for r in results if r.get('source') == source] for source in ('text', 'ocr')}
+    text_seconds = sum(r['seconds'] for r in by_source['text'])
+    ocr_seconds = sum(r['seconds'] for r in by_source['ocr'])
+    print(f"   📑 Testo nativo: {len(by_source['text'])} pagine ({text_seconds:.1f}s)")
+    print(f"   🔍 OCR:          {len(by_source['ocr'])} pagine ({ocr_seconds:.1f}s)")
+    if by_source['text'] and by_source['ocr']:
+        # Stima: le pagine native avrebbero richiesto il tempo medio di una pagina OCR
+        saved = len(by_source['text']) * ocr_seconds / len(by_source['ocr']) - text_seconds
+        print(f"   ⚡ Tempo risparmiato (stima): {saved:.1f}s")
+    
+    failed = [r for r in results if r['error']]
+    pages_per_minute = len(results) * 60 / wall_seconds if wall_seconds else 0.0
+    print(f"   Totale: {len(results)} pagine in {wall_seconds:.1f}s ({pages_per_minute:.1f} pagine/minuto)")
+    if failed:
+        print(f"⚠️  {len(failed)} pagine fallite: {', '.join(str(r['page']) for r in failed)}")
+
+
+def write_page_text(f, page_number: int, text: str):
+    """Scrive il testo di una pagina nel dump (formato extracted_text.txt)"""
+    f.write(f"\n{'='*50}\n")
+    f.write(f"PAGINA {page_number}\n")
+    f.write(f"{'='*50}\n")
+    f.write(text)
+    f.flush()
 
 
 def parse_compatibility_table(text: str) -> Dict[str, Dict[str, str]]:
@@ -79,6 +654,9 @@ def parse_compatibility_table(text: str) -> Dict[str, Dict[str, str]]:
         match = re.search(pattern, line)
         if match:
             drug1, drug2, compat = match.groups()
+            # Riga di una griglia ("Amikacin | C | I"): il codice non è un farmaco
+            if drug1.upper() in COMPAT_CODES or drug2.upper() in COMPAT_CODES:
+                continue
             
             if drug1 not in compatibility:
                 compatibility[drug1] = {}
@@ -93,115 +671,703 @@ def parse_compatibility_table(text: str) -> Dict[str, Dict[str, str]]:
     return compatibility
 
 
-def extract_drug_names(texts: List[str]) -> List[str]:
+# Usati solo se il database farmaci non è disponibile
+FALLBACK_DRUGS = [
+    'Amikacin', 'Ampicillin', 'Fentanyl', 'Midazolam',
+    'Heparin', 'Dopamine', 'Norepinephrine', 'Insulin',
+    'Furosemide', 'Potassium', 'Morphine', 'Propofol',
+    'Vancomycin', 'Gentamicin', 'Metronidazole'
+]
+
+
+def build_drug_matcher(database_path: Optional[str] = None) -> DrugMatcher:
+    """
+    Matcher di tutti i nomi farmaco noti (database + alias)
+    
+    Args:
+        database_path: drugs-database.min.json (default: auto-detect)
+    """
+    vocabulary = load_drug_vocabulary(database_path)
+    if not vocabulary:
+        vocabulary = {normalize_name(drug): drug for drug in FALLBACK_DRUGS}
+    return DrugMatcher(vocabulary)
+
+
+def find_drug_mentions(texts: List[str], pages: Optional[List[int]] = None,
+                       matcher: Optional[DrugMatcher] = None) -> List[Dict]:
+    """
+    Trova le menzioni di farmaci nel testo, una sola scansione per pagina
+    
+    Args:
+        texts: Testi delle pagine
+        pages: Numeri di pagina corrispondenti (default: 1..n)
+        matcher: Matcher compilato (default: build_drug_matcher())
+    
+    Returns:
+        Lista di {'drug', 'page', 'start', 'end', 'text'} (offset nel testo della pagina)
+    """
+    matcher = matcher or build_drug_matcher()
+    pages = pages or list(range(1, len(texts) + 1))
+    
+    mentions = []
+    for page_number, text in zip(pages, texts):
+        for start, end, drug in matcher.find(text):
+            mentions.append({'drug': drug, 'page': page_number, 'start': start, 'end': end,
+                             'text': text[start:end]})
+    return mentions
+
+
+def extract_drug_names(texts: List[str], matcher: Optional[DrugMatcher] = None) -> List[str]:
     """
     Estrae nomi farmaci dal testo
     """
-    drugs = set()
+    return sorted({mention['drug'] for mention in find_drug_mentions(texts, matcher=matcher)})
+
+
+def split_cells(line: List[Dict]) -> List[Dict]:
+    """
+    Divide una riga di testo in celle
+    
+    Le parole vicine formano una cella; uno spazio più largo di
+    CELL_GAP_RATIO volte l'altezza della riga (colonne allineate) o un
+    separatore verticale (tabelle con righe disegnate) inizia una nuova cella.
+    
+    Returns:
+        Lista di {'text', 'left', 'right'}
+    """
+    heights = sorted(w['height'] for w in line)
+    max_gap = CELL_GAP_RATIO * heights[len(heights) // 2]
+    
+    cells: List[Dict] = []
+    ruled = True
+    for word in line:
+        if word['text'] in RULE_CHARS:
+            ruled = True
+            continue
+        right = word['left'] + word['width']
+        if cells and not ruled and word['left'] - cells[-1]['right'] <= max_gap:
+            cells[-1]['text'] += ' ' + word['text']
+            cells[-1]['right'] = right
+        else:
+            cells.append({'text': word['text'], 'left': word['left'], 'right': right})
+        ruled = False
+    return cells
+
+
+def _has_codes(cells: List[Dict]) -> bool:
+    """Riga di valori: almeno un codice compatibilità dopo la prima cella"""
+    return any(c['text'].upper() in COMPAT_CODES for c in cells[1:])
+
+
+def _split_tables(run: List[List[Dict]]) -> Iterator[Tuple[Optional[List[Dict]], List[List[Dict]]]]:
+    """
+    Divide una sequenza di righe in tabelle (intestazione, righe di valori)
+    
+    L'intestazione è la riga senza codici subito prima delle righe di
+    valori; le altre righe senza codici (testo su più colonne) sono scartate.
+    """
+    header = None
+    body: List[List[Dict]] = []
+    for cells in run:
+        if _has_codes(cells):
+            body.append(cells)
+            continue
+        if body:
+            yield header, body
+            body = []
+        header = cells
+    if body:
+        yield header, body
+
+
+def _column_bands(rows: List[List[Dict]]) -> List[Tuple[float, float]]:
+    """
+    Colonne della tabella: unione degli intervalli orizzontali delle celle
+    
+    Calcolate solo sulle righe dei valori (codici stretti): le intestazioni
+    lunghe sconfinerebbero nelle colonne vicine.
+    """
+    bands: List[List[float]] = []
+    for left, right in sorted((c['left'], c['right']) for row in rows for c in row):
+        if bands and left <= bands[-1][1]:
+            bands[-1][1] = max(bands[-1][1], right)
+        else:
+            bands.append([left, right])
+    return [(left, right) for left, right in bands]
+
+
+def _band_index(cell: Dict, bands: List[Tuple[float, float]]) -> int:
+    """Colonna della cella (banda contenente il centro, altrimenti la più vicina)"""
+    center = (cell['left'] + cell['right']) / 2
+    return min(range(len(bands)),
+               key=lambda i: 0 if bands[i][0] <= center <= bands[i][1]
+               else min(abs(center - bands[i][0]), abs(center - bands[i][1])))
+
+
+def canonical_drug_name(name: str, vocabulary: Optional[Dict[str, str]] = None) -> str:
+    """Nome farmaco di un'intestazione: voce del vocabolario se riconosciuta"""
+    return (snap_to_vocabulary(name, vocabulary) if vocabulary else None) or name.strip().title()
+
+
+def parse_table_structure(words: List[Dict], vocabulary: Optional[Dict[str, str]] = None,
+                          previous: Optional[Dict] = None) -> List[Dict]:
+    """
+    Riconosce tabelle di compatibilità dai riquadri delle parole
+    
+    Una tabella è una sequenza di righe di testo consecutive con almeno
+    TABLE_MIN_CELLS celle. La prima colonna contiene i farmaci di riga, la
+    riga senza codici che precede i valori i farmaci di colonna. Una tabella
+    senza intestazione che continua dalla pagina precedente con lo stesso
+    numero di colonne riusa le intestazioni di `previous`.
+    
+    Args:
+        words: Parole della pagina (testo nativo o OCR)
+        vocabulary: Vocabolario farmaci (normalizza le intestazioni)
+        previous: Ultima tabella della pagina precedente (continuazioni)
+    
+    Returns:
+        Lista di tabelle {'row_headers', 'column_headers', 'n_columns',
+        'entries': [(farmaco riga, farmaco colonna, codice)]}
+    """
+    runs: List[List[List[Dict]]] = [[]]
+    for line in group_lines(words):
+        cells = split_cells(line)
+        if len(cells) >= TABLE_MIN_CELLS:
+            runs[-1].append(cells)
+        elif runs[-1]:
+            runs.append([])
+    
+    tables = []
+    for header, body in (table for run in runs for table in _split_tables(run)):
+        bands = _column_bands(body)
+        if len(bands) < 2:
+            continue
+        
+        if header and vocabulary:
+            # Riga di testo prima di una continuazione: non sono farmaci
+            known = sum(1 for c in header[1:] if snap_to_vocabulary(c['text'], vocabulary))
+            if known * 2 < len(header) - 1:
+                header = None
+        
+        if header:
+            column_headers = [''] * len(bands)
+            for cell in header:
+                index = _band_index(cell, bands)
+                if index > 0:
+                    column_headers[index] = canonical_drug_name(cell['text'], vocabulary)
+        elif previous and previous['n_columns'] == len(bands):
+            column_headers = previous['column_headers']
+        else:
+            continue
+        
+        row_headers = []
+        entries = []
+        for row in body:
+            name_cells = [c for c in row if _band_index(c, bands) == 0]
+            if not name_cells:
+                continue
+            row_drug = canonical_drug_name(' '.join(c['text'] for c in name_cells), vocabulary)
+            row_headers.append(row_drug)
+            
+            for cell in row:
+                code = cell['text'].upper()
+                index = _band_index(cell, bands)
+                if index > 0 and code in COMPAT_CODES and column_headers[index]:
+                    entries.append((row_drug, column_headers[index], code))
+        
+        table = {'row_headers': row_headers, 'column_headers': column_headers,
+                 'n_columns': len(bands), 'entries': entries}
+        tables.append(table)
+        previous = table
+    
+    return tables
+
+
+class CompatibilityIndex:
+    """
+    Compatibilità raccolte da tutte le pagine, indicizzate per coppia
+    
+    Ogni farmaco (nome normalizzato) ha un indice globale e le celle sono
+    indicizzate dalla coppia non ordinata di indici: la stessa coppia
+    trovata su più pagine non sovrascrive il valore già presente. Valori
+    uguali vengono contati come duplicati, valori diversi come conflitti
+    (resta il valore della prima pagina). Ogni conflitto è la lista delle
+    coppie (pagina, codice) distinte, anche se i codici vengono dalla
+    stessa pagina.
+    """
     
-    # Lista farmaci comuni (da espandere)
-    known_drugs = [
-        'Amikacin', 'Ampicillin', 'Fentanyl', 'Midazolam',
-        'Heparin', 'Dopamine', 'Norepinephrine', 'Insulin',
-        'Furosemide', 'Potassium', 'Morphine', 'Propofol',
-        'Vancomycin', 'Gentamicin', 'Metronidazole'
-    ]
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.cells: Dict[Tuple[int, int], str] = {}
+        self.pages: Dict[Tuple[int, int], List[int]] = {}
+        self.conflicts: Dict[Tuple[int, int], List[Tuple[Union[int, str], str]]] = {}
+        self.duplicates = 0
     
-    for text in texts:
-        for drug in known_drugs:
-            if drug.lower() in text.lower():
-                drugs.add(drug)
+    def drug_index(self, name: str) -> int:
+        key = normalize_name(name)
+        if key not in self.index:
+            self.index[key] = len(self.names)
+            self.names.append(name)
+        return self.index[key]
     
-    return sorted(list(drugs))
+    def _pair(self, drug1: str, drug2: str) -> Tuple[int, int]:
+        return tuple(sorted((self.drug_index(drug1), self.drug_index(drug2))))
+    
+    def _add_conflict(self, pair: Tuple[int, int], page: Union[int, str], code: str):
+        entries = self.conflicts.setdefault(pair, [(self.pages[pair][0], self.cells[pair])])
+        if (page, code) not in entries:
+            entries.append((page, code))
+    
+    def add(self, drug1: str, drug2: str, code: str, page: Union[int, str]):
+        """Aggiunge una cella (ignorata la diagonale farmaco/se stesso)"""
+        pair = self._pair(drug1, drug2)
+        if pair[0] == pair[1]:
+            return
+        
+        if pair not in self.cells:
+            self.cells[pair] = code
+            self.pages[pair] = [page]
+        elif self.cells[pair] == code:
+            self.duplicates += 1
+            if page not in self.pages[pair]:
+                self.pages[pair].append(page)
+        else:
+            self._add_conflict(pair, page, code)
+    
+    def merge_from(self, other: 'CompatibilityIndex', source: str):
+        """
+        Aggiunge le celle di un altro indice (es. un documento), pagine etichettate con `source`
+        
+        Ogni cella viene unita una sola volta: i duplicati interni al
+        documento sono già in other.duplicates, qui si conta solo la
+        ripetizione tra documenti.
+        """
+        label = lambda page: f"{source} p.{page}"
+        self.duplicates += other.duplicates
+        for (i, j), code in other.cells.items():
+            pair = self._pair(other.names[i], other.names[j])
+            if pair[0] == pair[1]:
+                continue
+            pages = [label(page) for page in other.pages[(i, j)]]
+            
+            if pair not in self.cells:
+                self.cells[pair] = code
+                self.pages[pair] = pages
+            elif self.cells[pair] == code:
+                self.duplicates += 1
+                self.pages[pair].extend(page for page in pages if page not in self.pages[pair])
+            else:
+                self._add_conflict(pair, pages[0], code)
+            
+            for page, value in other.conflicts.get((i, j), []):
+                self._add_conflict(pair, label(page), value)
+    
+    def to_nested(self) -> Dict[str, Dict[str, str]]:
+        """Formato {farmaco: {farmaco: codice}} simmetrico (per create_compatibility_matrix)"""
+        nested: Dict[str, Dict[str, str]] = {}
+        for (i, j), code in self.cells.items():
+            nested.setdefault(self.names[i], {})[self.names[j]] = code
+            nested.setdefault(self.names[j], {})[self.names[i]] = code
+        return nested
+    
+    def to_dict(self) -> Dict:
+        """Risultato serializzabile (JSON)"""
+        return {
+            'drugs': self.names,
+            'pairs': [{'drug1': self.names[i], 'drug2': self.names[j], 'code': code,
+                       'pages': self.pages[(i, j)]}
+                      for (i, j), code in sorted(self.cells.items())],
+            'duplicates': self.duplicates,
+            'conflicts': [{'drug1': self.names[i], 'drug2': self.names[j],
+                           'values': [{'page': page, 'code': code} for page, code in entries]}
+                          for (i, j), entries in sorted(self.conflicts.items())],
+        }
+
+
+def print_conflict_report(compatibility: CompatibilityIndex):
+    """Duplicati e conflitti tra pagine"""
+    print(f"🧩 Coppie: {len(compatibility.cells)}, duplicate: {compatibility.duplicates}")
+    if compatibility.conflicts:
+        print(f"⚠️  {len(compatibility.conflicts)} conflitti (mantenuto il valore della prima pagina):")
+        for (i, j), entries in sorted(compatibility.conflicts.items()):
+            found = ', '.join(f"{'p.' if isinstance(page, int) else ''}{page}={code}"
+                              for page, code in entries)
+            print(f"   - {compatibility.names[i]} / {compatibility.names[j]}: {found}")
 
 
 def create_compatibility_matrix(compatibility: Dict[str, Dict[str, str]]) -> pd.DataFrame:
     """
     Crea DataFrame matrice compatibilità
+    
+    Nomi e codici vengono convertiti in interi una sola volta, tutte le
+    coppie scritte in un array NumPy con un'unica assegnazione vettoriale
+    e il DataFrame creato alla fine (niente .loc cella per cella).
     """
     drugs = sorted(compatibility.keys())
+    index = {drug: i for i, drug in enumerate(drugs)}
     
-    # Crea matrice vuota
-    matrix = pd.DataFrame('', index=drugs, columns=drugs)
+    # Codice 0 = cella vuota
+    code_index = {'': 0}
+    rows, cols, values = [], [], []
+    for drug1, row in compatibility.items():
+        i = index[drug1]
+        for drug2, compat in row.items():
+            j = index.get(drug2)
+            if j is None or j == i:
+                continue
+            rows.append(i)
+            cols.append(j)
+            values.append(code_index.setdefault(compat, len(code_index)))
     
-    # Riempi con compatibilità
-    for drug1 in drugs:
-        for drug2 in drugs:
-            if drug1 != drug2:
-                compat = compatibility.get(drug1, {}).get(drug2, '')
-                matrix.loc[drug1, drug2] = compat
+    codes = np.zeros((len(drugs), len(drugs)), dtype=np.int32)
+    codes[rows, cols] = values
     
-    return matrix
+    labels = np.array(list(code_index), dtype=object)
+    return pd.DataFrame(labels[codes], index=drugs, columns=drugs)
+
+
+def resolve_inputs(inputs: List[str], manifest: Optional[str] = None) -> List[Path]:
+    """
+    PDF da elaborare: file, directory (tutti i *.pdf) e/o manifest
+    
+    Il manifest è un file di testo con un percorso per riga (righe vuote e
+    commenti # ignorati); i percorsi relativi partono dalla sua directory.
+    Senza input: primo PDF nella directory corrente. Duplicati rimossi.
+    """
+    paths: List[Path] = []
+    for item in inputs:
+        path = Path(item)
+        paths.extend(sorted(path.glob('*.pdf')) if path.is_dir() else [path])
+    
+    if manifest:
+        base = Path(manifest).parent
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    paths.append(base / line)
+    
+    if not inputs and not manifest:
+        paths = sorted(Path('.').glob('*.pdf'))[:1]
+    
+    unique: Dict[Path, Path] = {}
+    for path in paths:
+        unique.setdefault(path.resolve(), path)
+    return list(unique.values())
+
+
+def assemble_document(journal: PageJournal, total: int, matcher: DrugMatcher,
+                      output_dir: Path) -> Dict:
+    """
+    Ricostruisce gli output di un documento dal journal, in ordine di pagina
+    
+    Scrive in output_dir extracted_text.txt, drug_mentions.json e (se ci
+    sono compatibilità) drug_compatibility_extracted.json/.xlsx/.csv.
+    
+    Returns:
+        {'pages', 'missing', 'drugs', 'compatibility': CompatibilityIndex}
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_text = output_dir / 'extracted_text.txt'
+    compatibility = CompatibilityIndex()
+    previous_table = None
+    texts = []
+    text_pages = []
+    
+    with open(output_text, 'w', encoding='utf-8') as f:
+        for page_number in range(1, total + 1):
+            record = journal.read(page_number)
+            if record is None:
+                continue
+            write_page_text(f, page_number, record['text'])
+            texts.append(record['text'])
+            text_pages.append(page_number)
+            
+            # Tabelle (griglie) e righe "Farmaco1 | Farmaco2 | C", unite per coppia
+            tables = parse_table_structure(record['words'] or [], matcher.vocabulary, previous_table)
+            if tables:
+                previous_table = tables[-1]
+            for table in tables:
+                for drug1, drug2, code in table['entries']:
+                    compatibility.add(drug1, drug2, code, page_number)
+            # Regex di riga solo dove non c'è una griglia (altrimenti legge le righe della griglia)
+            if tables:
+                continue
+            for drug1, row in parse_compatibility_table(record['text']).items():
+                for drug2, code in row.items():
+                    compatibility.add(drug1, drug2, code, page_number)
+    
+    summary = {'pages': len(texts), 'missing': total - len(texts), 'drugs': [],
+               'compatibility': compatibility}
+    if summary['missing']:
+        print(f"⚠️  {summary['missing']} pagine mancanti nel journal: riesegui con --resume")
+    
+    if not texts:
+        print("❌ Nessun testo estratto")
+        return summary
+    
+    print(f"✅ Estratte {len(texts)} pagine")
+    print(f"💾 Testo salvato in: {output_text}")
+    
+    # Estrai farmaci (con pagina e posizione di ogni menzione)
+    mentions = find_drug_mentions(texts, pages=text_pages, matcher=matcher)
+    by_drug: Dict[str, List[Dict]] = {}
+    for mention in mentions:
+        by_drug.setdefault(mention['drug'], []).append(mention)
+    summary['drugs'] = sorted(by_drug)
+    print(f"\n💊 Farmaci trovati ({len(by_drug)}):")
+    for drug in summary['drugs']:
+        drug_pages = sorted({m['page'] for m in by_drug[drug]})
+        print(f"   - {drug} ({len(by_drug[drug])} menzioni, pagine {', '.join(map(str, drug_pages))})")
+    
+    mentions_file = output_dir / 'drug_mentions.json'
+    with open(mentions_file, 'w', encoding='utf-8') as f:
+        json.dump(mentions, f, indent=2, ensure_ascii=False)
+    print(f"💾 Menzioni salvate in: {mentions_file}")
+    
+    if compatibility.cells:
+        print(f"\n✅ Compatibilità trovate: {len(compatibility.names)} farmaci")
+        print_conflict_report(compatibility)
+        save_compatibility(compatibility, output_dir)
+    else:
+        print("\n⚠️  Nessuna compatibilità estratta automaticamente")
+        print(f"💡 Controlla {output_text} e completa manualmente")
+    
+    return summary
+
+
+def save_compatibility(compatibility: CompatibilityIndex, output_dir: Path):
+    """Salva JSON indicizzato, matrice Excel e CSV"""
+    json_file = output_dir / 'drug_compatibility_extracted.json'
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(compatibility.to_dict(), f, indent=2, ensure_ascii=False)
+    print(f"💾 JSON salvato: {json_file}")
+    
+    # Crea matrice
+    matrix = create_compatibility_matrix(compatibility.to_nested())
+    
+    # Salva Excel
+    excel_file = output_dir / 'drug_compatibility_extracted.xlsx'
+    matrix.to_excel(excel_file)
+    print(f"💾 Excel salvato: {excel_file}")
+    
+    # Salva CSV
+    csv_file = output_dir / 'drug_compatibility_extracted.csv'
+    matrix.to_csv(csv_file)
+    print(f"💾 CSV salvato: {csv_file}")
+
+
+def print_document_report(results: List[Dict], finished: Dict[str, float], run_start: float):
+    """Throughput per documento (pagine, percorso, tempo fino all'ultima pagina)"""
+    print(f"\n📚 Documenti:")
+    by_pdf: Dict[str, List[Dict]] = {}
+    for result in results:
+        by_pdf.setdefault(result['pdf'], []).append(result)
+    
+    for pdf_path, pdf_results in by_pdf.items():
+        text = sum(1 for r in pdf_results if r['source'] == 'text')
+        failed = sum(1 for r in pdf_results if r['error'])
+        wall = finished[pdf_path] - run_start
+        pages_per_minute = len(pdf_results) * 60 / wall if wall else 0.0
+        errors = f"  ❌ {failed} fallite" if failed else ''
+        print(f"   {Path(pdf_path).name:<40} {len(pdf_results):>5} pagine "
+              f"({text} testo, {len(pdf_results) - text} OCR)  {wall:>7.1f}s  "
+              f"{pages_per_minute:>7.1f} pagine/minuto{errors}")
+    
+    wall = max(finished.values()) - run_start
+    print(f"   Totale: {len(results)} pagine in {wall:.1f}s "
+          f"({len(results) * 60 / wall if wall else 0.0:.1f} pagine/minuto)")
 
 
 def main():
     """
     Workflow completo estrazione
     """
+    parser = argparse.ArgumentParser(
+        description='Estrae compatibilità farmaci da PDF (testo nativo o OCR)'
+    )
+    parser.add_argument(
+        'inputs',
+        nargs='*',
+        help='PDF o directory di PDF da elaborare (default: primo PDF nella directory corrente)'
+    )
+    parser.add_argument(
+        '--manifest',
+        type=str,
+        default=None,
+        help='File con un PDF per riga (elaborazione batch)'
+    )
+    parser.add_argument(
+        '--output-dir',
+        type=str,
+        default='.',
+        help='Directory output (con più PDF: una sottodirectory per documento + merged/)'
+    )
+    parser.add_argument(
+        '--dpi',
+        type=int,
+        default=300,
+        help='Risoluzione rasterizzazione (default: 300)'
+    )
+    parser.add_argument(
+        '--page-window',
+        type=int,
+        default=1,
+        help='Pagine rasterizzate contemporaneamente (default: 1)'
+    )
+    parser.add_argument(
+        '--workers',
+        '-j',
+        type=int,
+        default=1,
+        help='Processi per rasterizzazione+OCR in parallelo (default: 1, 0 = tutte le CPU)'
+    )
+    parser.add_argument(
+        '--force-ocr',
+        action='store_true',
+        help='Ignora il testo nativo del PDF e fai OCR di tutte le pagine'
+    )
+    parser.add_argument(
+        '--vocabulary',
+        type=str,
+        default=None,
+        help='drugs-database.min.json per i nomi farmaco (default: public/data)'
+    )
+    parser.add_argument(
+        '--checkpoint-dir',
+        type=str,
+        default=DEFAULT_CHECKPOINT_DIR,
+        help=f'Directory dei journal per pagina (default: {DEFAULT_CHECKPOINT_DIR})'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Salta le pagine già completate nel journal (stesso PDF e parametri)'
+    )
+    parser.add_argument(
+        '--ocr-cache',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help=f'Directory cache OCR (default: {DEFAULT_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--ocr-cache-size',
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help='Dimensione massima cache OCR in MB (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--no-ocr-cache',
+        action='store_true',
+        help='Disabilita la cache OCR'
+    )
+    args = parser.parse_args()
+    
     print("🔬 DRUG COMPATIBILITY EXTRACTOR")
     print("=" * 50)
     
-    # Cerca PDF nella directory
-    pdf_files = list(Path('.').glob('*.pdf'))
+    pdf_paths = resolve_inputs(args.inputs, args.manifest)
+    missing_files = [p for p in pdf_paths if not p.exists()]
+    for path in missing_files:
+        print(f"❌ PDF non trovato: {path}")
+    pdf_paths = [p for p in pdf_paths if p.exists()]
     
-    if not pdf_files:
-        print("❌ Nessun PDF trovato nella directory corrente")
-        print("💡 Copia il PDF delle compatibilità qui e riprova")
+    if not pdf_paths:
+        if not args.inputs and not args.manifest:
+            print("❌ Nessun PDF trovato nella directory corrente")
+            print("💡 Copia il PDF delle compatibilità qui e riprova")
         return
+    for pdf_path in pdf_paths:
+        print(f"📄 PDF trovato: {pdf_path}")
     
-    pdf_path = pdf_files[0]
-    print(f"📄 PDF trovato: {pdf_path}")
+    ocr_cache = None
+    if not args.no_ocr_cache:
+        ocr_cache = OcrCache(args.ocr_cache, max_bytes=args.ocr_cache_size * 1024 * 1024)
     
-    # Estrai testo
-    texts = extract_text_from_pdf(str(pdf_path))
+    # Ogni pagina finisce nel journal appena elaborata: un'interruzione non fa
+    # ricominciare da capo (--resume)
+    params = {'dpi': args.dpi, 'force_ocr': args.force_ocr}
+    journals: Dict[str, PageJournal] = {}
+    totals: Dict[str, int] = {}
+    documents: Dict[str, List[int]] = {}
+    for pdf_path in pdf_paths:
+        try:
+            totals[str(pdf_path)] = get_page_count(str(pdf_path))
+        except Exception as e:
+            print(f"❌ Errore lettura {pdf_path}: {e}")
+            continue
+        journal = PageJournal(args.checkpoint_dir, str(pdf_path), params)
+        journals[str(pdf_path)] = journal
+        pending = list(range(1, totals[str(pdf_path)] + 1))
+        if args.resume:
+            done = journal.completed()
+            pending = [n for n in pending if n not in done]
+            print(f"♻️  {pdf_path.name}: {len(done & set(range(1, totals[str(pdf_path)] + 1)))}/"
+                  f"{totals[str(pdf_path)]} pagine già completate ({journal.path})")
+        if pending:
+            documents[str(pdf_path)] = pending
     
-    if not texts:
-        print("❌ Nessun testo estratto")
-        return
+    page_results = []
+    finished: Dict[str, float] = {}
+    run_start = time.perf_counter()
     
-    print(f"✅ Estratte {len(texts)} pagine")
+    try:
+        if len(journals) == 1 and documents:
+            (pdf_path, pending), = documents.items()
+            results = iter_page_results(pdf_path, dpi=args.dpi, ocr_cache=ocr_cache,
+                                        window=args.page_window, workers=args.workers,
+                                        use_text_layer=not args.force_ocr, pages=pending)
+        else:
+            # Pagine di tutti i PDF in un unico pool
+            results = iter_batch_results(documents, dpi=args.dpi, ocr_cache=ocr_cache,
+                                         window=args.page_window, workers=args.workers,
+                                         use_text_layer=not args.force_ocr)
+        for result in results:
+            journals[result['pdf']].append(result)
+            # Le parole restano solo nel journal: non tenerle in memoria
+            result.pop('words', None)
+            page_results.append(result)
+            finished[result['pdf']] = time.perf_counter()
+    except Exception as e:
+        print(f"❌ Errore conversione PDF: {e}")
     
-    # Salva testo grezzo per debug
-    output_text = Path('extracted_text.txt')
-    with open(output_text, 'w', encoding='utf-8') as f:
-        for i, text in enumerate(texts, 1):
-            f.write(f"\n{'='*50}\n")
-            f.write(f"PAGINA {i}\n")
-            f.write(f"{'='*50}\n")
-            f.write(text)
+    if page_results:
+        if len(journals) == 1:
+            print_page_report(page_results, time.perf_counter() - run_start)
+        else:
+            print_document_report(page_results, finished, run_start)
     
-    print(f"💾 Testo salvato in: {output_text}")
+    if ocr_cache:
+        # In parallelo ogni worker ha i propri contatori
+        worker_stats = [r['ocr_cache'] for r in page_results if r.get('ocr_cache')]
+        print(f"🗄️  {ocr_cache.report(merge_stats(*worker_stats) if worker_stats else None)}")
     
-    # Estrai farmaci
-    drugs = extract_drug_names(texts)
-    print(f"\n💊 Farmaci trovati ({len(drugs)}):")
-    for drug in drugs:
-        print(f"   - {drug}")
+    # Output per documento ricostruiti dal journal; con più PDF anche la
+    # matrice unita (coppie deduplicate, conflitti tra documenti segnalati)
+    output_dir = Path(args.output_dir)
+    matcher = build_drug_matcher(args.vocabulary)
+    merged = CompatibilityIndex()
     
-    # Parse compatibilità
-    compatibility = {}
-    for text in texts:
-        compat = parse_compatibility_table(text)
-        compatibility.update(compat)
+    used_names: Dict[str, int] = {}
+    for pdf_path, journal in journals.items():
+        # Stesso nome in directory diverse: manuale, manuale_2, ...
+        stem = Path(pdf_path).stem
+        used_names[stem] = used_names.get(stem, 0) + 1
+        if used_names[stem] > 1:
+            stem = f"{stem}_{used_names[stem]}"
+        doc_dir = output_dir if len(journals) == 1 else output_dir / stem
+        if len(journals) > 1:
+            print(f"\n📘 {Path(pdf_path).name} -> {doc_dir}")
+        summary = assemble_document(journal, totals[pdf_path], matcher, doc_dir)
+        merged.merge_from(summary['compatibility'], Path(pdf_path).name)
     
-    if compatibility:
-        print(f"\n✅ Compatibilità trovate: {len(compatibility)}")
-        
-        # Crea matrice
-        matrix = create_compatibility_matrix(compatibility)
-        
-        # Salva Excel
-        excel_file = Path('drug_compatibility_extracted.xlsx')
-        matrix.to_excel(excel_file)
-        print(f"💾 Excel salvato: {excel_file}")
-        
-        # Salva CSV
-        csv_file = Path('drug_compatibility_extracted.csv')
-        matrix.to_csv(csv_file)
-        print(f"💾 CSV salvato: {csv_file}")
-    else:
-        print("\n⚠️  Nessuna compatibilità estratta automaticamente")
-        print("💡 Controlla extracted_text.txt e completa manualmente")
+    if len(journals) > 1 and merged.cells:
+        merged_dir = output_dir / 'merged'
+        merged_dir.mkdir(parents=True, exist_ok=True)
+        print(f"\n🔗 Matrice unita ({len(journals)} documenti, {len(merged.names)} farmaci) -> {merged_dir}")
+        print_conflict_report(merged)
+        save_compatibility(merged, merged_dir)
     
     print("\n" + "="*50)
     print("✅ COMPLETATO")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Fake locale del client gspread (Google Sheets API) per test e benchmark
+
+Implementa il sottoinsieme usato da export_compatibility_to_google_sheets.py
+senza rete né credenziali, e registra quante richieste vengono fatte e quanti
+byte di payload JSON verrebbero inviati:
+
+    client = FakeClient()
+    upload_to_google_sheets(client, SPREADSHEET_ID, matrix)
+    print(client.stats())          # {'requests': 2, 'payload_bytes': 18234, ...}
+    client.open_by_key(SPREADSHEET_ID).sheet1.get_all_values()
+
+Le richieste spreadsheets.batchUpdate supportate (updateCells,
+updateSheetProperties, add/deleteConditionalFormatRule, repeatCell) vengono
+applicate a una griglia in memoria, così il contenuto finale del foglio può
+essere confrontato con la matrice esportata.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class FakeWorksheet:
+    """Foglio in memoria: celle, dimensioni, righe/colonne bloccate, regole di formattazione"""
+
+    def __init__(self, spreadsheet: 'FakeSpreadsheet', sheet_id: int = 0, title: str = 'Sheet1'):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.cells: Dict[tuple, str] = {}
+        self.grid = {'rowCount': 1000, 'columnCount': 26, 'frozenRowCount': 0, 'frozenColumnCount': 0}
+        self.conditional_formats: List[Dict] = []
+        self.formats: List[Dict] = []
+
+    # ------------------------------------------------------------------
+    # API valori (gspread Worksheet)
+    # ------------------------------------------------------------------
+
+    def clear(self):
+        self.spreadsheet._record('values.clear', {})
+        self.cells.clear()
+
+    def update(self, values: List[List[Any]], range_name: str = 'A1'):
+        self.spreadsheet._record('values.update', {'range': range_name, 'values': values})
+        row, col = _parse_a1(range_name.split(':')[0])
+        self._write(row, col, values)
+
+    def batch_update(self, data: List[Dict]):
+        self.spreadsheet._record('values.batchUpdate', {'data': data})
+        for entry in data:
+            row, col = _parse_a1(entry['range'].split(':')[0])
+            self._write(row, col, entry['values'])
+
+    def format(self, range_name: str, cell_format: Dict):
+        self.spreadsheet._record('format', {'range': range_name, 'format': cell_format})
+        self.formats.append({'range': range_name, 'format': cell_format})
+
+    def _write(self, row: int, col: int, values: List[List[Any]]):
+        for r, row_values in enumerate(values):
+            for c, value in enumerate(row_values):
+                self._set(row + r, col + c, value)
+
+    def _set(self, row: int, col: int, value: Any):
+        if value in (None, ''):
+            self.cells.pop((row, col), None)
+        else:
+            self.cells[(row, col)] = str(value)
+
+    # ------------------------------------------------------------------
+    # Lettura
+    # ------------------------------------------------------------------
+
+    def get_all_values(self) -> List[List[str]]:
+        """Contenuto come lista di righe (fino all'ultima cella non vuota)"""
+        if not self.cells:
+            return []
+        rows = max(r for r, _ in self.cells) + 1
+        cols = max(c for _, c in self.cells) + 1
+        return [[self.cells.get((r, c), '') for c in range(cols)] for r in range(rows)]
+
+
+class FakeSpreadsheet:
+    """Spreadsheet con un solo foglio; batch_update applica le richieste alla griglia"""
+
+    def __init__(self, client: 'FakeClient', key: str):
+        self.client = client
+        self.id = key
+        self.sheet1 = FakeWorksheet(self)
+
+    def _record(self, kind: str, body: Dict):
+        self.client._record(kind, body)
+
+    def fetch_sheet_metadata(self, params: Optional[Dict] = None) -> Dict:
+        self._record('get', params or {})
+        sheet = self.sheet1
+        return {'sheets': [{
+            'properties': {'sheetId': sheet.id, 'title': sheet.title, 'gridProperties': dict(sheet.grid)},
+            'conditionalFormats': list(sheet.conditional_formats),
+        }]}
+
+    def batch_update(self, body: Dict) -> Dict:
+        self._record('batchUpdate', body)
+        for request in body.get('requests', []):
+            (kind, params), = request.items()
+            getattr(self, f"_apply_{kind}")(params)
+        return {'spreadsheetId': self.id, 'replies': [{} for _ in body.get('requests', [])]}
+
+    # ------------------------------------------------------------------
+    # Richieste batchUpdate
+    # ------------------------------------------------------------------
+
+    def _apply_updateSheetProperties(self, params: Dict):
+        self.sheet1.grid.update(params['properties'].get('gridProperties', {}))
+
+    def _apply_updateCells(self, params: Dict):
+        sheet = self.sheet1
+        grid_range = params['range']
+        start_row = grid_range.get('startRowIndex', 0)
+        start_col = grid_range.get('startColumnIndex', 0)
+
+        if 'rows' not in params:
+            # Nessuna riga = cancella l'intervallo
+            end_row = grid_range.get('endRowIndex', sheet.grid['rowCount'])
+            end_col = grid_range.get('endColumnIndex', sheet.grid['columnCount'])
+            for key in [k for k in sheet.cells if start_row <= k[0] < end_row and start_col <= k[1] < end_col]:
+                del sheet.cells[key]
+            return
+
+        for r, row in enumerate(params['rows']):
+            for c, cell in enumerate(row.get('values', [])):
+                value = cell.get('userEnteredValue', {})
+                sheet._set(start_row + r, start_col + c, next(iter(value.values()), ''))
+
+    def _apply_addConditionalFormatRule(self, params: Dict):
+        self.sheet1.conditional_formats.insert(params.get('index', len(self.sheet1.conditional_formats)),
+                                               params['rule'])
+
+    def _apply_deleteConditionalFormatRule(self, params: Dict):
+        del self.sheet1.conditional_formats[params['index']]
+
+    def _apply_repeatCell(self, params: Dict):
+        self.sheet1.formats.append(params)
+
+
+class FakeClient:
+    """Al posto di gspread.authorize(...): stessi metodi usati dall'exporter, nessuna rete"""
+
+    def __init__(self):
+        self.spreadsheets: Dict[str, FakeSpreadsheet] = {}
+        self.requests = 0
+        self.payload_bytes = 0
+        self.by_kind: Dict[str, int] = {}
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        if key not in self.spreadsheets:
+            self.spreadsheets[key] = FakeSpreadsheet(self, key)
+        return self.spreadsheets[key]
+
+    def _record(self, kind: str, body: Dict):
+        self.requests += 1
+        self.payload_bytes += len(json.dumps(body).encode('utf-8'))
+        self.by_kind[kind] = self.by_kind.get(kind, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Richieste HTTP equivalenti e byte di payload JSON"""
+        return {'requests': self.requests, 'payload_bytes': self.payload_bytes, 'by_kind': dict(self.by_kind)}
+
+    def reset_stats(self):
+        self.requests = 0
+        self.payload_bytes = 0
+        self.by_kind = {}
+
+
+def _parse_a1(cell: str) -> tuple:
+    """'B3' -> (2, 1) (riga, colonna 0-based)"""
+    letters = ''.join(ch for ch in cell if ch.isalpha())
+    digits = ''.join(ch for ch in cell if ch.isdigit())
+    col = 0
+    for ch in letters.upper():
+        col = col * 26 + (ord(ch) - ord('A') + 1)
+    return (int(digits) - 1 if digits else 0), col - 1
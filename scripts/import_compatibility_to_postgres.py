@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Importa le compatibilità farmaci in PostgreSQL (tabella normalizzata)
+Direzione inversa di export_compatibility_to_google_sheets.py: le correzioni
+fatte nel foglio / nel CSV tornano nel database letto dal sistema di farmacia
+
+Sorgenti:
+    - drugs-database.min.json (generato da csv-to-json-converter.py)
+    - CSV compFarmaci (stesso formato letto da csv-to-json-converter.py)
+
+Tabella destinazione (una riga per coppia ordinata di farmaci):
+    drug1 TEXT, drug2 TEXT, status TEXT, PRIMARY KEY (drug1, drug2)
+
+Caricamento: COPY FROM STDIN in una tabella di staging, poi scambio atomico
+con la tabella finale nella stessa transazione (chi legge vede sempre la
+versione vecchia completa oppure quella nuova, mai un caricamento a metà).
+
+Usage:
+    python import_compatibility_to_postgres.py                          # public/data/drugs-database.min.json
+    python import_compatibility_to_postgres.py input/compFarmaci.csv
+    python import_compatibility_to_postgres.py --dry-run                # solo lettura e conteggio
+    python import_compatibility_to_postgres.py --host localhost --database DrugsCompatibility --user postgres
+
+Test con PostgreSQL locale:
+    docker run --rm -e POSTGRES_PASSWORD=root -p 5432:5432 postgres:16
+    PGPASSWORD=root python import_compatibility_to_postgres.py --database postgres
+"""
+
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+try:
+    import psycopg2
+    from psycopg2 import sql
+except ImportError:
+    psycopg2 = None
+
+# =============================================================================
+# CONFIGURAZIONE
+# =============================================================================
+
+# PostgreSQL (stessi default di export_compatibility_to_google_sheets.py)
+DB_CONFIG = {
+    'host': 'localhost',
+    'port': '5432',
+    'database': 'DrugsCompatibility',
+    'user': 'postgres',
+    'password': os.environ.get('PGPASSWORD', 'root')
+}
+
+# Tabella normalizzata (drug1, drug2, status)
+PAIRS_TABLE = "drug_compatibility_pairs"
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_SOURCE = SCRIPT_DIR.parent / 'public' / 'data' / 'drugs-database.min.json'
+
+# =============================================================================
+# LETTURA SORGENTI
+# =============================================================================
+
+def _load_csv_converter():
+    """Modulo csv-to-json-converter.py (stessa conversione nomi/codici del JSON)"""
+    spec = importlib.util.spec_from_file_location('csv_to_json_converter', SCRIPT_DIR / 'csv-to-json-converter.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_pairs_from_json(json_path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Coppie dal database JSON dell'app
+
+    Yields:
+        (id farmaco, id altro farmaco, status) es. ('aciclovir', 'adrenalina', 'incompatible')
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        database = json.load(f)
+
+    for drug in database.get('drugs', []):
+        for entry in drug.get('compatibility', []):
+            yield drug['id'], entry['drugId'], entry['status']
+
+
+def read_pairs_from_csv(csv_path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Coppie dal CSV compFarmaci (colonna 0 = farmaco, colonne 5+ = compatibilità)
+
+    Nomi e codici sono convertiti come in csv-to-json-converter.py
+    (create_drug_id, parse_compatibility_value), quindi JSON e CSV
+    producono la stessa tabella.
+    """
+    converter = _load_csv_converter()
+
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [(i, converter.create_drug_id(name)) for i, name in enumerate(header[5:], start=5)
+                   if converter.clean_value(name)]
+
+        for row in reader:
+            if len(row) < 5 or not converter.clean_value(row[0]):
+                continue
+            drug_id = converter.create_drug_id(row[0])
+            for i, other_id in columns:
+                if i < len(row):
+                    yield drug_id, other_id, converter.parse_compatibility_value(row[i])
+
+
+def collect_pairs(pairs: Iterator[Tuple[str, str, str]], keep_unknown: bool = False) -> Dict[Tuple[str, str], str]:
+    """
+    Deduplica le coppie (chiave primaria drug1, drug2)
+
+    Args:
+        pairs: Coppie dalla sorgente
+        keep_unknown: Importa anche le coppie 'unknown' (default: assenza di riga = sconosciuto)
+
+    Returns:
+        {(drug1, drug2): status}; a parità di coppia vale la prima occorrenza
+    """
+    collected: Dict[Tuple[str, str], str] = {}
+    conflicts = 0
+
+    for drug1, drug2, status in pairs:
+        if status == 'unknown' and not keep_unknown:
+            continue
+        existing = collected.setdefault((drug1, drug2), status)
+        if existing != status:
+            conflicts += 1
+
+    if conflicts:
+        print(f"⚠️  {conflicts} coppie duplicate con status diverso (mantenuta la prima)")
+    return collected
+
+# =============================================================================
+# CARICAMENTO POSTGRESQL
+# =============================================================================
+
+def connect_to_postgres(config: Dict[str, str]):
+    """Connessione al database PostgreSQL"""
+    try:
+        conn = psycopg2.connect(**config)
+        print("✅ Connesso a PostgreSQL")
+        return conn
+    except Exception as e:
+        print(f"❌ Errore connessione PostgreSQL: {e}")
+        sys.exit(1)
+
+
+def _copy_buffer(pairs: Dict[Tuple[str, str], str]) -> io.StringIO:
+    """Righe in formato CSV per COPY FROM STDIN"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for (drug1, drug2), status in pairs.items():
+        writer.writerow((drug1, drug2, status))
+    buffer.seek(0)
+    return buffer
+
+
+def load_pairs(conn, pairs: Dict[Tuple[str, str], str], table: str = PAIRS_TABLE) -> float:
+    """
+    Carica le coppie con COPY in staging e scambia atomicamente le tabelle
+
+    Tutto avviene in una transazione: staging creata e riempita con COPY,
+    chiave primaria aggiunta dopo il caricamento (più veloce che mantenere
+    l'indice riga per riga), poi DROP della tabella vecchia e RENAME della
+    staging. In caso di errore il rollback lascia intatta la tabella esistente.
+
+    Returns:
+        Secondi impiegati
+    """
+    start = time.perf_counter()
+    staging = f"{table}_staging"
+    ids = {
+        'table': sql.Identifier(table),
+        'staging': sql.Identifier(staging),
+        'staging_pkey': sql.Identifier(f"{staging}_pkey"),
+        'table_pkey': sql.Identifier(f"{table}_pkey"),
+    }
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {staging}").format(**ids))
+            cursor.execute(sql.SQL(
+                "CREATE TABLE {staging} (drug1 TEXT NOT NULL, drug2 TEXT NOT NULL, status TEXT NOT NULL)"
+            ).format(**ids))
+
+            cursor.copy_expert(
+                sql.SQL("COPY {staging} (drug1, drug2, status) FROM STDIN WITH (FORMAT csv)").format(**ids),
+                _copy_buffer(pairs)
+            )
+
+            cursor.execute(sql.SQL(
+                "ALTER TABLE {staging} ADD CONSTRAINT {staging_pkey} PRIMARY KEY (drug1, drug2)"
+            ).format(**ids))
+
+            # Scambio atomico
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {table}").format(**ids))
+            cursor.execute(sql.SQL("ALTER TABLE {staging} RENAME TO {table}").format(**ids))
+            cursor.execute(sql.SQL("ALTER INDEX {staging_pkey} RENAME TO {table_pkey}").format(**ids))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # Statistiche per il planner (fuori dalla transazione dello scambio)
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("ANALYZE {table}").format(**ids))
+    conn.commit()
+
+    return time.perf_counter() - start
+
+
+def print_status_summary(pairs: Dict[Tuple[str, str], str]):
+    """Conteggio coppie per status"""
+    counts: Dict[str, int] = {}
+    for status in pairs.values():
+        counts[status] = counts.get(status, 0) + 1
+    drugs = {drug for pair in pairs for drug in pair}
+    print(f"📊 {len(pairs)} coppie, {len(drugs)} farmaci")
+    for status, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"   {status:<25} {count}")
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Importa compatibilità farmaci (JSON app o CSV) in PostgreSQL'
+    )
+    parser.add_argument(
+        'source',
+        nargs='?',
+        default=str(DEFAULT_SOURCE),
+        help='drugs-database.min.json oppure CSV compFarmaci (default: public/data/drugs-database.min.json)'
+    )
+    parser.add_argument('--table', default=PAIRS_TABLE, help='Tabella destinazione (default: %(default)s)')
+    parser.add_argument('--host', default=DB_CONFIG['host'])
+    parser.add_argument('--port', default=DB_CONFIG['port'])
+    parser.add_argument('--database', default=DB_CONFIG['database'])
+    parser.add_argument('--user', default=DB_CONFIG['user'])
+    parser.add_argument(
+        '--keep-unknown',
+        action='store_true',
+        help="Importa anche le coppie 'unknown' (default: omesse)"
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Legge e conta le coppie senza scrivere nel database'
+    )
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🏥 IMPORT COMPATIBILITÀ FARMACI - JSON/CSV → PostgreSQL")
+    print("=" * 70)
+
+    source = Path(args.source)
+    if not source.exists():
+        print(f"❌ Sorgente non trovata: {source}")
+        sys.exit(1)
+
+    print(f"📄 Sorgente: {source}")
+    start = time.perf_counter()
+    reader = read_pairs_from_csv if source.suffix.lower() == '.csv' else read_pairs_from_json
+    pairs = collect_pairs(reader(str(source)), keep_unknown=args.keep_unknown)
+    print(f"✅ Lette in {time.perf_counter() - start:.2f}s")
+    print_status_summary(pairs)
+
+    if not pairs:
+        print("❌ Nessuna coppia da importare")
+        sys.exit(1)
+
+    if args.dry_run:
+        print("\n🔍 Dry run: nessuna scrittura nel database")
+        return
+
+    if psycopg2 is None:
+        print("❌ psycopg2 non installato (pip install psycopg2-binary)")
+        sys.exit(1)
+
+    config = dict(DB_CONFIG, host=args.host, port=args.port, database=args.database, user=args.user)
+    conn = connect_to_postgres(config)
+    try:
+        seconds = load_pairs(conn, pairs, args.table)
+    except Exception as e:
+        print(f"❌ Errore import (tabella esistente invariata): {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    print(f"\n✅ {len(pairs)} coppie caricate in {args.table} in {seconds:.2f}s "
+          f"({len(pairs) / seconds:.0f} righe/s)")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
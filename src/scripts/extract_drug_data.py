@@ -5,18 +5,37 @@ Extracts drug compatibility data from San Gerardo Hospital table images
 
 Usage:
     python extract_drug_data.py --input images/ --output drugs_extracted.json
+    python extract_drug_data.py --input images/ --jobs 4   # parallel (process pool)
+    python extract_drug_data.py --input images/ --no-ocr-cache   # always re-run tesseract
+    python extract_drug_data.py --input images/ --adaptive       # re-OCR low-confidence names only
+    python extract_drug_data.py --input images/ --grid-max-width 0   # grid detection at full resolution
+    python extract_drug_data.py --input images/ --palette-labels labels.json   # calibrate colors
+
+Palette labels file (legend cells or hand-labelled cells of a sample image):
+    {"image": "1-image.png", "cells": [{"code": "C", "bbox": [x0, y0, x1, y1]}, ...]}
 
 Requirements:
     pip install pytesseract pillow opencv-python pandas numpy
 """
 
 import argparse
+import bisect
 import json
+import os
 import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import sys
 
+from drug_vocabulary import load_drug_vocabulary, normalize_name, snap_to_vocabulary
+from ocr_cache import (
+    DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, OcrCache, merge_stats, ocr_image_to_data, ocr_image_to_string
+)
+
 # Optional dependencies (install with: pip install pytesseract pillow opencv-python pandas)
 try:
     import cv2
@@ -65,108 +84,856 @@ def detect_category(drug_name: str) -> str:
     return 'other'
 
 
-def extract_drug_names_from_image(image_path: str) -> List[str]:
+# Binarization threshold for OCR (dark text on light background)
+BINARY_THRESHOLD = 150
+
+# San Gerardo table layout (fractions of image width, approximate coordinates)
+NAME_COLUMN_RATIO = 0.15     # Row headers (PRINCIPIO ATTIVO) live in the first 15%
+MATRIX_START_RATIO = 0.20    # Compatibility cells start after the CVC/periferica column
+
+# Grid detection runs on a downscaled pyramid level no wider than this
+# (0 = always full resolution). Header OCR always uses native resolution.
+GRID_MAX_WIDTH = 2000
+
+# ...but only for images of at least this many pixels: below it the
+# full-resolution opening is faster than building the pyramid level
+GRID_DOWNSCALE_MIN_PIXELS = 24_000_000
+
+# Single OCR pass over the whole table (sparse text, word boxes + confidences)
+TABLE_OCR_CONFIG = '--psm 11'
+
+# Adaptive mode: names below this confidence get the expensive treatment
+DEFAULT_MIN_CONFIDENCE = 60
+REOCR_SCALE = 3              # Upscale factor for low-confidence crops
+REOCR_PADDING = 4            # Pixels around the word box
+REOCR_CONFIG = '--psm 7'     # Single text line
+
+# Compatibility cell colors. Index 0 = no data (grey/white, low saturation)
+PALETTE_CODES = ['', 'C', 'Y', 'I', '!']
+
+# Default palette centroids (OpenCV HSV: hue 0-179, saturation 0-255)
+DEFAULT_PALETTE = {
+    'C': [60, 200],    # Green
+    'Y': [30, 200],    # Yellow
+    'I': [0, 200],     # Red
+    '!': [15, 200],    # Orange
+}
+MIN_SATURATION = 50          # Below this a pixel is grey/white (no data)
+MIN_VALUE = 60               # Darker pixels are text or grid lines, ignored
+HUE_WEIGHT = 4.0             # Hue distance matters more than saturation
+MIN_COLOR_FRACTION = 0.3     # Share of colored pixels for a cell to get a code
+CELL_MARGIN = 1              # Pixels trimmed from each cell edge (grid lines)
+
+
+class ImagePipeline:
+    """
+    Decode-once image holder shared by every extraction stage
+    
+    The image is decoded a single time; derived views (grayscale, binary,
+    HSV, crops) are computed lazily on first access and cached as NumPy
+    arrays, so later stages reuse them instead of converting again.
+    Call release() (or use it as a context manager) as soon as all stages
+    are done to drop the buffers.
+    
+    Usage:
+        with ImagePipeline('1-image.png') as pipeline:
+            names = _extract_drug_names(pipeline)
+            matrix = _extract_compatibility_matrix(pipeline)
+    """
+    
+    def __init__(self, image_path: str, ocr_cache: Optional[OcrCache] = None,
+                 grid_max_width: int = GRID_MAX_WIDTH):
+        self.image_path = image_path
+        self.name = Path(image_path).name
+        self.ocr_cache = ocr_cache
+        self.grid_max_width = grid_max_width
+        self._views: Dict[str, 'np.ndarray'] = {}
+        # Stage results shared across stages (e.g. the structured OCR table)
+        self.results: Dict[str, object] = {}
+    
+    def __enter__(self) -> 'ImagePipeline':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+    
+    @property
+    def image(self) -> 'np.ndarray':
+        """Decoded BGR image (decoded once)"""
+        if 'bgr' not in self._views:
+            img = cv2.imread(self.image_path)
+            if img is None:
+                raise ValueError(f"Failed to load image: {self.image_path}")
+            self._views['bgr'] = img
+        return self._views['bgr']
+    
+    @property
+    def gray(self) -> 'np.ndarray':
+        """Grayscale view"""
+        if 'gray' not in self._views:
+            self._views['gray'] = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._views['gray']
+    
+    @property
+    def binary(self) -> 'np.ndarray':
+        """Inverted binary view (text = white) for OCR"""
+        if 'binary' not in self._views:
+            _, thresh = cv2.threshold(self.gray, BINARY_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+            self._views['binary'] = thresh
+        return self._views['binary']
+    
+    @property
+    def hsv(self) -> 'np.ndarray':
+        """HSV view for color detection"""
+        if 'hsv' not in self._views:
+            self._views['hsv'] = cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV)
+        return self._views['hsv']
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(height, width) of the decoded image"""
+        return self.image.shape[:2]
+    
+    def crop(self, view: str, x0: int, y0: int, x1: int, y1: int) -> 'np.ndarray':
+        """
+        Cached crop of a derived view
+        
+        Args:
+            view: 'image', 'gray', 'binary' or 'hsv'
+            x0, y0, x1, y1: Crop rectangle in pixels
+        
+        Returns:
+            NumPy view (no copy) of the requested region
+        """
+        key = f"{view}[{y0}:{y1},{x0}:{x1}]"
+        if key not in self._views:
+            self._views[key] = getattr(self, view)[y0:y1, x0:x1]
+        return self._views[key]
+    
+    def ocr_to_string(self, image: 'np.ndarray', config: str = '') -> str:
+        """OCR one of the pipeline views (through the OCR cache, if any)"""
+        return ocr_image_to_string(image, config=config, cache=self.ocr_cache)
+    
+    def ocr_to_data(self, image: 'np.ndarray', config: str = '') -> Dict[str, list]:
+        """Word-level OCR (boxes + confidences) of a pipeline view, cached if possible"""
+        return ocr_image_to_data(image, config=config, cache=self.ocr_cache)
+    
+    def release(self):
+        """Drop all cached buffers and stage results"""
+        self._views.clear()
+        self.results.clear()
+
+
+@contextmanager
+def _as_pipeline(image: Union[str, ImagePipeline]) -> Iterator[ImagePipeline]:
+    """
+    Accept either an image path or an existing pipeline
+    
+    A pipeline created here from a path is released on exit; one passed
+    in by the caller is left alone (the caller still owns its buffers).
+    """
+    if isinstance(image, ImagePipeline):
+        yield image
+        return
+    with ImagePipeline(image) as pipeline:
+        yield pipeline
+
+
+def clean_drug_name(text: str) -> str:
+    """
+    Clean an OCR'd drug name
+    
+    Returns:
+        Title-cased name, or '' if the text does not look like a drug name
+    """
+    text = text.strip()
+    # Remove common OCR errors and filter valid drug names
+    if len(text) <= 3 or text.isdigit():
+        return ''
+    drug_name = re.sub(r'[^a-zA-Z\s\+\-]', '', text)
+    drug_name = ' '.join(drug_name.split())  # Remove extra spaces
+    return drug_name.title() if len(drug_name) > 3 else ''
+
+
+def _cluster_positions(positions: 'np.ndarray', gap: int = 2) -> List[int]:
+    """Merge runs of adjacent pixel positions into single line coordinates"""
+    lines = []
+    start = prev = None
+    for pos in positions.tolist():
+        if start is None:
+            start = prev = pos
+        elif pos - prev > gap:
+            lines.append((start + prev) // 2)
+            start = pos
+        prev = pos
+    if start is not None:
+        lines.append((start + prev) // 2)
+    return lines
+
+
+def _line_kernel(shape: Tuple[int, int], horizontal: bool) -> 'np.ndarray':
+    """Long thin kernel for an image of this shape: keeps only lines, not text strokes"""
+    height, width = shape
+    if horizontal:
+        return cv2.getStructuringElement(cv2.MORPH_RECT, (max(20, width // 80), 1))
+    return cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(8, height // 40)))
+
+
+def _open_lines(mask: 'np.ndarray', horizontal: bool) -> List[int]:
+    """Morphological line detection on a binary line mask (one orientation)"""
+    lines = cv2.morphologyEx(mask, cv2.MORPH_OPEN, _line_kernel(mask.shape, horizontal))
+    return _cluster_positions(np.flatnonzero(lines.any(axis=1 if horizontal else 0)))
+
+
+def _downscale_for_lines(mask: 'np.ndarray', factor: int, horizontal: bool) -> 'np.ndarray':
+    """
+    Anisotropic pyramid level for one line orientation
+    
+    Along the line direction pixels are averaged, so only solid runs stay
+    bright (text strokes fade); across it they are max-pooled, so 1-pixel
+    lines are never lost.
+    """
+    height, width = mask.shape
+    rows, cols = height // factor * factor, width // factor * factor
+    
+    size = (cols // factor, rows) if horizontal else (cols, rows // factor)
+    averaged = cv2.resize(mask[:rows, :cols], size, interpolation=cv2.INTER_AREA)
+    _, solid = cv2.threshold(averaged, 191, 255, cv2.THRESH_BINARY)
+    
+    # Max-pool across the lines with strided slices (no per-pixel reshape)
+    band = (lambda k: solid[k::factor]) if horizontal else (lambda k: solid[:, k::factor])
+    pooled = band(0).copy()
+    for k in range(1, factor):
+        np.maximum(pooled, band(k), out=pooled)
+    return pooled
+
+
+def _solid_runs(band: 'np.ndarray', length: int) -> 'np.ndarray':
+    """Indices of the band rows that contain a run of at least `length` set pixels"""
+    rows, cols = band.shape
+    padded = np.zeros((rows, cols + 2), dtype=bool)
+    padded[:, 1:-1] = band > 0
+    # Every row starts and ends with a zero: gaps between zeros are the runs
+    zeros = np.flatnonzero(~padded.ravel())
+    runs = np.diff(zeros) - 1
+    return np.unique(zeros[:-1][runs >= length] // (cols + 2))
+
+
+def _refine_lines(coarse: List[int], factor: int, mask: 'np.ndarray', horizontal: bool) -> List[int]:
+    """
+    Map downscaled line positions back to full resolution
+    
+    Each candidate's band of `factor` full-resolution rows/columns must
+    contain a solid run as long as the full-resolution kernel (the same
+    test the opening applies), so candidates made of pooled text strokes
+    are dropped and kept lines sit where full-resolution detection puts them.
+    """
+    kernel = _line_kernel(mask.shape, horizontal)
+    length = max(kernel.shape)
+    refined = []
+    for pos in coarse:
+        lo = pos * factor
+        band = mask[lo:lo + factor] if horizontal else mask[:, lo:lo + factor].T
+        hits = _solid_runs(band, length)
+        if len(hits):
+            refined.append(lo + int(hits[0] + hits[-1]) // 2)
+    return refined
+
+
+def detect_grid_lines(pipeline: ImagePipeline) -> Tuple[List[int], List[int]]:
+    """
+    Detect ruled table lines with morphological opening
+    
+    Large high-DPI scans (at least GRID_DOWNSCALE_MIN_PIXELS) are processed
+    on a downscaled level no wider than pipeline.grid_max_width (see
+    _downscale_for_lines); the lines found there are checked and mapped
+    back to full-resolution coordinates by _refine_lines.
+    
+    Args:
+        pipeline: Decoded image
+        
+    Returns:
+        (y of horizontal lines, x of vertical lines) in full-resolution
+        pixels, sorted (cached on the pipeline)
+    """
+    key = f"grid@{pipeline.grid_max_width}"
+    if key in pipeline.results:
+        return pipeline.results[key]
+    
+    # Grid lines are dark and unsaturated: colored cells (red is dark too) are not lines
+    mask = cv2.bitwise_and(pipeline.binary, pipeline.binary,
+                           mask=(pipeline.hsv[:, :, 1] < MIN_SATURATION).astype(np.uint8))
+    height, width = mask.shape
+    
+    if (not pipeline.grid_max_width or width <= pipeline.grid_max_width
+            or width * height < GRID_DOWNSCALE_MIN_PIXELS):
+        row_lines = _open_lines(mask, horizontal=True)
+        col_lines = _open_lines(mask, horizontal=False)
+    else:
+        factor = int(np.ceil(width / pipeline.grid_max_width))
+        coarse_rows = _open_lines(_downscale_for_lines(mask, factor, True), horizontal=True)
+        coarse_cols = _open_lines(_downscale_for_lines(mask, factor, False), horizontal=False)
+        row_lines = _refine_lines(coarse_rows, factor, mask, horizontal=True)
+        col_lines = _refine_lines(coarse_cols, factor, mask, horizontal=False)
+    
+    pipeline.results[key] = (row_lines, col_lines)
+    return row_lines, col_lines
+
+
+def _words_from_data(data: Dict[str, list]) -> List[Dict]:
+    """Convert image_to_data output into a list of recognized words"""
+    words = []
+    for i, text in enumerate(data.get('text', [])):
+        conf = float(data['conf'][i])
+        if conf < 0 or not text.strip():
+            continue
+        words.append({
+            'text': text.strip(),
+            'conf': conf,
+            'left': int(data['left'][i]),
+            'top': int(data['top'][i]),
+            'width': int(data['width'][i]),
+            'height': int(data['height'][i]),
+            # Words on the same text line belong to the same table row
+            'line': (int(data['block_num'][i]), int(data['par_num'][i]), int(data['line_num'][i])),
+        })
+    return words
+
+
+def _bucket_words(words: List[Dict], row_lines: List[int], col_lines: List[int]) -> List[Dict]:
+    """
+    Group words into grid cells by their bounding boxes
+    
+    Row = grid band containing the word's vertical center. Column = band
+    containing the word's left edge, so names that spill over several
+    cells (the diagonal column headers) stay anchored to their own column.
+    Consecutive words of the same text line in the same cell are joined.
+    """
+    cells: Dict[Tuple[int, int], Dict] = {}
+    
+    for word in sorted(words, key=lambda w: (w['top'], w['left'])):
+        center_y = word['top'] + word['height'] // 2
+        row = bisect.bisect_right(row_lines, center_y) - 1
+        col = bisect.bisect_right(col_lines, word['left']) - 1
+        
+        cell = cells.setdefault((row, col), {
+            'row': row,
+            'col': col,
+            'words': [],
+            'left': word['left'],
+            'top': word['top'],
+            'right': word['left'] + word['width'],
+            'bottom': word['top'] + word['height'],
+        })
+        cell['words'].append(word)
+        cell['left'] = min(cell['left'], word['left'])
+        cell['top'] = min(cell['top'], word['top'])
+        cell['right'] = max(cell['right'], word['left'] + word['width'])
+        cell['bottom'] = max(cell['bottom'], word['top'] + word['height'])
+    
+    table_cells = []
+    for (row, col), cell in sorted(cells.items()):
+        ordered = sorted(cell['words'], key=lambda w: (w['line'], w['left']))
+        table_cells.append({
+            'row': row,
+            'col': col,
+            'text': ' '.join(w['text'] for w in ordered),
+            'conf': min(w['conf'] for w in ordered),
+            'word_confs': [w['conf'] for w in ordered],
+            'bbox': (cell['left'], cell['top'], cell['right'], cell['bottom']),
+            'left': cell['left'],
+            'top': cell['top'],
+        })
+    return table_cells
+
+
+def build_structured_table(pipeline: ImagePipeline) -> Dict:
+    """
+    Structured OCR of the whole table in a single tesseract call
+    
+    One image_to_data pass returns every word with its bounding box and
+    confidence; words are bucketed into the detected grid rows/columns.
+    Both header sets are recovered from the same pass:
+        - row headers: name cells in the first column (NAME_COLUMN_RATIO)
+        - column headers: the drug name written on the diagonal of each
+          row, i.e. the leftmost name-like cell right of MATRIX_START_RATIO
+    
+    The result is cached on the pipeline, so every stage reuses it.
+    
+    Args:
+        pipeline: Decoded image
+        
+    Returns:
+        Dictionary with grid lines, cells (text + confidence) and headers
+    """
+    if 'table' in pipeline.results:
+        return pipeline.results['table']
+    
+    height, width = pipeline.shape
+    row_lines, col_lines = detect_grid_lines(pipeline)
+    
+    data = pipeline.ocr_to_data(pipeline.binary, config=TABLE_OCR_CONFIG)
+    cells = _bucket_words(_words_from_data(data), row_lines, col_lines)
+    
+    name_limit = int(width * NAME_COLUMN_RATIO)
+    matrix_start = int(width * MATRIX_START_RATIO)
+    
+    row_headers = []
+    column_headers = []
+    diagonal_rows = set()
+    
+    for cell in cells:
+        name = clean_drug_name(cell['text'])
+        if not name or cell['row'] < 0:
+            continue
+        
+        if cell['left'] < name_limit:
+            row_headers.append({'row': cell['row'], 'name': name, 'conf': cell['conf'],
+                                'bbox': cell['bbox']})
+        elif cell['left'] >= matrix_start and cell['row'] not in diagonal_rows:
+            # Cells are sorted by (row, col): first match is the leftmost
+            diagonal_rows.add(cell['row'])
+            column_headers.append({'col': cell['col'], 'row': cell['row'],
+                                   'name': name, 'conf': cell['conf'], 'bbox': cell['bbox']})
+    
+    table = {
+        'image': pipeline.name,
+        'row_lines': row_lines,
+        'col_lines': col_lines,
+        'cells': cells,
+        'row_headers': row_headers,
+        'column_headers': column_headers,
+    }
+    pipeline.results['table'] = table
+    return table
+
+
+def _reocr_region(pipeline: ImagePipeline, bbox: Tuple[int, int, int, int]) -> Tuple[str, float]:
+    """
+    Expensive OCR of a single region: upscale + adaptive threshold + single-line PSM
+    
+    Returns:
+        (recognized text, minimum word confidence)
+    """
+    height, width = pipeline.shape
+    left, top, right, bottom = bbox
+    x0, y0 = max(0, left - REOCR_PADDING), max(0, top - REOCR_PADDING)
+    x1, y1 = min(width, right + REOCR_PADDING), min(height, bottom + REOCR_PADDING)
+    
+    region = pipeline.crop('gray', x0, y0, x1, y1)
+    region = cv2.resize(region, None, fx=REOCR_SCALE, fy=REOCR_SCALE, interpolation=cv2.INTER_CUBIC)
+    # Local thresholding copes with colored cell backgrounds the global 150 cut misses
+    region = cv2.adaptiveThreshold(region, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY, 31, 10)
+    
+    words = _words_from_data(pipeline.ocr_to_data(region, config=REOCR_CONFIG))
+    if not words:
+        return '', 0.0
+    return ' '.join(w['text'] for w in words), min(w['conf'] for w in words)
+
+
+def refine_low_confidence_names(pipeline: ImagePipeline, min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                                vocabulary: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Adaptive second pass over the structured table headers
+    
+    Only names below min_confidence take the costly path:
+        1. re-OCR of the word box (upscaled, adaptive threshold, --psm 7)
+        2. snapping to the known drug-name vocabulary
+    Headers are updated in place ('refined' records which step fixed them).
+    
+    Args:
+        pipeline: Decoded image (structured table already built or built here)
+        min_confidence: Tesseract confidence (0-100) below which a name is refined
+        vocabulary: Known drug names (see drug_vocabulary.load_drug_vocabulary)
+        
+    Returns:
+        Counters: total names, re-OCR'd, improved by re-OCR, snapped, seconds
+    """
+    start = time.perf_counter()
+    table = build_structured_table(pipeline)
+    headers = table['row_headers'] + table['column_headers']
+    stats = {'names': len(headers), 'reocr': 0, 'improved': 0, 'snapped': 0, 'seconds': 0.0}
+    
+    for header in headers:
+        if header['conf'] >= min_confidence:
+            continue
+        
+        stats['reocr'] += 1
+        text, conf = _reocr_region(pipeline, header['bbox'])
+        name = clean_drug_name(text)
+        if name and conf > header['conf']:
+            header.update({'name': name, 'conf': conf, 'refined': 'reocr'})
+            stats['improved'] += 1
+        
+        if vocabulary and header['conf'] < min_confidence:
+            snapped = snap_to_vocabulary(header['name'], vocabulary)
+            if snapped:
+                header.update({'name': snapped, 'refined': 'vocabulary'})
+                stats['snapped'] += 1
+    
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def _extract_drug_names(pipeline: ImagePipeline) -> List[str]:
+    """Drug names OCR stage (raises on failure, see extract_drug_names_from_image)"""
+    table = build_structured_table(pipeline)
+    return [header['name'] for header in table['row_headers']]
+
+
+def extract_drug_names_from_image(image: Union[str, ImagePipeline]) -> List[str]:
     """
     Extract drug names from the first column of the table image
     
+    Uses the structured single-pass OCR table (see build_structured_table).
+    
     Args:
-        image_path: Path to the table image
+        image: Path to the table image (or an ImagePipeline already decoded)
         
     Returns:
         List of drug names extracted from the image
     """
     if not HAS_OCR:
-        print(f"❌ Cannot process {image_path}: OCR libraries not installed")
+        print(f"❌ Cannot process {image}: OCR libraries not installed")
         return []
     
-    try:
-        # Load image
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"❌ Failed to load image: {image_path}")
+    with _as_pipeline(image) as pipeline:
+        try:
+            drug_names = _extract_drug_names(pipeline)
+            print(f"✅ Extracted {len(drug_names)} drug names from {pipeline.name}")
+            return drug_names
+            
+        except Exception as e:
+            print(f"❌ Error processing {pipeline.image_path}: {e}")
             return []
+
+
+@lru_cache(maxsize=8)
+def _build_palette_lut(palette_items: Tuple[Tuple[str, int, int], ...]) -> 'np.ndarray':
+    hue = np.arange(180, dtype=np.float32)[:, None]
+    sat = np.arange(256, dtype=np.float32)[None, :]
+    
+    best = np.full((180, 256), np.inf, dtype=np.float32)
+    lut = np.zeros((180, 256), dtype=np.uint8)
+    
+    for code, centroid_hue, centroid_sat in palette_items:
+        # Hue is circular (red sits at both 0 and 179)
+        dh = np.abs(hue - centroid_hue)
+        dh = np.minimum(dh, 180 - dh) / 90.0
+        ds = (sat - centroid_sat) / 255.0
+        dist = HUE_WEIGHT * dh ** 2 + ds ** 2
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Apply thresholding to get better OCR results
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-        
-        # Extract the first column (drug names) - approximate coordinates
-        height, width = thresh.shape
-        first_column = thresh[:, :int(width * 0.15)]  # First 15% of width
+        closer = dist < best
+        best = np.where(closer, dist, best)
+        lut[closer] = PALETTE_CODES.index(code)
+    
+    lut[:, :MIN_SATURATION] = 0
+    return lut
+
+
+def build_palette_lut(palette: Optional[Dict[str, List[int]]] = None) -> 'np.ndarray':
+    """
+    Compile palette centroids into a 180x256 hue/saturation lookup table
+    
+    lut[h, s] is the index in PALETTE_CODES of the nearest centroid, so
+    classifying a pixel is a single array index. Compiled tables are
+    cached per palette.
+    
+    Args:
+        palette: {code: [hue, saturation]} (default: DEFAULT_PALETTE)
         
-        # OCR on first column
-        text = pytesseract.image_to_string(first_column, config='--psm 6')
+    Returns:
+        uint8 array of shape (180, 256)
+    """
+    palette = palette or DEFAULT_PALETTE
+    items = tuple(sorted((code, int(h), int(sat)) for code, (h, sat) in palette.items()))
+    return _build_palette_lut(items)
+
+
+def classify_cell(hsv_cell: 'np.ndarray', lut: 'np.ndarray') -> str:
+    """
+    Classify one table cell by its dominant palette color
+    
+    Args:
+        hsv_cell: HSV crop of the cell
+        lut: Lookup table from build_palette_lut()
         
-        # Parse drug names (clean up OCR artifacts)
-        drug_names = []
-        for line in text.split('\n'):
-            line = line.strip()
-            # Remove common OCR errors and filter valid drug names
-            if len(line) > 3 and not line.isdigit():
-                # Clean drug name
-                drug_name = re.sub(r'[^a-zA-Z\s\+\-]', '', line)
-                drug_name = ' '.join(drug_name.split())  # Remove extra spaces
-                if drug_name:
-                    drug_names.append(drug_name.title())
+    Returns:
+        Compatibility code ('' = no data)
+    """
+    pixels = hsv_cell.reshape(-1, 3)
+    pixels = pixels[pixels[:, 2] >= MIN_VALUE]
+    if len(pixels) == 0:
+        return ''
+    
+    codes = lut[pixels[:, 0], pixels[:, 1]]
+    counts = np.bincount(codes, minlength=len(PALETTE_CODES))
+    if counts[1:].sum() < MIN_COLOR_FRACTION * len(pixels):
+        return ''
+    return PALETTE_CODES[1 + int(np.argmax(counts[1:]))]
+
+
+def _circular_mean_hue(hues: 'np.ndarray') -> int:
+    angles = hues.astype(np.float64) * (2 * np.pi / 180)
+    mean = np.arctan2(np.sin(angles).mean(), np.cos(angles).mean())
+    return int(round(mean * 180 / (2 * np.pi))) % 180
+
+
+def load_palette_labels(labels_path: str) -> Tuple[ImagePipeline, List[Dict]]:
+    """
+    Load labelled cells (legend or hand-labelled sample)
+    
+    Returns:
+        (pipeline of the labelled image, list of {'code', 'bbox'})
+    """
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    
+    image_path = Path(labels['image'])
+    if not image_path.is_absolute():
+        image_path = Path(labels_path).parent / image_path
+    
+    cells = [cell for cell in labels['cells'] if cell['code'] in PALETTE_CODES]
+    return ImagePipeline(str(image_path)), cells
+
+
+def calibrate_palette(pipeline: ImagePipeline, cells: List[Dict]) -> Dict[str, List[int]]:
+    """
+    Learn palette centroids from labelled cells
+    
+    Codes without labelled cells keep their DEFAULT_PALETTE centroid.
+    
+    Args:
+        pipeline: Labelled image
+        cells: [{'code': 'C', 'bbox': [x0, y0, x1, y1]}, ...]
         
-        print(f"✅ Extracted {len(drug_names)} drug names from {Path(image_path).name}")
-        return drug_names
+    Returns:
+        {code: [hue, saturation]}
+    """
+    samples: Dict[str, List['np.ndarray']] = {}
+    for cell in cells:
+        if not cell['code']:
+            continue
+        x0, y0, x1, y1 = cell['bbox']
+        pixels = pipeline.crop('hsv', x0, y0, x1, y1).reshape(-1, 3)
+        pixels = pixels[(pixels[:, 1] >= MIN_SATURATION) & (pixels[:, 2] >= MIN_VALUE)]
+        if len(pixels):
+            samples.setdefault(cell['code'], []).append(pixels)
+    
+    palette = {code: list(centroid) for code, centroid in DEFAULT_PALETTE.items()}
+    for code, chunks in samples.items():
+        pixels = np.concatenate(chunks)
+        palette[code] = [_circular_mean_hue(pixels[:, 0]), int(np.median(pixels[:, 1]))]
+    return palette
+
+
+def evaluate_palette(pipeline: ImagePipeline, cells: List[Dict],
+                     palette: Dict[str, List[int]]) -> Dict[str, Dict[str, int]]:
+    """
+    Confusion matrix of the palette classifier against labelled cells
+    
+    Returns:
+        {true_code: {predicted_code: count}}
+    """
+    lut = build_palette_lut(palette)
+    confusion = {code: {pred: 0 for pred in PALETTE_CODES} for code in PALETTE_CODES}
+    for cell in cells:
+        x0, y0, x1, y1 = cell['bbox']
+        predicted = classify_cell(pipeline.crop('hsv', x0, y0, x1, y1), lut)
+        confusion[cell['code']][predicted] += 1
+    return confusion
+
+
+def print_palette_report(palette: Dict[str, List[int]], confusion: Dict[str, Dict[str, int]]):
+    """Print calibrated centroids and confusion matrix"""
+    print("\n🎨 Calibrated palette (hue, saturation):")
+    for code in PALETTE_CODES[1:]:
+        hue, sat = palette[code]
+        print(f"   {code:<3} → H={hue:<4} S={sat}")
+    
+    labels = [code or '∅' for code in PALETTE_CODES]
+    print("\n   Confusion matrix (rows = labelled, columns = predicted):")
+    print("        " + ''.join(f"{label:>6}" for label in labels))
+    correct = total = 0
+    for code, label in zip(PALETTE_CODES, labels):
+        row = confusion[code]
+        print(f"   {label:<4} " + ''.join(f"{row[pred]:>6}" for pred in PALETTE_CODES))
+        correct += row[code]
+        total += sum(row.values())
+    if total:
+        print(f"   Accuracy: {correct}/{total} ({correct * 100 / total:.1f}%)")
+
+
+def _extract_compatibility_matrix(pipeline: ImagePipeline,
+                                  palette: Optional[Dict[str, List[int]]] = None) -> Dict:
+    """Color detection stage (raises on failure, see extract_compatibility_matrix_from_image)"""
+    table = build_structured_table(pipeline)
+    row_lines, col_lines = table['row_lines'], table['col_lines']
+    
+    # HSV view for color detection (shared with other stages)
+    hsv = pipeline.hsv
+    lut = build_palette_lut(palette)
+    
+    compatibility_matrix = {}
+    
+    for row_header in table['row_headers']:
+        r = row_header['row']
+        if r + 1 >= len(row_lines):
+            continue
+        y0, y1 = row_lines[r] + CELL_MARGIN, row_lines[r + 1] - CELL_MARGIN
         
-    except Exception as e:
-        print(f"❌ Error processing {image_path}: {e}")
-        return []
+        for col_header in table['column_headers']:
+            c = col_header['col']
+            if c < 0 or c + 1 >= len(col_lines) or col_header['name'] == row_header['name']:
+                continue
+            x0, x1 = col_lines[c] + CELL_MARGIN, col_lines[c + 1] - CELL_MARGIN
+            if y1 <= y0 or x1 <= x0:
+                continue
+            
+            code = classify_cell(hsv[y0:y1, x0:x1], lut)
+            if code:
+                compatibility_matrix.setdefault(row_header['name'], {})[col_header['name']] = code
+    
+    return compatibility_matrix
 
 
-def extract_compatibility_matrix_from_image(image_path: str, drug_names: List[str]) -> Dict:
+def extract_compatibility_matrix_from_image(image: Union[str, ImagePipeline], drug_names: List[str]) -> Dict:
     """
     Extract compatibility matrix from table image using color detection
     
+    Rows and columns come from the headers OCR'd in the image
+    (build_structured_table); drug_names restricts the result to those
+    rows, in that order (matched by normalized name).
+    
     Args:
-        image_path: Path to the table image
-        drug_names: List of drug names for the matrix
+        image: Path to the table image (or an ImagePipeline already decoded)
+        drug_names: Row drugs to keep (empty = all rows found in the image)
         
     Returns:
         Dictionary with compatibility data
     """
     if not HAS_OCR:
-        print(f"❌ Cannot process {image_path}: OCR libraries not installed")
+        print(f"❌ Cannot process {image}: OCR libraries not installed")
         return {}
     
-    try:
-        # Load image
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"❌ Failed to load image: {image_path}")
+    with _as_pipeline(image) as pipeline:
+        try:
+            compatibility_matrix = _extract_compatibility_matrix(pipeline)
+            if drug_names:
+                rows = {normalize_name(name): name for name in compatibility_matrix}
+                wanted = [rows[key] for key in map(normalize_name, drug_names) if key in rows]
+                compatibility_matrix = {name: compatibility_matrix[name] for name in dict.fromkeys(wanted)}
+            print(f"✅ Processed compatibility matrix from {pipeline.name}")
+            return compatibility_matrix
+            
+        except Exception as e:
+            print(f"❌ Error processing compatibility matrix from {pipeline.image_path}: {e}")
             return {}
+
+
+def stitch_tiles(results: List[Dict]) -> Dict:
+    """
+    Stitch per-image tiles into one global compatibility matrix
+    
+    The table comes as several screenshots covering overlapping parts of
+    the grid. Headers are matched across tiles by normalized name (so
+    "ACIDO FOLICO" and "Acido Folico" are one drug), every drug gets one
+    global index, and cells are keyed by the unordered index pair (the
+    matrix is symmetric). Overlapping cells with the same code are
+    deduplicated; different codes are reported as conflicts and the first
+    value seen is kept. Each tile is compared with everything stitched so
+    far, not only with the previous tile.
+    
+    Args:
+        results: process_image() results, in filename order
         
-        # Convert to HSV for color detection
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        
-        # Define color ranges for compatibility codes
-        color_ranges = {
-            'C': {'lower': np.array([35, 50, 50]), 'upper': np.array([85, 255, 255])},    # Green
-            'Y': {'lower': np.array([15, 50, 50]), 'upper': np.array([35, 255, 255])},    # Yellow
-            'I': {'lower': np.array([0, 50, 50]), 'upper': np.array([10, 255, 255])},     # Red
-            '!': {'lower': np.array([10, 50, 50]), 'upper': np.array([25, 255, 255])},    # Orange
-        }
+    Returns:
+        Dictionary with:
+            names: global drug names (index = position)
+            cells: {(i, j): code} with i <= j
+            overlaps: per tile, headers already seen in earlier tiles
+            duplicates: number of overlapping cells with the same code
+            conflicts: list of {drug1, drug2, values: [{image, code}, ...]}
+                (every differing reading, including two within one tile)
+    """
+    index: Dict[str, int] = {}
+    names: List[str] = []
+    cells: Dict[Tuple[int, int], str] = {}
+    sources: Dict[Tuple[int, int], str] = {}
+    conflicts: Dict[Tuple[int, int], List[Dict[str, str]]] = {}
+    duplicates = 0
+    overlaps = []
+    
+    def drug_index(name: str) -> int:
+        key = normalize_name(name)
+        if key not in index:
+            index[key] = len(names)
+            names.append(name)
+        return index[key]
+    
+    for result in results:
+        if result['error']:
+            continue
         
-        compatibility_matrix = {}
+        table = result['table'] or {'column_headers': []}
+        tile_names = result['drug_names'] + [h['name'] for h in table['column_headers']]
+        tile_keys = {normalize_name(name) for name in tile_names}
         
-        # TODO: Implement grid detection and color analysis
-        # This is a placeholder - full implementation would require:
-        # 1. Detect table grid lines
-        # 2. Extract each cell
-        # 3. Analyze cell color
-        # 4. Map to compatibility code
+        if index:
+            overlaps.append({'image': result['image'], 'shared_headers': len(tile_keys & index.keys())})
         
-        print(f"✅ Processed compatibility matrix from {Path(image_path).name}")
-        return compatibility_matrix
+        for name in tile_names:
+            drug_index(name)
         
-    except Exception as e:
-        print(f"❌ Error processing compatibility matrix from {image_path}: {e}")
-        return {}
+        for drug1, row in result['compatibility'].items():
+            for drug2, code in row.items():
+                i, j = sorted((drug_index(drug1), drug_index(drug2)))
+                pair = (i, j)
+                
+                if pair not in cells:
+                    cells[pair] = code
+                    sources[pair] = result['image']
+                elif cells[pair] == code:
+                    duplicates += 1
+                else:
+                    values = conflicts.setdefault(pair, [{'image': sources[pair], 'code': cells[pair]}])
+                    values.append({'image': result['image'], 'code': code})
+    
+    return {
+        'names': names,
+        'cells': cells,
+        'overlaps': overlaps,
+        'duplicates': duplicates,
+        'conflicts': [
+            {'drug1': names[i], 'drug2': names[j], 'values': values}
+            for (i, j), values in sorted(conflicts.items())
+        ],
+    }
+
+
+def stitched_matrix_to_dict(stitched: Dict) -> Dict[str, Dict[str, str]]:
+    """Convert stitched cells into the nested compatibilityMatrix format (symmetric)"""
+    names = stitched['names']
+    matrix: Dict[str, Dict[str, str]] = {}
+    for (i, j), code in stitched['cells'].items():
+        matrix.setdefault(names[i], {})[names[j]] = code
+        matrix.setdefault(names[j], {})[names[i]] = code
+    return matrix
+
+
+def print_stitching_report(stitched: Dict):
+    """Print tile overlaps, duplicates and conflicts"""
+    print(f"\n🧩 Stitching: {len(stitched['names'])} unique drugs, {len(stitched['cells'])} cells")
+    for overlap in stitched['overlaps']:
+        print(f"   {overlap['image']}: {overlap['shared_headers']} headers shared with earlier tiles")
+    print(f"   Duplicate overlapping cells: {stitched['duplicates']}")
+    
+    if stitched['conflicts']:
+        print(f"⚠️  {len(stitched['conflicts'])} conflicting cells:")
+        for conflict in stitched['conflicts']:
+            values = ', '.join(f"{value['image']}={value['code']}" for value in conflict['values'])
+            print(f"   - {conflict['drug1']} + {conflict['drug2']}: {values}")
 
 
 def manual_input_mode():
@@ -266,6 +1033,166 @@ def manual_input_mode():
     print(f"   - Compatibility entries: {sum(len(v) for v in compatibility_matrix.values())}")
 
 
+def process_image(image_path: str, ocr_cache: Optional[OcrCache] = None,
+                  adaptive: Optional[Dict] = None,
+                  palette: Optional[Dict[str, List[int]]] = None,
+                  grid_max_width: int = GRID_MAX_WIDTH) -> Dict:
+    """
+    Run every extraction stage on a single image
+    
+    Designed to run inside a worker process: it never raises, failures are
+    returned in the result so one bad image does not abort the batch.
+    
+    Args:
+        image_path: Path to the table image
+        ocr_cache: Optional persistent OCR cache
+        adaptive: Adaptive mode settings ({'min_confidence', 'vocabulary'}), None = off
+        palette: Calibrated palette centroids (default: DEFAULT_PALETTE)
+        grid_max_width: Width of the pyramid level used for grid detection (0 = full)
+        
+    Returns:
+        Dictionary with image name, drug names, compatibility data,
+        elapsed seconds, OCR cache counters and error message (None on success)
+    """
+    start = time.perf_counter()
+    stats_before = ocr_cache.stats() if ocr_cache else None
+    result = {
+        'image': Path(image_path).name,
+        'drug_names': [],
+        'compatibility': {},
+        'table': None,
+        'refinement': None,
+        'seconds': 0.0,
+        'ocr_cache': {},
+        'error': None,
+    }
+    
+    try:
+        if not HAS_OCR:
+            raise RuntimeError("OCR libraries not installed")
+        
+        # Decode once, share buffers across stages, free them right after
+        with ImagePipeline(image_path, ocr_cache=ocr_cache, grid_max_width=grid_max_width) as pipeline:
+            if adaptive is not None:
+                result['refinement'] = refine_low_confidence_names(pipeline, **adaptive)
+            drug_names = _extract_drug_names(pipeline)
+            result['drug_names'] = drug_names
+            result['compatibility'] = _extract_compatibility_matrix(pipeline, palette)
+            result['table'] = build_structured_table(pipeline)
+    except Exception as e:
+        result['error'] = str(e)
+    
+    if ocr_cache:
+        stats_after = ocr_cache.stats()
+        result['ocr_cache'] = {k: stats_after[k] - stats_before[k] for k in stats_after}
+    
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_extraction(image_files: List[Path], jobs: int = 1,
+                   ocr_cache: Optional[OcrCache] = None,
+                   adaptive: Optional[Dict] = None,
+                   palette: Optional[Dict[str, List[int]]] = None,
+                   grid_max_width: int = GRID_MAX_WIDTH) -> List[Dict]:
+    """
+    Process all images, serially or across a process pool
+    
+    Args:
+        image_files: Images to process (results keep this order)
+        jobs: Number of worker processes (1 = serial, 0 = all CPUs)
+        ocr_cache: Optional persistent OCR cache (shared directory across workers)
+        adaptive: Adaptive re-OCR settings (see process_image)
+        palette: Palette centroids (see process_image)
+        grid_max_width: Grid detection resolution (see process_image)
+        
+    Returns:
+        List of process_image() results, in the same order as image_files
+    """
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(image_files))
+    
+    if jobs <= 1:
+        results = []
+        for img_path in image_files:
+            print(f"\n🔍 Processing: {img_path.name}")
+            results.append(process_image(str(img_path), ocr_cache, adaptive, palette, grid_max_width))
+        return results
+    
+    print(f"⚙️  Using {jobs} worker processes")
+    results_by_path = {}
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(process_image, str(p), ocr_cache, adaptive, palette, grid_max_width): p for p in image_files}
+        
+        for future in as_completed(futures):
+            img_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Worker crashed (e.g. killed by the OS): report and continue
+                result = {
+                    'image': img_path.name,
+                    'drug_names': [],
+                    'compatibility': {},
+                    'table': None,
+                    'refinement': None,
+                    'seconds': 0.0,
+                    'ocr_cache': {},
+                    'error': f"Worker failure: {e}",
+                }
+            
+            status = '❌' if result['error'] else '✅'
+            print(f"{status} {result['image']} ({result['seconds']:.2f}s)")
+            results_by_path[img_path] = result
+    
+    return [results_by_path[p] for p in image_files]
+
+
+def print_timing_report(results: List[Dict], wall_seconds: float):
+    """Print per-image timing and failures"""
+    print(f"\n⏱️  Per-image timing:")
+    for result in results:
+        if result['error']:
+            print(f"   ❌ {result['image']:<25} {result['seconds']:>7.2f}s  {result['error']}")
+        else:
+            table = result['table'] or {'cells': [], 'column_headers': []}
+            confs = [c['conf'] for c in table['cells']]
+            mean_conf = sum(confs) / len(confs) if confs else 0.0
+            print(f"   ✅ {result['image']:<25} {result['seconds']:>7.2f}s  "
+                  f"{len(result['drug_names'])} drugs, "
+                  f"{len(table['column_headers'])} column headers, "
+                  f"{len(table['cells'])} cells (mean conf {mean_conf:.0f})")
+    
+    failed = [r for r in results if r['error']]
+    total = sum(r['seconds'] for r in results)
+    print(f"   Sum of image times: {total:.2f}s | Wall time: {wall_seconds:.2f}s")
+    if failed:
+        print(f"⚠️  {len(failed)}/{len(results)} images failed")
+
+
+def print_refinement_report(results: List[Dict], wall_seconds: float):
+    """Print how many names needed the costly adaptive path"""
+    refined = [r['refinement'] for r in results if r['refinement']]
+    names = sum(r['names'] for r in refined)
+    reocr = sum(r['reocr'] for r in refined)
+    improved = sum(r['improved'] for r in refined)
+    snapped = sum(r['snapped'] for r in refined)
+    seconds = sum(r['seconds'] for r in refined)
+    
+    share = reocr * 100 / names if names else 0.0
+    print(f"\n🔁 Adaptive OCR: {reocr}/{names} names below threshold ({share:.1f}%)")
+    print(f"   Improved by re-OCR: {improved} | Snapped to vocabulary: {snapped}")
+    print(f"   Costly path time: {seconds:.2f}s (wall time {wall_seconds:.2f}s)")
+
+
+def print_ocr_cache_report(results: List[Dict], ocr_cache: OcrCache):
+    """Print OCR cache hit rate summed over all images (and workers)"""
+    stats = merge_stats(*(r['ocr_cache'] for r in results))
+    print(f"🗄️  {ocr_cache.report(stats)}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Extract drug compatibility data from San Gerardo Hospital table images'
@@ -283,6 +1210,58 @@ def main():
         default='drugs_extracted.json',
         help='Output JSON file path (default: drugs_extracted.json)'
     )
+    parser.add_argument(
+        '--jobs',
+        '-j',
+        type=int,
+        default=1,
+        help='Number of worker processes for image extraction (default: 1, 0 = all CPUs)'
+    )
+    parser.add_argument(
+        '--ocr-cache',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help=f'OCR result cache directory (default: {DEFAULT_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--ocr-cache-size',
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help='Maximum OCR cache size in MB, LRU eviction (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--no-ocr-cache',
+        action='store_true',
+        help='Disable the OCR result cache'
+    )
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='Re-OCR only low-confidence names with costlier settings and snap them to known drugs'
+    )
+    parser.add_argument(
+        '--min-confidence',
+        type=float,
+        default=DEFAULT_MIN_CONFIDENCE,
+        help=f'Adaptive mode confidence threshold, 0-100 (default: {DEFAULT_MIN_CONFIDENCE})'
+    )
+    parser.add_argument(
+        '--vocabulary',
+        type=str,
+        help='Drug database JSON used as name dictionary (default: public/data/drugs-database.min.json)'
+    )
+    parser.add_argument(
+        '--grid-max-width',
+        type=int,
+        default=GRID_MAX_WIDTH,
+        help=f'Detect the grid on a downscaled copy at most this wide, used for images of at least '
+             f'{GRID_DOWNSCALE_MIN_PIXELS // 1_000_000} Mpx; 0 = full resolution (default: {GRID_MAX_WIDTH})'
+    )
+    parser.add_argument(
+        '--palette-labels',
+        type=str,
+        help='JSON file with labelled cells (legend or sample image) to calibrate cell colors'
+    )
     parser.add_argument(
         '--manual',
         '-m',
@@ -318,30 +1297,43 @@ def main():
     
     print(f"📸 Found {len(image_files)} images")
     
-    # Extract data from each image
+    # Extract data from each image (merged in filename order)
+    ocr_cache = None
+    if not args.no_ocr_cache:
+        ocr_cache = OcrCache(args.ocr_cache, max_bytes=args.ocr_cache_size * 1024 * 1024)
+    
+    adaptive = None
+    if args.adaptive:
+        vocabulary = load_drug_vocabulary(args.vocabulary)
+        print(f"📚 Vocabulary: {len(vocabulary)} known drug names/aliases")
+        adaptive = {'min_confidence': args.min_confidence, 'vocabulary': vocabulary}
+    
+    palette = None
+    if args.palette_labels:
+        labelled, cells = load_palette_labels(args.palette_labels)
+        with labelled:
+            palette = calibrate_palette(labelled, cells)
+            print_palette_report(palette, evaluate_palette(labelled, cells, palette))
+    
+    batch_start = time.perf_counter()
+    results = run_extraction(sorted(image_files), args.jobs, ocr_cache, adaptive, palette,
+                             args.grid_max_width)
+    wall_seconds = time.perf_counter() - batch_start
+    
+    # Merge overlapping tiles into one global matrix
+    stitched = stitch_tiles(results)
+    
     all_drugs = []
-    all_compatibility = {}
+    for drug_name in stitched['names']:
+        drug_id = drug_name.lower().replace(' ', '-')
+        all_drugs.append({
+            'id': drug_id,
+            'name': drug_name,
+            'category': detect_category(drug_name),
+            'route': 'intravenous',
+        })
     
-    for img_path in sorted(image_files):
-        print(f"\n🔍 Processing: {img_path.name}")
-        
-        # Extract drug names
-        drug_names = extract_drug_names_from_image(str(img_path))
-        
-        # Extract compatibility matrix
-        compat_data = extract_compatibility_matrix_from_image(str(img_path), drug_names)
-        
-        # Add to global lists
-        for drug_name in drug_names:
-            drug_id = drug_name.lower().replace(' ', '-')
-            all_drugs.append({
-                'id': drug_id,
-                'name': drug_name,
-                'category': detect_category(drug_name),
-                'route': 'intravenous',
-            })
-        
-        all_compatibility.update(compat_data)
+    all_compatibility = stitched_matrix_to_dict(stitched)
     
     # Save to JSON
     output_data = {
@@ -350,6 +1342,7 @@ def main():
         'description': 'Drug compatibility database - San Gerardo Hospital (OCR Extraction)',
         'drugs': all_drugs,
         'compatibilityMatrix': all_compatibility,
+        'conflicts': stitched['conflicts'],
     }
     
     with open(args.output, 'w', encoding='utf-8') as f:
@@ -358,6 +1351,12 @@ def main():
     print(f"\n✅ Extraction complete!")
     print(f"📄 Output file: {args.output}")
     print(f"📊 Total drugs: {len(all_drugs)}")
+    print_stitching_report(stitched)
+    print_timing_report(results, wall_seconds)
+    if adaptive is not None:
+        print_refinement_report(results, wall_seconds)
+    if ocr_cache:
+        print_ocr_cache_report(results, ocr_cache)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Persistent OCR result cache
+Shared by extract_drug_data.py and extract_compatibility_from_pdf.py
+
+Tesseract results are stored on disk, keyed by a hash of:
+    - the image pixels (NumPy array or PIL image, including crops)
+    - the OCR call (image_to_string / image_to_data)
+    - the tesseract language and config (e.g. lang='ita+eng', '--psm 6')
+    - the tesseract engine version
+
+Re-running an extraction after changing only the post-processing logic
+then skips OCR entirely. The cache is size-bounded: least recently used
+entries are evicted once the total size exceeds max_bytes.
+
+Usage:
+    cache = OcrCache('.ocr_cache', max_bytes=256 * 1024 * 1024)
+    text = cache.image_to_string(image, lang='ita+eng')
+    words = cache.image_to_data(image, config='--psm 11')
+    print(cache.report())
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+DEFAULT_CACHE_DIR = '.ocr_cache'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+# Tesseract version is resolved once per process (it spawns a subprocess)
+_engine_version: Optional[str] = None
+
+# Approximate size on disk per cache directory, scanned once per process.
+# Kept at module level because worker processes receive a freshly pickled
+# OcrCache with every task.
+_dir_sizes: Dict[str, int] = {}
+
+
+def get_engine_version() -> str:
+    """Return the tesseract engine version (cached per process)"""
+    global _engine_version
+    if _engine_version is None:
+        try:
+            _engine_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            _engine_version = 'unknown'
+    return _engine_version
+
+
+def hash_image(image: Any) -> str:
+    """
+    Hash image pixels (NumPy array or PIL image)
+
+    Shape and dtype/mode are part of the hash, so two crops with the same
+    bytes but different geometry never collide.
+    """
+    digest = hashlib.sha256()
+
+    if hasattr(image, 'tobytes') and hasattr(image, 'shape'):
+        # NumPy array (crops may be non-contiguous views)
+        digest.update(f"ndarray:{image.shape}:{image.dtype}".encode())
+        if not image.flags['C_CONTIGUOUS']:
+            image = image.copy()
+        digest.update(image.tobytes())
+    elif hasattr(image, 'tobytes') and hasattr(image, 'mode'):
+        # PIL image
+        digest.update(f"pil:{image.size}:{image.mode}".encode())
+        digest.update(image.tobytes())
+    else:
+        raise TypeError(f"Unsupported image type for OCR cache: {type(image)}")
+
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """
+    On-disk, size-bounded cache of tesseract results
+
+    One JSON file per entry under cache_dir/<2-char prefix>/<key>.json.
+    Writes are atomic (temp file + rename), so several worker processes
+    can share the same directory.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # Keys and storage
+    # ------------------------------------------------------------------
+
+    def make_key(self, kind: str, image: Any, lang: Optional[str], config: str) -> str:
+        """Build the cache key for one OCR call"""
+        params = json.dumps({
+            'kind': kind,
+            'lang': lang or 'default',
+            'config': config,
+            'engine': get_engine_version(),
+            'image': hash_image(image),
+        }, sort_keys=True)
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return cached value or None (counts hit/miss)"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        # Touch for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store a JSON-serializable value, evicting old entries if needed"""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        data = json.dumps({'value': value}, ensure_ascii=False).encode('utf-8')
+        try:
+            old_size = path.stat().st_size
+        except OSError:
+            old_size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        size_key = str(self.cache_dir.resolve())
+        if size_key not in _dir_sizes:
+            # Scan includes the entry just written
+            _dir_sizes[size_key] = self._scan_size()
+        else:
+            _dir_sizes[size_key] += len(data) - old_size
+
+        if _dir_sizes[size_key] > self.max_bytes:
+            self.evict()
+
+    def _scan_size(self) -> int:
+        total = 0
+        for p in self.cache_dir.glob('*/*.json'):
+            try:
+                total += p.stat().st_size
+            except OSError:
+                continue
+        return total
+
+    def evict(self):
+        """Remove least recently used entries until under 90% of max_bytes"""
+        entries = []
+        for p in self.cache_dir.glob('*/*.json'):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+
+        for _, size, p in sorted(entries):
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+        _dir_sizes[str(self.cache_dir.resolve())] = total
+
+    # ------------------------------------------------------------------
+    # Cached OCR calls
+    # ------------------------------------------------------------------
+
+    def cached(self, kind: str, image: Any, lang: Optional[str], config: str,
+               compute: Callable[[], Any]) -> Any:
+        """Return cached result for (kind, image, lang, config) or compute and store it"""
+        key = self.make_key(kind, image, lang, config)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def image_to_string(self, image: Any, lang: Optional[str] = None, config: str = '') -> str:
+        """Cached pytesseract.image_to_string"""
+        return self.cached(
+            'image_to_string', image, lang, config,
+            lambda: pytesseract.image_to_string(image, lang=lang, config=config)
+        )
+
+    def image_to_data(self, image: Any, lang: Optional[str] = None, config: str = '') -> Dict[str, list]:
+        """Cached pytesseract.image_to_data (dict output: text, conf, left, top, ...)"""
+        return self.cached(
+            'image_to_data', image, lang, config,
+            lambda: _image_to_data(image, lang, config)
+        )
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, int]:
+        """Counters (picklable, can be summed across worker processes)"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def report(self, stats: Optional[Dict[str, int]] = None) -> str:
+        """One-line hit rate summary"""
+        stats = stats or self.stats()
+        lookups = stats['hits'] + stats['misses']
+        rate = stats['hits'] * 100 / lookups if lookups else 0.0
+        return (f"OCR cache: {stats['hits']}/{lookups} hits ({rate:.1f}%), "
+                f"{stats['evictions']} evicted [{self.cache_dir}]")
+
+
+def ocr_image_to_string(image: Any, lang: Optional[str] = None, config: str = '',
+                        cache: Optional[OcrCache] = None) -> str:
+    """pytesseract.image_to_string, going through the cache when one is given"""
+    if cache is None:
+        return pytesseract.image_to_string(image, lang=lang, config=config)
+    return cache.image_to_string(image, lang=lang, config=config)
+
+
+def _image_to_data(image: Any, lang: Optional[str], config: str) -> Dict[str, list]:
+    data = pytesseract.image_to_data(image, lang=lang, config=config,
+                                     output_type=pytesseract.Output.DICT)
+    # Plain lists of str/int/float so the result is JSON-serializable
+    return {k: [v if isinstance(v, str) else float(v) if k == 'conf' else int(v) for v in values]
+            for k, values in data.items()}
+
+
+def ocr_image_to_data(image: Any, lang: Optional[str] = None, config: str = '',
+                      cache: Optional[OcrCache] = None) -> Dict[str, list]:
+    """pytesseract.image_to_data (dict output), going through the cache when one is given"""
+    if cache is None:
+        return _image_to_data(image, lang, config)
+    return cache.image_to_data(image, lang=lang, config=config)
+
+
+def merge_stats(*stats: Dict[str, int]) -> Dict[str, int]:
+    """Sum cache counters coming from several processes"""
+    merged = {'hits': 0, 'misses': 0, 'evictions': 0}
+    for s in stats:
+        for k in merged:
+            merged[k] += s.get(k, 0)
+    return merged
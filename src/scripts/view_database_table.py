@@ -4,85 +4,421 @@ Visualizzatore Database Farmaci - Mostra il database in formato tabella
 Legge src/data/drugs.ts e mostra i dati in formato tabellare leggibile
 """
 
+import hashlib
 import json
+import os
 import re
-from typing import List, Dict, Any
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
 
-def extract_drugs_from_ts(file_path: str) -> List[Dict[str, Any]]:
-    """Estrae i dati dei farmaci dal file TypeScript"""
+# Cache su disco del parsing di drugs.ts (validata con mtime/dimensione e SHA-256)
+DEFAULT_CACHE_FILE = '.drugs_ts_cache.json'
+
+# Token: commenti e spazi (ignorati), stringhe, numeri, identificatori,
+# punteggiatura; qualsiasi altro carattere è 'other' e fa fallire solo il
+# valore che lo contiene. I template literal (`...`) sono letti a parte.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<punct>\.\.\.|=>|[{}\[\](),:;=.<>|?&!+\-*/%])
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Parole che iniziano una nuova istruzione (ripresa dopo un valore non leggibile)
+STATEMENT_KEYWORDS = {'const', 'let', 'var', 'export', 'import', 'interface', 'type', 'function', 'enum'}
+
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+
+LITERALS = {'true': True, 'false': False, 'null': None, 'undefined': None}
+
+
+class TsParseError(ValueError):
+    """Sintassi non supportata in un letterale TypeScript"""
+
+
+def _unescape(literal: str) -> str:
+    """Contenuto di una stringa TS/JS senza virgolette ('Potassium\\'s' -> "Potassium's")"""
+    body = literal[1:-1]
+    return re.sub(r'\\(u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)',
+                  lambda m: _escape_char(m.group(1)), body, flags=re.DOTALL)
+
+
+def _escape_char(escape: str) -> str:
+    if escape[0] in 'ux' and len(escape) > 1:
+        return chr(int(escape[1:].strip('{}'), 16))
+    return ESCAPES.get(escape, escape if escape != '\n' else '')
+
+
+def _template_end(source: str, start: int) -> Optional[int]:
+    """
+    Fine (indice dopo il ` di chiusura) del template literal che inizia in start
     
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    Dentro ${...} segue graffe, stringhe e template annidati; None se non è chiuso.
+    """
+    position = start + 1
+    while position < len(source):
+        char = source[position]
+        if char == '\\':
+            position += 2
+        elif char == '`':
+            return position + 1
+        elif source.startswith('${', position):
+            position = _expression_end(source, position + 2)
+            if position is None:
+                return None
+        else:
+            position += 1
+    return None
+
+
+def _expression_end(source: str, position: int) -> Optional[int]:
+    """Indice dopo la } che chiude un'espressione ${...}; None se non è chiusa"""
+    depth = 0
+    while position < len(source):
+        char = source[position]
+        if char == '`':
+            position = _template_end(source, position)
+            if position is None:
+                return None
+            continue
+        if char in '\'"':
+            match = TOKEN_PATTERN.match(source, position)
+            position = match.end() if match.lastgroup == 'string' else position + 1
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            if depth == 0:
+                return position + 1
+            depth -= 1
+        position += 1
+    return None
+
+
+def tokenize(source: str) -> List[Tuple[str, Any, int]]:
+    """
+    Divide il sorgente TypeScript in token
+    
+    I template literal senza ${...} sono stringhe; quelli con interpolazioni
+    diventano token 'template' con il testo sorgente (valore opaco).
     
-    # Trova l'array drugs
-    drugs_match = re.search(r'drugs:\s*\[(.*?)\],\s*compatibilityMatrix', content, re.DOTALL)
-    if not drugs_match:
-        return []
+    Returns:
+        Lista di (tipo, valore, riga); tipo = 'string' | 'template' | 'number'
+        | 'name' | 'punct' | 'other'
+    """
+    tokens = []
+    position = 0
+    line = 1
+    while position < len(source):
+        end = _template_end(source, position) if source[position] == '`' else None
+        if end is not None:
+            text = source[position:end]
+            if '${' in text:
+                tokens.append(('template', text, line))
+            else:
+                tokens.append(('string', _unescape(text), line))
+            line += text.count('\n')
+            position = end
+            continue
+        match = TOKEN_PATTERN.match(source, position)
+        kind, text = match.lastgroup, match.group()
+        if kind == 'string':
+            tokens.append(('string', _unescape(text), line))
+        elif kind == 'number':
+            tokens.append(('number', float(text) if any(c in text for c in '.eE') else int(text), line))
+        elif kind != 'skip':
+            tokens.append((kind, text, line))
+        line += text.count('\n')
+        position = match.end()
+    return tokens
+
+
+class _LiteralParser:
+    """
+    Parser ricorsivo per letterali TypeScript (oggetti, array, stringhe,
+    numeri, booleani, riferimenti a enum)
     
-    drugs_text = drugs_match.group(1)
+    I riferimenti come DrugCategory.ANTIBIOTIC restano stringhe con il
+    punto ('DrugCategory.ANTIBIOTIC') e i template con ${...} restano
+    testo sorgente: il risultato è JSON puro e si può mettere in cache.
+    """
     
-    # Estrai ogni oggetto farmaco
-    drug_objects = re.findall(r'\{([^}]+)\}', drugs_text)
+    def __init__(self, tokens: List[Tuple[str, Any, int]]):
+        self.tokens = tokens
+        self.position = 0
+        # Costanti non leggibili: {nome: errore}
+        self.errors: Dict[str, str] = {}
     
-    drugs = []
-    for obj in drug_objects:
-        drug = {}
-        
-        # ID
-        id_match = re.search(r"id:\s*'([^']+)'", obj)
-        if id_match:
-            drug['id'] = id_match.group(1)
-        
-        # Name
-        name_match = re.search(r"name:\s*'([^']+)'", obj)
-        if name_match:
-            drug['name'] = name_match.group(1)
-        
-        # Active Ingredient
-        ingredient_match = re.search(r"activeIngredient:\s*'([^']+)'", obj)
-        if ingredient_match:
-            drug['activeIngredient'] = ingredient_match.group(1)
-        
-        # Category
-        category_match = re.search(r"category:\s*DrugCategory\.(\w+)", obj)
-        if category_match:
-            drug['category'] = category_match.group(1)
-        
-        # Concentration
-        conc_match = re.search(r"concentration:\s*'([^']+)'", obj)
-        if conc_match:
-            drug['concentration'] = conc_match.group(1)
-        
-        # Route
-        route_match = re.search(r"route:\s*AdministrationRoute\.(\w+)", obj)
-        if route_match:
-            drug['route'] = route_match.group(1)
-        
-        # Clinical Notes
-        notes_match = re.search(r"clinicalNotes:\s*'([^']+)'", obj)
-        if notes_match:
-            drug['clinicalNotes'] = notes_match.group(1)
-        
-        # Requires CVC (opzionale)
-        cvc_match = re.search(r"requiresCVC:\s*(true|false)", obj)
-        if cvc_match:
-            drug['requiresCVC'] = cvc_match.group(1) == 'true'
-        else:
-            drug['requiresCVC'] = False
-        
-        # Light Sensitive (opzionale)
-        light_match = re.search(r"lightSensitive:\s*(true|false)", obj)
-        if light_match:
-            drug['lightSensitive'] = light_match.group(1) == 'true'
-        else:
-            drug['lightSensitive'] = False
+    def peek(self, offset: int = 0) -> Tuple[str, Any, int]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else ('eof', None, -1)
+    
+    def next(self) -> Tuple[str, Any, int]:
+        token = self.peek()
+        self.position += 1
+        return token
+    
+    def expect(self, value: str):
+        kind, text, line = self.next()
+        if text != value or kind not in ('punct', 'name'):
+            raise TsParseError(f"Atteso '{value}' alla riga {line}, trovato {text!r}")
+    
+    def at(self, value: str) -> bool:
+        kind, text, _ = self.peek()
+        return kind == 'punct' and text == value
+    
+    def value(self) -> Any:
+        kind, text, line = self.peek()
+        if kind == 'punct' and text == '{':
+            return self.object()
+        if kind == 'punct' and text == '[':
+            return self.array()
+        if kind in ('string', 'number', 'template'):
+            self.next()
+            return text
+        if kind == 'name':
+            self.next()
+            if text in LITERALS and not self.at('.'):
+                return LITERALS[text]
+            # Riferimento (Enum.MEMBER, costante.proprietà)
+            parts = [text]
+            while self.at('.'):
+                self.next()
+                parts.append(self.next()[1])
+            self._skip_type_assertion()
+            return '.'.join(parts)
+        raise TsParseError(f"Valore inatteso {text!r} alla riga {line}")
+    
+    def _skip_type_assertion(self):
+        """Ignora `as Tipo` / `as const` dopo un valore"""
+        while self.peek()[:2] == ('name', 'as'):
+            self.next()
+            self.next()
+    
+    def object(self) -> Dict[str, Any]:
+        self.expect('{')
+        result: Dict[str, Any] = {}
+        while not self.at('}'):
+            if self.at('...'):
+                raise TsParseError(f"Spread non supportato alla riga {self.peek()[2]}")
+            kind, key, line = self.next()
+            if kind not in ('name', 'string', 'number'):
+                raise TsParseError(f"Chiave inattesa {key!r} alla riga {line}")
+            if self.at(',') or self.at('}'):
+                # Shorthand { name } = riferimento alla costante name
+                result[str(key)] = str(key)
+            else:
+                self.expect(':')
+                result[str(key)] = self.value()
+            if not self.at('}'):
+                self.expect(',')
+        self.expect('}')
+        self._skip_type_assertion()
+        return result
+    
+    def array(self) -> List[Any]:
+        self.expect('[')
+        result = []
+        while not self.at(']'):
+            result.append(self.value())
+            if not self.at(']'):
+                self.expect(',')
+        self.expect(']')
+        self._skip_type_assertion()
+        return result
+    
+    def constants(self) -> Dict[str, Any]:
+        """
+        Valori di tutte le dichiarazioni `const|let|var nome[: Tipo] = letterale`
         
-        if drug:
-            drugs.append(drug)
+        Il resto del file (import, interface, type) viene saltato. Una
+        costante con sintassi non supportata finisce in self.errors e non
+        blocca le altre.
+        """
+        result: Dict[str, Any] = {}
+        while self.peek()[0] != 'eof':
+            kind, text, _ = self.next()
+            if kind != 'name' or text not in ('const', 'let', 'var') or self.peek()[0] != 'name':
+                continue
+            name = self.next()[1]
+            # Annotazione di tipo: tutto fino a '=' (anche Record<string, ...>)
+            while not self.at('=') and not self.at(';') and self.peek()[0] != 'eof':
+                self.next()
+            if self.at('='):
+                self.next()
+                if self.at('{') or self.at('[') or self.peek()[0] in ('string', 'number', 'template'):
+                    start = self.position
+                    try:
+                        result[name] = self.value()
+                    except TsParseError as e:
+                        self.errors[name] = str(e)
+                        self._skip_statement(start)
+        return result
+    
+    def _skip_statement(self, start: int):
+        """Riparte da start e salta il valore (parentesi bilanciate) fino a ';' o alla prossima istruzione"""
+        self.position = start
+        depth = 0
+        while self.peek()[0] != 'eof':
+            kind, text, _ = self.peek()
+            if depth == 0 and self.position > start and kind == 'name' and text in STATEMENT_KEYWORDS:
+                return
+            self.next()
+            if kind != 'punct':
+                continue
+            if text in '{[(':
+                depth += 1
+            elif text in '}])':
+                depth = max(depth - 1, 0)
+            elif text == ';' and depth == 0:
+                return
+
+
+def parse_ts_literals(source: str, errors: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Parsing delle costanti letterali di un file TypeScript
+    
+    Args:
+        source: Sorgente TypeScript
+        errors: Se indicato, riceve {nome: errore} delle costanti non leggibili
+    
+    Returns:
+        {nome costante: valore Python (dict/list/str/int/float/bool/None)};
+        le costanti non leggibili sono omesse
+    """
+    parser = _LiteralParser(tokenize(source))
+    constants = parser.constants()
+    if errors is not None:
+        errors.update(parser.errors)
+    return constants
+
+
+# Cache in memoria: stesso parsing riusato da tutte le viste nello stesso processo
+_memory_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def _load_disk_cache(cache_file: Optional[str]) -> Dict[str, Any]:
+    if not cache_file:
+        return {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_disk_cache(cache_file: Optional[str], cache: Dict[str, Any]):
+    if not cache_file:
+        return
+    directory = os.path.dirname(os.path.abspath(cache_file))
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        pass
+
+
+def load_ts_constants(file_path: str, cache_file: Optional[str] = DEFAULT_CACHE_FILE,
+                      errors: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Costanti letterali di un file .ts, con cache
+    
+    La cache (in memoria e su disco in cache_file) è valida se mtime e
+    dimensione del file non sono cambiati; altrimenti il file viene letto e,
+    se lo SHA-256 coincide (es. file solo "toccato"), il parsing precedente
+    è riusato senza rifarlo.
+    
+    Args:
+        file_path: File TypeScript (es. src/data/drugs.ts)
+        cache_file: Cache su disco (None = solo in memoria)
+        errors: Se indicato, riceve {nome: errore} delle costanti non leggibili
+    """
+    key = os.path.abspath(file_path)
+    stat = os.stat(key)
+    
+    entry = _memory_cache.get(key)
+    disk_cache = None
+    if entry is None:
+        disk_cache = _load_disk_cache(cache_file)
+        entry = disk_cache.get(key)
+    
+    if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        _memory_cache[key] = entry
+        if errors is not None:
+            errors.update(entry.get('errors', {}))
+        return entry['value']
     
+    with open(key, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    
+    if entry and entry['sha256'] == digest:
+        value = entry['value']
+        parse_errors = entry.get('errors', {})
+    else:
+        parse_errors = {}
+        value = parse_ts_literals(content.decode('utf-8'), parse_errors)
+    if errors is not None:
+        errors.update(parse_errors)
+    
+    entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest,
+             'value': value, 'errors': parse_errors}
+    _memory_cache[key] = entry
+    if disk_cache is None:
+        disk_cache = _load_disk_cache(cache_file)
+    disk_cache[key] = entry
+    _save_disk_cache(cache_file, disk_cache)
+    return value
+
+
+def load_drug_database(file_path: str, cache_file: Optional[str] = DEFAULT_CACHE_FILE) -> Dict[str, Any]:
+    """
+    Oggetto database di drugs.ts (la costante con 'drugs'), {} se assente
+    
+    Le altre costanti possono contenere sintassi non supportata; se il
+    database non si trova e qualche costante non è leggibile solleva
+    TsParseError (il database potrebbe essere una di quelle).
+    """
+    errors: Dict[str, str] = {}
+    for value in load_ts_constants(file_path, cache_file, errors).values():
+        if isinstance(value, dict) and 'drugs' in value:
+            return value
+    if errors:
+        details = '; '.join(f"{name}: {message}" for name, message in errors.items())
+        raise TsParseError(f"Database farmaci non leggibile ({details})")
+    return {}
+
+
+def _enum_member(value: Any) -> Any:
+    """'DrugCategory.ANTIBIOTIC' -> 'ANTIBIOTIC'"""
+    return value.rsplit('.', 1)[-1] if isinstance(value, str) else value
+
+
+def extract_drugs(database: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Farmaci del database nel formato usato dalla tabella"""
+    fields = ('id', 'name', 'activeIngredient', 'category', 'concentration', 'route', 'clinicalNotes')
+    
+    drugs = []
+    for obj in database.get('drugs', []):
+        if not isinstance(obj, dict):
+            continue
+        drug = {field: _enum_member(obj[field]) for field in fields if obj.get(field) is not None}
+        # Opzionali
+        drug['requiresCVC'] = obj.get('requiresCVC') is True
+        drug['lightSensitive'] = obj.get('lightSensitive') is True
+        drugs.append(drug)
     return drugs
 
 
+def extract_drugs_from_ts(file_path: str) -> List[Dict[str, Any]]:
+    """Estrae i dati dei farmaci dal file TypeScript"""
+    return extract_drugs(load_drug_database(file_path))
+
+
 def print_table_header():
     """Stampa l'intestazione della tabella"""
     print("\n" + "="*160)
@@ -104,15 +440,11 @@ def print_drug_row(index: int, drug: Dict[str, Any]):
     print(f"{index:<4} {name:<20} {ingredient:<25} {category:<15} {concentration:<20} {cvc:<5} {light:<6} {notes:<40}")
 
 
-def print_compatibility_matrix_sample(file_path: str):
+def print_compatibility_matrix_sample(database: Dict[str, Any]):
     """Stampa un esempio della matrice di compatibilità"""
     
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Trova la matrice di compatibilità
-    matrix_match = re.search(r'compatibilityMatrix:\s*\{(.*?)\n  \}', content, re.DOTALL)
-    if not matrix_match:
+    matrix = database.get('compatibilityMatrix')
+    if not isinstance(matrix, dict):
         print("\n⚠️ Matrice di compatibilità non trovata")
         return
     
@@ -120,17 +452,12 @@ def print_compatibility_matrix_sample(file_path: str):
     print("📊 MATRICE DI COMPATIBILITÀ (Primi 5 farmaci)")
     print("="*120)
     
-    # Estrai le prime 5 entry
-    matrix_text = matrix_match.group(1)
-    drug_entries = re.findall(r"(\w+):\s*\{([^}]+)\}", matrix_text)[:5]
-    
-    for drug_name, compatibilities in drug_entries:
+    # Prime 5 entry
+    for drug_name, compatibilities in list(matrix.items())[:5]:
         print(f"\n🔹 {drug_name}:")
         
-        # Estrai compatibilità
-        compat_pairs = re.findall(r"(\w+(?:\s+\w+)?):\s*DrugCompatibility\.(\w+)", compatibilities)
-        
-        for other_drug, compat_level in compat_pairs[:5]:  # Primi 5 per brevità
+        for other_drug, compat_level in list(compatibilities.items())[:5]:  # Primi 5 per brevità
+            compat_level = _enum_member(compat_level)
             # Emoji per tipo compatibilità
             emoji = {
                 'COMPATIBLE': '🟢',
@@ -178,8 +505,9 @@ def main():
     file_path = '../src/data/drugs.ts'
     
     try:
-        # Estrai dati
-        drugs = extract_drugs_from_ts(file_path)
+        # Parsing unico (in cache), riusato da tutte le viste
+        database = load_drug_database(file_path)
+        drugs = extract_drugs(database)
         
         if not drugs:
             print("\n⚠️ Nessun farmaco trovato nel database!")
@@ -195,7 +523,7 @@ def main():
         print_summary(drugs)
         
         # Stampa campione matrice compatibilità
-        print_compatibility_matrix_sample(file_path)
+        print_compatibility_matrix_sample(database)
         
         print("\n" + "="*160)
         print("✅ Visualizzazione completata!")
@@ -213,6 +541,8 @@ def main():
     except FileNotFoundError:
         print(f"\n❌ ERRORE: File {file_path} non trovato!")
         print("Assicurati di essere nella directory scripts/")
+    except TsParseError as e:
+        print(f"\n❌ ERRORE parsing {file_path}: {e}")
     except Exception as e:
         print(f"\n❌ ERRORE: {e}")
 